@@ -0,0 +1,180 @@
+"""In-memory cache of generated answers for repeated and near-duplicate questions"""
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for exact cache lookups
+
+    Lowercases, collapses whitespace and strips trailing punctuation so that
+    trivially different phrasings share a cache entry.
+    """
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+    return question.rstrip("?!. ")
+
+
+class _Entry:
+    __slots__ = ("answer", "sources", "embedding", "chunk_key", "created_at")
+
+    def __init__(self, answer: str, sources: List[str], embedding: Optional[np.ndarray], chunk_key: tuple):
+        self.answer = answer
+        self.sources = sources
+        self.embedding = embedding
+        self.chunk_key = chunk_key
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of answers keyed by normalized question and retrieved chunk ids
+
+    Entries only match when the same chunks were retrieved, so an answer is
+    never reused against different context. When ``similarity_threshold`` is
+    set, a question whose embedding is at least that cosine-similar to a cached
+    question with the same chunks is also treated as a hit.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._by_chunks: dict = {}  # chunk_key -> set of entry keys
+        self._lock = threading.Lock()
+
+    def get(self, question: str, chunk_ids: List[str], question_embedding: Optional[np.ndarray] = None) -> Optional[Tuple[str, List[str]]]:
+        """
+        Look up a cached answer
+
+        Args:
+            question: The question asked
+            chunk_ids: Ids of the retrieved chunks, in rank order
+            question_embedding: Embedding of the question, used for similarity matching
+
+        Returns:
+            Tuple of (answer, sources) on a hit, otherwise None
+        """
+        chunk_key = tuple(chunk_ids)
+        key = (normalize_question(question), chunk_key)
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None and self.similarity_threshold and question_embedding is not None:
+                entry = self._lookup_similar(chunk_key, question_embedding)
+                if entry is not None:
+                    self.semantic_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry.answer, list(entry.sources)
+
+    def put(self, question: str, chunk_ids: List[str], answer: str, sources: List[str], question_embedding: Optional[np.ndarray] = None):
+        """
+        Store an answer
+
+        Args:
+            question: The question asked
+            chunk_ids: Ids of the retrieved chunks, in rank order
+            answer: Generated answer
+            sources: Source documents of the answer
+            question_embedding: Embedding of the question, used for similarity matching
+        """
+        chunk_key = tuple(chunk_ids)
+        key = (normalize_question(question), chunk_key)
+
+        embedding = None
+        if question_embedding is not None:
+            embedding = np.asarray(question_embedding, dtype=np.float32)
+            norm = np.linalg.norm(embedding)
+            embedding = embedding / norm if norm else embedding
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(answer, list(sources), embedding, chunk_key)
+            self._by_chunks.setdefault(chunk_key, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop every cached answer (called whenever the collection changes)"""
+        with self._lock:
+            if self._entries:
+                logger.info(f"Invalidating {len(self._entries)} cached answers")
+            self._entries.clear()
+            self._by_chunks.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.time() - entry.created_at > self.ttl_seconds
+
+    def _lookup(self, key: tuple) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _lookup_similar(self, chunk_key: tuple, question_embedding: np.ndarray) -> Optional[_Entry]:
+        query = np.asarray(question_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        query = query / norm
+
+        best_key, best_score = None, self.similarity_threshold
+        for key in list(self._by_chunks.get(chunk_key, ())):
+            entry = self._entries[key]
+            if self._expired(entry):
+                self._remove(key)
+                continue
+            if entry.embedding is None:
+                continue
+            score = float(np.dot(query, entry.embedding))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        return self._lookup(best_key) if best_key is not None else None
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_chunks.get(entry.chunk_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_chunks[entry.chunk_key]
@@ -0,0 +1,194 @@
+"""Dynamic micro-batching of query embeddings across concurrent requests"""
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import Histogram, LATENCY_BUCKETS, SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ("texts", "future", "enqueued_at", "_parts", "_pending")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self._parts = {}
+        self._pending = len(texts)
+
+    def deliver(self, start: int, vectors: np.ndarray):
+        """Record the rows for texts[start:start + len(vectors)], resolving the future once all have arrived"""
+        self._parts[start] = vectors
+        self._pending -= len(vectors)
+        if not self._pending:
+            self._settle(self.future.set_result, np.concatenate([self._parts[offset] for offset in sorted(self._parts)]))
+
+    def fail(self, error: Exception):
+        self._settle(self.future.set_exception, error)
+
+    def _settle(self, setter: Callable, value):
+        # An async caller that was cancelled has already cancelled the future
+        try:
+            setter(value)
+        except InvalidStateError:
+            pass
+
+
+# A slice of one request's texts: (request, start, end)
+_Slice = Tuple[_Request, int, int]
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent encode calls into batched forward passes
+
+    A single worker thread gathers requests for up to ``max_wait`` seconds
+    after the oldest one arrived, or until ``max_batch_size`` texts are
+    waiting, then runs one batched encode and hands each caller its rows.
+    A request that doesn't fit in the rest of a batch is split, and its
+    remaining texts start the next one. Under load the worker is still busy
+    with the previous batch when new requests arrive, so they are batched
+    without any added wait; when idle, a lone request waits at most
+    ``max_wait``. Requests already holding ``max_batch_size`` texts skip the
+    queue.
+
+    Async callers await ``encode_async``, which is resolved by the worker
+    thread, so waiting for a batch doesn't occupy a thread; ``encode``
+    blocks the calling thread instead.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        queue_wait: Optional[Histogram] = None,
+        batch_size: Optional[Histogram] = None
+    ):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue_wait = queue_wait or Histogram(LATENCY_BUCKETS)
+        self.batch_size = batch_size or Histogram(SIZE_BUCKETS)
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        # Texts of a split request that didn't fit in the previous batch
+        self._carry: Optional[_Slice] = None
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts as part of a shared batch
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        if len(texts) >= self.max_batch_size:
+            return self._encode_alone(texts)
+        return self._submit(texts).result()
+
+    async def encode_async(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts as part of a shared batch without blocking the event loop
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        if len(texts) >= self.max_batch_size:
+            return await asyncio.to_thread(self._encode_alone, texts)
+        return await asyncio.wrap_future(self._submit(texts))
+
+    def _encode_alone(self, texts: List[str]) -> np.ndarray:
+        self.queue_wait.observe(0.0)
+        self.batch_size.observe(len(texts))
+        return self._encode(texts)
+
+    def _submit(self, texts: List[str]) -> Future:
+        self._ensure_worker()
+        request = _Request(texts)
+        self._queue.put(request)
+        return request.future
+
+    def stats(self) -> dict:
+        """Queue-wait (seconds) and batch-size histograms"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": self._queue.qsize(),
+            "queue_wait_seconds": self.queue_wait.stats(),
+            "batch_size": self.batch_size.stats(),
+        }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[_Slice]:
+        """Block for the next request, then gather more until the deadline or size limit"""
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            request = self._queue.get()
+            first = (request, 0, len(request.texts))
+        batch = [first]
+        size = first[2] - first[1]
+        deadline = first[0].enqueued_at + self.max_wait
+
+        while size < self.max_batch_size:
+            # Take whatever is already queued, and only wait while the deadline allows
+            timeout = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            end = min(len(request.texts), self.max_batch_size - size)
+            batch.append((request, 0, end))
+            size += end
+            if end < len(request.texts):
+                self._carry = (request, end, len(request.texts))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request, start, end in batch for text in request.texts[start:end]]
+
+            started = time.monotonic()
+            for request, start, _ in batch:
+                if not start:
+                    self.queue_wait.observe(started - request.enqueued_at)
+            self.batch_size.observe(len(texts))
+
+            try:
+                vectors = self._encode(texts)
+            except Exception as e:
+                logger.error(f"Batched query encode failed: {e}")
+                for request, _, _ in batch:
+                    request.fail(e)
+                # The rest of a failed request isn't worth encoding
+                if self._carry is not None and self._carry[0].future.done():
+                    self._carry = None
+                continue
+
+            offset = 0
+            for request, start, end in batch:
+                request.deliver(start, vectors[offset:offset + end - start])
+                offset += end - start
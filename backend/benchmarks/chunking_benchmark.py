@@ -0,0 +1,105 @@
+"""
+Benchmark page-aware chunking on a large synthetic document
+
+Compares chunk_text_with_pages against the previous find-based
+implementation, which searched for every chunk in the text and scanned every
+page for every chunk, and checks both against page numbers read off a
+per-character page map. Run from the backend directory:
+
+    python benchmarks/chunking_benchmark.py --pages 2000
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import chunk_text, chunk_text_with_pages  # noqa: E402
+from sample_documents import make_document, expected_pages  # noqa: E402
+
+
+def legacy_chunk_text_with_pages(text: str, page_map: list, chunk_size: int = 1000, chunk_overlap: int = 200) -> list:
+    """Previous implementation: text.find per chunk and a full page scan per chunk"""
+    chunks_with_pages = []
+
+    position = 0
+    page_positions = []
+    for page_num, page_text in page_map:
+        start = position
+        end = position + len(page_text)
+        page_positions.append((start, end, page_num))
+        position = end + 2
+
+    chunks = chunk_text(text, chunk_size, chunk_overlap)
+
+    current_pos = 0
+    for chunk in chunks:
+        chunk_start = text.find(chunk, current_pos)
+        if chunk_start == -1:
+            chunk_start = current_pos
+        chunk_end = chunk_start + len(chunk)
+
+        chunk_pages = set()
+        for start, end, page_num in page_positions:
+            if not (chunk_end < start or chunk_start > end):
+                chunk_pages.add(page_num)
+
+        chunks_with_pages.append((chunk, sorted(list(chunk_pages))))
+        current_pos = chunk_start + 1
+
+    return chunks_with_pages
+
+
+def time_call(func, *args, repeat: int = 3) -> tuple:
+    """Return (best wall time in seconds, result of the last call)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=2000, help="Number of synthetic pages")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    page_map = make_document(args.pages)
+    text = "\n\n".join(page_text for _, page_text in page_map)
+
+    print("=" * 60)
+    print("Page-aware chunking benchmark")
+    print("=" * 60)
+    print(f"Pages: {args.pages}, characters: {len(text):,}")
+    print()
+
+    legacy_time, legacy = time_call(
+        legacy_chunk_text_with_pages, text, page_map, args.chunk_size, args.chunk_overlap, repeat=args.repeat
+    )
+    current_time, current = time_call(
+        chunk_text_with_pages, text, page_map, args.chunk_size, args.chunk_overlap, repeat=args.repeat
+    )
+
+    assert [chunk for chunk, _ in legacy] == [chunk for chunk, _ in current], "Chunk boundaries differ"
+    expected = expected_pages(text, page_map, args.chunk_size, args.chunk_overlap)
+    assert [pages for _, pages in current] == expected, "offset + bisect attributed a chunk to the wrong pages"
+    misattributed = sum(1 for (_, pages), truth in zip(legacy, expected) if pages != truth)
+
+    print(f"Chunks:              {len(current)}")
+    print(f"find-based (legacy): {legacy_time * 1000:10.1f} ms")
+    print(f"offset + bisect:     {current_time * 1000:10.1f} ms")
+    print(f"Speedup:             {legacy_time / current_time:10.1f}x")
+    print(f"Chunks on the wrong pages: {misattributed} find-based, 0 offset + bisect")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark the embedding backends on CPU
+
+Encodes a synthetic corpus with each backend and reports ingestion
+throughput, single-query latency and retrieval recall. Recall is measured
+two ways: whether the chunk a query was cut from is in its top-k, and how
+much of the PyTorch backend's top-k each other backend returns. Run from the
+backend directory (models are downloaded on first use):
+
+    python benchmarks/embedding_benchmark.py --backends torch,onnx,onnx-int8 --threads 4
+"""
+import sys
+import time
+import random
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import settings  # noqa: E402
+from embeddings import BACKENDS, load_embedding_backend  # noqa: E402
+
+WORDS = [
+    "contract", "clause", "party", "liability", "section", "payment", "term", "notice",
+    "agreement", "schedule", "warranty", "indemnity", "supplier", "customer", "invoice",
+    "delivery", "termination", "breach", "damages", "insurance", "audit", "records",
+    "confidential", "information", "dispute", "arbitration", "governing", "law", "force",
+    "majeure", "renewal", "period", "price", "adjustment", "service", "level", "credit",
+]
+
+
+def make_corpus(chunks: int, queries: int, seed: int = 42) -> tuple:
+    """
+    Build synthetic chunks and queries
+
+    Each query is a few consecutive words cut from one chunk, so the chunk it
+    came from is the expected top result.
+
+    Returns:
+        Tuple of (chunk texts, query texts, index of each query's source chunk)
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(chunks):
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+            for _ in range(rng.randint(6, 12))
+        ]
+        texts.append(" ".join(sentences))
+
+    query_texts = []
+    targets = []
+    for _ in range(queries):
+        target = rng.randrange(chunks)
+        words = texts[target].split()
+        start = rng.randrange(max(1, len(words) - 8))
+        query_texts.append(" ".join(words[start:start + 8]))
+        targets.append(target)
+    return texts, query_texts, targets
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k most cosine-similar corpus vectors for each query"""
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def benchmark(backend_name: str, texts: list, queries: list, args) -> dict:
+    """Load one backend and measure it"""
+    start = time.perf_counter()
+    backend = load_embedding_backend(
+        settings.EMBEDDING_MODEL,
+        backend=backend_name,
+        threads=args.threads,
+        token=settings.HF_TOKEN or None
+    )
+    load_time = time.perf_counter() - start
+    backend.encode(["warm up"])
+
+    start = time.perf_counter()
+    corpus = backend.encode(texts, batch_size=args.batch_size)
+    encode_time = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(backend.encode([query])[0])
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "load_time": load_time,
+        "throughput": len(texts) / encode_time,
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "corpus": corpus,
+        "queries": np.stack(query_vectors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends (first is the reference)")
+    parser.add_argument("--chunks", type=int, default=500, help="Synthetic chunks to encode")
+    parser.add_argument("--queries", type=int, default=100, help="Queries to encode one at a time")
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K_RESULTS)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS, help="Intra-op threads (0 = library default)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    texts, queries, targets = make_corpus(args.chunks, args.queries)
+
+    print("=" * 78)
+    print("Embedding backend benchmark")
+    print("=" * 78)
+    print(f"Model: {settings.EMBEDDING_MODEL}")
+    print(f"Chunks: {len(texts)}, queries: {len(queries)}, batch size: {args.batch_size}, threads: {args.threads or 'default'}")
+    print()
+
+    results = {name: benchmark(name, texts, queries, args) for name in backends}
+    reference = top_k(results[backends[0]]["corpus"], results[backends[0]]["queries"], args.top_k)
+
+    print(f"{'backend':<12}{'load s':>8}{'chunks/s':>10}{'query p50':>11}{'query p95':>11}"
+          f"{f'hit@{args.top_k}':>8}{f'vs {backends[0]}':>12}")
+    for name in backends:
+        result = results[name]
+        found = top_k(result["corpus"], result["queries"], args.top_k)
+        hit_rate = np.mean([target in row for target, row in zip(targets, found)])
+        agreement = np.mean([len(set(row) & set(ref)) / args.top_k for row, ref in zip(found, reference)])
+        print(
+            f"{name:<12}{result['load_time']:>8.1f}{result['throughput']:>10.1f}"
+            f"{result['p50'] * 1000:>9.1f}ms{result['p95'] * 1000:>9.1f}ms"
+            f"{hit_rate:>8.2f}{agreement:>12.2f}"
+        )
+
+    base = results[backends[0]]["throughput"]
+    for name in backends[1:]:
+        print(f"{name} ingestion speedup over {backends[0]}: {results[name]['throughput'] / base:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+End-to-end ingestion and query benchmark with a stub LLM
+
+Generates a synthetic PDF and measures each ingestion step (extraction
+pages/s, chunking and embedding chunks/s, and a full ``index_pdf``), then
+serves the API with uvicorn and measures /query latency percentiles under
+concurrent load. Completions come from ``llm_stub.py`` on a local port, so
+no Groq key or network is needed; the embedding model must already be in the
+HuggingFace cache. Results are written as JSON so runs can be compared. Run
+from the backend directory:
+
+    python benchmarks/pipeline_benchmark.py --pages 200 --queries 200 --concurrency 16
+    python benchmarks/pipeline_benchmark.py --compare benchmarks/results/pipeline-20240101-120000.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import logging
+import argparse
+import shutil
+import platform
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# (key in results, label, higher is better) for the summary table and --compare
+REPORTED = [
+    ("extract.pages_per_sec", "extract pages/s", True),
+    ("chunk.chunks_per_sec", "chunk chunks/s", True),
+    ("embed.chunks_per_sec", "embed chunks/s", True),
+    ("index.pages_per_sec", "index_pdf pages/s", True),
+    ("query.throughput", "query req/s", True),
+    ("query.p50_ms", "query p50 ms", False),
+    ("query.p95_ms", "query p95 ms", False),
+    ("query.p99_ms", "query p99 ms", False),
+]
+
+
+def make_questions(page_lines: list, count: int, seed: int = 7) -> list:
+    """Questions built from phrases on random pages, so each has relevant chunks"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        words = rng.choice(rng.choice(page_lines)).rstrip(".").split()
+        start = rng.randrange(max(1, len(words) - 6))
+        questions.append(f"What does the document say about {' '.join(words[start:start + 6]).lower()}?")
+    return questions
+
+
+def best_of(func, repeat: int) -> tuple:
+    """Return (best wall time in seconds, result of the last call)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port: int):
+    """Start a uvicorn server on a daemon thread and wait until it accepts connections"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile_ms(latencies: list, q: float) -> float:
+    return round(float(np.percentile(latencies, q)) * 1000, 1)
+
+
+async def run_query_load(port: int, questions: list, concurrency: int, top_k: int) -> dict:
+    """Send every question to /query with at most ``concurrency`` in flight"""
+    import httpx
+
+    latencies = []
+    statuses = {}
+    pending = iter(questions)
+
+    async def worker(client):
+        for question in pending:
+            start = time.perf_counter()
+            response = await client.post("/query", json={"question": question, "top_k": top_k})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        limits=limits,
+        timeout=120
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def stage_breakdown() -> dict:
+    """Mean milliseconds per call of each pipeline stage, from the /metrics histograms"""
+    from metrics import STAGE_SECONDS
+
+    breakdown = {}
+    for (stage_name,), histogram in STAGE_SECONDS.children():
+        snapshot = histogram.snapshot()
+        if snapshot["count"]:
+            breakdown[stage_name] = {
+                "calls": snapshot["count"],
+                "avg_ms": round(snapshot["sum"] / snapshot["count"] * 1000, 3),
+            }
+    return breakdown
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def lookup(results: dict, key: str):
+    value = results
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def print_summary(results: dict, baseline: dict = None):
+    """Print the headline numbers, with the change from a baseline run if given"""
+    header = f"{'metric':<20}{'value':>12}"
+    if baseline is not None:
+        header += f"{'baseline':>12}{'change':>10}"
+    print(header)
+    for key, label, higher_is_better in REPORTED:
+        value = lookup(results, key)
+        if value is None:
+            continue
+        line = f"{label:<20}{value:>12.1f}"
+        old = lookup(baseline, key) if baseline is not None else None
+        if old:
+            change = (value - old) / old * 100
+            worse = change < 0 if higher_is_better else change > 0
+            line += f"{old:>12.1f}{change:>+9.1f}%{'  (worse)' if worse and abs(change) >= 5 else ''}"
+        print(line)
+
+
+def configure_environment(args, llm_port: int):
+    """Point the backend at the stub LLM before config is imported"""
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{llm_port}"
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    # Measure the pipeline, not the free-tier rate limits or warm caches from earlier runs
+    os.environ["LLM_RPM_LIMIT"] = "0"
+    os.environ["LLM_TPM_LIMIT"] = "0"
+    os.environ.setdefault("LLM_MAX_IN_FLIGHT", str(max(16, args.concurrency)))
+    if not args.caches:
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Pages in the synthetic PDF")
+    parser.add_argument("--lines-per-page", type=int, default=45)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of extraction and chunking (best is reported)")
+    parser.add_argument("--queries", type=int, default=200, help="Total /query requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight during the query load")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub seconds before the first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.0, help="Stub seconds per answer word")
+    parser.add_argument("--llm-answer-tokens", type=int, default=50, help="Stub words per answer")
+    parser.add_argument("--caches", action="store_true", help="Keep the embedding and answer caches enabled")
+    parser.add_argument("--skip-queries", action="store_true", help="Only benchmark ingestion")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from llm_stub import create_app as create_stub_app
+    from sample_documents import write_pdf
+
+    llm_port = free_port()
+    configure_environment(args, llm_port)
+    serve_in_thread(create_stub_app(args.llm_latency, args.llm_token_delay, args.llm_answer_tokens), llm_port)
+
+    from config import settings
+
+    # Index into a throwaway store so runs start cold and never touch real data
+    workdir = Path(tempfile.mkdtemp(prefix="pdf-benchmark-"))
+    settings.CHROMA_PERSIST_DIR = workdir / "chroma_db"
+    settings.BM25_INDEX_PATH = settings.CHROMA_PERSIST_DIR / "bm25_index.pkl"
+    settings.DOCUMENT_REGISTRY_PATH = settings.CHROMA_PERSIST_DIR / "documents.db"
+    settings.EMBEDDING_CACHE_PATH = workdir / "embedding_cache" / "embeddings.db"
+
+    from utils import extract_text
+    import rag
+
+    pdf_path = workdir / f"synthetic-{args.pages}p.pdf"
+    page_lines = write_pdf(pdf_path, args.pages, args.lines_per_page)
+
+    print("=" * 60)
+    print("Ingestion and query benchmark")
+    print("=" * 60)
+    print(f"PDF: {args.pages} pages, {pdf_path.stat().st_size / 1e6:.1f} MB")
+    print(f"Embedding: {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND}), chunking: {settings.CHUNKING_MODE}")
+    print()
+
+    results = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "embedding_model": settings.EMBEDDING_MODEL,
+            "embedding_backend": settings.EMBEDDING_BACKEND,
+            "embedding_dimension": settings.EMBEDDING_DIMENSION,
+            "embedding_batch_size": settings.EMBEDDING_BATCH_SIZE,
+            "chunking_mode": settings.CHUNKING_MODE,
+            "extraction_workers": settings.EXTRACTION_WORKERS,
+            "hybrid_search": settings.HYBRID_SEARCH_ENABLED,
+            "rerank": settings.RERANK_ENABLED,
+            "context_packing": settings.CONTEXT_PACKING_ENABLED,
+            "query_batching": settings.QUERY_BATCHING_ENABLED,
+            "caches": args.caches,
+        },
+        "args": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+    }
+
+    extract_time, (_, page_map) = best_of(
+        lambda: extract_text(str(pdf_path), settings.EXTRACTION_WORKERS, settings.PARALLEL_EXTRACTION_MIN_PAGES),
+        args.repeat
+    )
+    results["extract"] = {"pages": len(page_map), "seconds": round(extract_time, 4), "pages_per_sec": round(len(page_map) / extract_time, 1)}
+
+    start = time.perf_counter()
+    model = rag.get_embedding_model()
+    model_load_time = time.perf_counter() - start
+
+    chunk_time, chunks = best_of(lambda: list(rag.chunk_pages(page_map)), args.repeat)
+    results["chunk"] = {"chunks": len(chunks), "seconds": round(chunk_time, 4), "chunks_per_sec": round(len(chunks) / chunk_time, 1)}
+
+    texts = [text for text, _ in chunks]
+    model.encode(texts[:settings.EMBEDDING_BATCH_SIZE], batch_size=settings.EMBEDDING_BATCH_SIZE)
+    start = time.perf_counter()
+    model.encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE)
+    embed_time = time.perf_counter() - start
+    results["embed"] = {
+        "chunks": len(texts),
+        "seconds": round(embed_time, 3),
+        "chunks_per_sec": round(len(texts) / embed_time, 1),
+        "model_load_seconds": round(model_load_time, 2),
+    }
+
+    start = time.perf_counter()
+    indexed = rag.index_pdf(str(pdf_path))
+    index_time = time.perf_counter() - start
+    results["index"] = {
+        "chunks": indexed,
+        "seconds": round(index_time, 3),
+        "pages_per_sec": round(args.pages / index_time, 1),
+        "chunks_per_sec": round(indexed / index_time, 1),
+    }
+
+    if not args.skip_queries:
+        import main as api
+        api_port = free_port()
+        serve_in_thread(api.app, api_port)
+        questions = make_questions(page_lines, args.queries)
+
+        # One untimed request per worker opens connections and loads the LLM gateway
+        asyncio.run(run_query_load(api_port, questions[:args.concurrency], args.concurrency, args.top_k))
+        results["query"] = asyncio.run(run_query_load(api_port, questions, args.concurrency, args.top_k))
+        # Fixed stub time included in every request, to separate from the pipeline's own latency
+        results["query"]["stub_llm_ms"] = round((args.llm_latency + args.llm_token_delay * args.llm_answer_tokens) * 1000, 1)
+
+    results["stages"] = stage_breakdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_summary(results, baseline)
+    if "query" in results and set(results["query"]["statuses"]) != {"200"}:
+        print(f"Non-200 responses: {results['query']['statuses']}")
+
+    output = args.output or RESULTS_DIR / f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print()
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark handing embeddings to Chroma as NumPy arrays instead of lists
+
+Compares the previous ``embeddings.tolist()`` handoff, which builds a Python
+float per component that Chroma then converts back into arrays, with passing
+the float32 array directly. Reports time and peak Python allocations of the
+conversion, and optionally of a full ``collection.add`` into an in-memory
+collection. Run from the backend directory:
+
+    python benchmarks/vector_handoff_benchmark.py --chunks 10000 --add
+"""
+import sys
+import time
+import logging
+import argparse
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import chromadb
+from chromadb.api.types import normalize_embeddings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import as_vectors  # noqa: E402
+
+
+def legacy_handoff(embeddings: np.ndarray):
+    """Previous path: nested lists, converted back to arrays by Chroma"""
+    return normalize_embeddings(embeddings.tolist())
+
+
+def array_handoff(embeddings: np.ndarray):
+    """Current path: the float32 array is split into row views"""
+    return normalize_embeddings(as_vectors(embeddings))
+
+
+def measure(func, *args, repeat: int = 3) -> tuple:
+    """Return (best wall time in seconds, peak traced allocation in bytes)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def add_to_collection(client, embeddings: np.ndarray, as_list: bool) -> float:
+    """Time one collection.add of every embedding into a fresh collection"""
+    name = "handoff-list" if as_list else "handoff-array"
+    try:
+        client.delete_collection(name=name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=name)
+    ids = [f"chunk-{i}" for i in range(len(embeddings))]
+    max_batch = client.get_max_batch_size()
+
+    start = time.perf_counter()
+    for offset in range(0, len(embeddings), max_batch):
+        batch = embeddings[offset:offset + max_batch]
+        collection.add(
+            ids=ids[offset:offset + max_batch],
+            embeddings=batch.tolist() if as_list else as_vectors(batch)
+        )
+    elapsed = time.perf_counter() - start
+    client.delete_collection(name=name)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=10_000, help="Number of embeddings")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path (best is reported)")
+    parser.add_argument("--add", action="store_true", help="Also time collection.add into an in-memory collection")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    rng = np.random.default_rng(42)
+    embeddings = rng.standard_normal((args.chunks, args.dimension), dtype=np.float32)
+
+    print("=" * 60)
+    print("Embedding handoff benchmark")
+    print("=" * 60)
+    print(f"Embeddings: {args.chunks} x {args.dimension} float32 ({embeddings.nbytes / 1e6:.1f} MB)")
+    print()
+
+    legacy_time, legacy_peak = measure(legacy_handoff, embeddings, repeat=args.repeat)
+    array_time, array_peak = measure(array_handoff, embeddings, repeat=args.repeat)
+
+    print("Conversion before Chroma's own processing")
+    print(f"  .tolist():  {legacy_time * 1000:10.1f} ms  peak {legacy_peak / 1e6:8.1f} MB")
+    print(f"  ndarray:    {array_time * 1000:10.1f} ms  peak {array_peak / 1e6:8.1f} MB")
+    print(f"  Saved:      {(legacy_time - array_time) * 1000:10.1f} ms  peak {(legacy_peak - array_peak) / 1e6:8.1f} MB")
+
+    if args.add:
+        client = chromadb.EphemeralClient()
+        list_time = add_to_collection(client, embeddings, as_list=True)
+        array_add_time = add_to_collection(client, embeddings, as_list=False)
+        print()
+        print("collection.add (including HNSW insertion)")
+        print(f"  .tolist():  {list_time * 1000:10.1f} ms")
+        print(f"  ndarray:    {array_add_time * 1000:10.1f} ms")
+        print(f"  Saved:      {(list_time - array_add_time) * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
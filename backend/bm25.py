@@ -0,0 +1,398 @@
+"""Sparse lexical (BM25) index kept alongside the Chroma collection"""
+import os
+import re
+import math
+import pickle
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Compound tokens such as part numbers (A-113, ISO-9001) and clause ids (4.2.1)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+SEPARATOR_PATTERN = re.compile(r"[-_./]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the "
+    "this to was were will with what which who how when where why do does".split()
+)
+
+# Term frequencies are stored as uint16
+MAX_TERM_FREQ = 65535
+
+# Tombstoned documents are compacted away once they are this many and a quarter of the index
+MIN_COMPACT_TOMBSTONES = 1000
+
+# The change log is folded into a new snapshot once it outgrows the snapshot (or this size)
+MIN_SNAPSHOT_LOG_BYTES = 1024 * 1024
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms
+
+    Compound tokens are kept whole (so "A-113" matches exactly) and also
+    indexed by their parts.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if SEPARATOR_PATTERN.search(token):
+            terms.extend(part for part in SEPARATOR_PATTERN.split(token) if part and part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """
+    Incrementally updatable BM25 index with array-backed postings
+
+    Each term's postings are two typed arrays (uint32 document numbers and
+    uint16 term frequencies), so the index costs about 6 bytes per
+    (term, chunk) pair instead of a Python object per posting. Removed
+    chunks are tombstoned and the postings are compacted once tombstones
+    make up a quarter of the index.
+
+    On disk the index is a pickled snapshot plus an append-only log of the
+    changes made since. ``save`` appends the changes recorded since the last
+    save to the log, and only writes a new snapshot once the log outgrows
+    the previous one. Both are written outside the index lock, so searches
+    and ingestion aren't blocked by disk writes. Log records are replayed on
+    load; they are keyed by chunk id, so replaying a record the snapshot
+    already contains is harmless.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".log")
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # Serializes writers of the files
+        self._pending = []  # Changes not yet written to the log
+        self._log_bytes = 0
+        self._snapshot_bytes = 0
+        self._reset()
+
+    def _reset(self):
+        self._terms = {}  # term -> term number
+        self._postings: List[array] = []  # term number -> document numbers ('I')
+        self._freqs: List[array] = []  # term number -> term frequencies ('H')
+        self._chunk_ids: List[str] = []  # document number -> chunk id
+        self._doc_numbers = {}  # chunk id -> document number
+        self._doc_lengths = array("I")
+        self._live = bytearray()  # 1 if the document is live, 0 if removed
+        self._live_count = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def add(self, chunk_ids: Iterable[str], texts: Iterable[str]):
+        """
+        Index chunks, replacing any existing chunk with the same id
+
+        Args:
+            chunk_ids: Chunk ids
+            texts: Chunk texts
+        """
+        chunk_ids = list(chunk_ids)
+        texts = list(texts)
+        with self._lock:
+            self._pending.append(("add", chunk_ids, texts))
+            self._add(chunk_ids, texts)
+            self._maybe_compact()
+
+    def remove(self, chunk_ids: Iterable[str]):
+        """
+        Remove chunks from the index
+
+        Args:
+            chunk_ids: Ids of the chunks to remove
+        """
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            self._pending.append(("remove", chunk_ids))
+            self._remove(chunk_ids)
+            self._maybe_compact()
+
+    def clear(self):
+        """Remove every chunk from the index"""
+        with self._lock:
+            self._pending.append(("clear",))
+            self._reset()
+
+    def search(self, query: str, limit: int, allow: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        Rank chunks against a query
+
+        Args:
+            query: Query text
+            limit: Maximum number of results
+            allow: Optional predicate on chunk ids; chunks it rejects are never ranked
+
+        Returns:
+            List of (chunk id, score) pairs, best first
+        """
+        with self._lock:
+            if not self._live_count:
+                return []
+
+            query_terms = [term for term in set(tokenize(query)) if term in self._terms]
+            if not query_terms:
+                return []
+
+            doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+            average_length = self._total_length / self._live_count
+            length_norm = K1 * (1 - B + B * doc_lengths / average_length)
+            scores = np.zeros(len(self._chunk_ids), dtype=np.float32)
+            live = np.frombuffer(self._live, dtype=np.uint8)
+
+            for term in query_terms:
+                term_number = self._terms[term]
+                docs = np.frombuffer(self._postings[term_number], dtype=np.uint32)
+                # Tombstoned postings don't count towards the document frequency
+                doc_freq = int(np.count_nonzero(live[docs]))
+                if not doc_freq:
+                    continue
+                freqs = np.frombuffer(self._freqs[term_number], dtype=np.uint16).astype(np.float32)
+                idf = math.log(1 + (self._live_count - doc_freq + 0.5) / (doc_freq + 0.5))
+                # A document appears at most once per term, so plain fancy-index addition is safe
+                scores[docs] += idf * freqs * (K1 + 1) / (freqs + length_norm[docs])
+
+            scores *= live
+
+            candidates = np.flatnonzero(scores > 0)
+            if allow is not None:
+                mask = np.fromiter((allow(self._chunk_ids[doc_number]) for doc_number in candidates), dtype=bool, count=len(candidates))
+                candidates = candidates[mask]
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            return [(self._chunk_ids[doc_number], float(scores[doc_number])) for doc_number in ranked]
+
+    def save(self):
+        """
+        Persist the changes made since the last save
+
+        Changes are appended to the log; once the log has grown larger than
+        the snapshot, a new snapshot is written and the log is truncated.
+        """
+        with self._save_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                snapshot = None
+                if self._log_bytes > max(MIN_SNAPSHOT_LOG_BYTES, self._snapshot_bytes):
+                    snapshot = self._state()
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if snapshot is not None:
+                self._write_snapshot(snapshot)
+            elif pending:
+                with open(self.log_path, "ab") as f:
+                    for record in pending:
+                        pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    self._log_bytes = f.tell()
+
+    def _state(self) -> dict:
+        """Copy of the index state that later changes won't touch"""
+        return {
+            "terms": dict(self._terms),
+            "postings": [postings[:] for postings in self._postings],
+            "freqs": [freqs[:] for freqs in self._freqs],
+            "chunk_ids": list(self._chunk_ids),
+            "doc_lengths": self._doc_lengths[:],
+            "live": bytes(self._live),
+            "live_count": self._live_count,
+            "total_length": self._total_length,
+        }
+
+    def _write_snapshot(self, state: dict):
+        """Atomically replace the snapshot and truncate the log it supersedes"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._snapshot_bytes = f.tell()
+        os.replace(tmp_path, self.path)
+        self.log_path.unlink(missing_ok=True)
+        self._log_bytes = 0
+
+    def load(self) -> bool:
+        """
+        Load the index from disk, replaying any logged changes
+
+        Returns:
+            True if a saved index was loaded
+        """
+        if not self.path.exists() and not self.log_path.exists():
+            return False
+
+        with self._lock:
+            self._reset()
+            if self.path.exists():
+                try:
+                    with open(self.path, "rb") as f:
+                        state = pickle.load(f)
+                except Exception as e:
+                    logger.warning(f"Could not load BM25 index from {self.path}: {e}")
+                    self._reset()
+                    return False
+                self._load_state(state)
+                self._snapshot_bytes = self.path.stat().st_size
+
+            replayed = self._replay_log()
+
+        logger.info(
+            f"Loaded BM25 index with {self._live_count} chunks and {len(self._terms)} terms "
+            f"({replayed} logged changes replayed)"
+        )
+        return True
+
+    def _load_state(self, state: dict):
+        self._terms = state["terms"]
+        self._postings = state["postings"]
+        self._freqs = state["freqs"]
+        self._chunk_ids = state["chunk_ids"]
+        self._doc_numbers = {
+            chunk_id: doc_number
+            for doc_number, chunk_id in enumerate(self._chunk_ids)
+            if state["live"][doc_number]
+        }
+        self._doc_lengths = state["doc_lengths"]
+        self._live = bytearray(state["live"])
+        self._live_count = state["live_count"]
+        self._total_length = state["total_length"]
+
+    def _replay_log(self) -> int:
+        """Apply the logged changes, stopping at a record torn by a crash"""
+        if not self.log_path.exists():
+            return 0
+
+        replayed = 0
+        with open(self.log_path, "rb") as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception as e:
+                    logger.warning(f"Ignoring the unreadable tail of {self.log_path}: {e}")
+                    break
+                if record[0] == "add":
+                    self._add(record[1], record[2])
+                elif record[0] == "remove":
+                    self._remove(record[1])
+                else:
+                    self._reset()
+                replayed += 1
+            self._log_bytes = f.tell()
+
+        self._maybe_compact()
+        return replayed
+
+    def delete(self):
+        """Remove the saved snapshot and log"""
+        with self._save_lock:
+            self.path.unlink(missing_ok=True)
+            self.log_path.unlink(missing_ok=True)
+            self._log_bytes = 0
+            self._snapshot_bytes = 0
+
+    def stats(self) -> dict:
+        """Index size counters"""
+        with self._lock:
+            return {
+                "chunks": self._live_count,
+                "terms": len(self._terms),
+                "postings": sum(len(postings) for postings in self._postings),
+                "tombstones": len(self._chunk_ids) - self._live_count,
+            }
+
+    def _add(self, chunk_ids: List[str], texts: List[str]):
+        for chunk_id, text in zip(chunk_ids, texts):
+            if chunk_id in self._doc_numbers:
+                self._remove_one(chunk_id)
+
+            terms = tokenize(text)
+            doc_number = len(self._chunk_ids)
+            self._chunk_ids.append(chunk_id)
+            self._doc_numbers[chunk_id] = doc_number
+            self._doc_lengths.append(len(terms))
+            self._live.append(1)
+            self._live_count += 1
+            self._total_length += len(terms)
+
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+
+            for term, count in counts.items():
+                term_number = self._terms.get(term)
+                if term_number is None:
+                    term_number = len(self._postings)
+                    self._terms[term] = term_number
+                    self._postings.append(array("I"))
+                    self._freqs.append(array("H"))
+                self._postings[term_number].append(doc_number)
+                self._freqs[term_number].append(min(count, MAX_TERM_FREQ))
+
+    def _remove(self, chunk_ids: List[str]):
+        for chunk_id in chunk_ids:
+            if chunk_id in self._doc_numbers:
+                self._remove_one(chunk_id)
+
+    def _remove_one(self, chunk_id: str):
+        doc_number = self._doc_numbers.pop(chunk_id)
+        self._live[doc_number] = 0
+        self._live_count -= 1
+        self._total_length -= self._doc_lengths[doc_number]
+
+    def _maybe_compact(self):
+        tombstones = len(self._chunk_ids) - self._live_count
+        if tombstones >= MIN_COMPACT_TOMBSTONES and tombstones > len(self._chunk_ids) // 4:
+            self._compact()
+
+    def _compact(self):
+        """Drop tombstoned documents and renumber the rest"""
+        renumber = array("I", [0]) * len(self._chunk_ids)
+        chunk_ids = []
+        doc_lengths = array("I")
+        for doc_number, chunk_id in enumerate(self._chunk_ids):
+            if self._live[doc_number]:
+                renumber[doc_number] = len(chunk_ids)
+                chunk_ids.append(chunk_id)
+                doc_lengths.append(self._doc_lengths[doc_number])
+
+        terms = {}
+        postings = []
+        freqs = []
+        for term, term_number in self._terms.items():
+            kept_docs = array("I")
+            kept_freqs = array("H")
+            for doc_number, freq in zip(self._postings[term_number], self._freqs[term_number]):
+                if self._live[doc_number]:
+                    kept_docs.append(renumber[doc_number])
+                    kept_freqs.append(freq)
+            if kept_docs:
+                terms[term] = len(postings)
+                postings.append(kept_docs)
+                freqs.append(kept_freqs)
+
+        logger.info(f"Compacted BM25 index: {len(self._chunk_ids) - len(chunk_ids)} tombstones removed")
+
+        self._terms = terms
+        self._postings = postings
+        self._freqs = freqs
+        self._chunk_ids = chunk_ids
+        self._doc_numbers = {chunk_id: doc_number for doc_number, chunk_id in enumerate(chunk_ids)}
+        self._doc_lengths = doc_lengths
+        self._live = bytearray(b"\x01") * len(chunk_ids)
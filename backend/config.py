@@ -20,11 +20,35 @@ class Settings:
     
     # Model Configuration
     EMBEDDING_MODEL: str = "nomic-ai/nomic-embed-text-v1.5"  # HuggingFace model
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch", "onnx" or "onnx-int8"
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))  # Intra-op inference threads (0 = library default)
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "0"))  # Matryoshka truncation, e.g. 256 or 512 (0 = full 768)
+    EMBEDDING_ONNX_FILE: str = os.getenv("EMBEDDING_ONNX_FILE", "")  # Override the ONNX file used by the onnx backends
     CHAT_MODEL: str = "llama-3.1-8b-instant"  # Groq Llama 3.1 8B (current model)
+    CHAT_TEMPERATURE: float = 0.7
+    CHAT_MAX_TOKENS: int = 1000
+    
+    # LLM Gateway Configuration (defaults match the Groq free tier for llama-3.1-8b-instant)
+    GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "")  # Empty for api.groq.com; e.g. http://localhost:8001 for llm_stub.py
+    LLM_RPM_LIMIT: int = int(os.getenv("LLM_RPM_LIMIT", "30"))  # Requests per minute (0 disables)
+    LLM_TPM_LIMIT: int = int(os.getenv("LLM_TPM_LIMIT", "6000"))  # Tokens per minute (0 disables)
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))  # Concurrent completions
+    LLM_MAX_QUEUED: int = 64  # Requests waiting for a slot before new ones get 503
+    LLM_QUEUE_TIMEOUT: float = 10.0  # Seconds a request may wait for rate budget or a slot
+    LLM_MAX_RETRIES: int = 3  # Retries on 429, 5xx and connection errors
+    LLM_TIMEOUT: float = 60.0  # Seconds per provider request
+    LLM_MAX_CONNECTIONS: int = 32  # Pooled HTTP connections to the provider
     
     # Database Configuration
     CHROMA_PERSIST_DIR: Path = BACKEND_DIR / "chroma_db"
     COLLECTION_NAME: str = "pdf_documents"
+    CHROMA_SYNC_THRESHOLD: int = int(os.getenv("CHROMA_SYNC_THRESHOLD", "1000"))  # Vectors written before the HNSW index is flushed to disk
+    BM25_INDEX_PATH: Path = CHROMA_PERSIST_DIR / "bm25_index.pkl"
+    DOCUMENT_REGISTRY_PATH: Path = CHROMA_PERSIST_DIR / "documents.db"
+    
+    # Tenant Configuration (each tenant gets its own collection and side indexes)
+    DEFAULT_TENANT: str = "default"  # Uses COLLECTION_NAME and the paths above
+    MAX_OPEN_COLLECTIONS: int = int(os.getenv("MAX_OPEN_COLLECTIONS", "64"))  # Per-tenant handles kept open (LRU)
     
     # Upload Configuration
     UPLOAD_DIR: Path = BACKEND_DIR / "uploads"
@@ -34,7 +58,56 @@ class Settings:
     # RAG Configuration
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNKING_MODE: str = os.getenv("CHUNKING_MODE", "characters")  # "characters" or "tokens"
+    CHUNK_SIZE_TOKENS: int = 256  # Used when CHUNKING_MODE is "tokens"
+    CHUNK_OVERLAP_TOKENS: int = 32
     TOP_K_RESULTS: int = 4
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"  # BM25 + vector
+    HYBRID_CANDIDATES: int = 20  # Candidates taken from each retriever before fusion
+    RRF_K: int = 60  # Reciprocal Rank Fusion damping constant
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"  # Cross-encoder rerank stage
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")  # Small CPU cross-encoder
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "20"))  # Chunks scored before keeping top_k
+    RERANK_BATCH_SIZE: int = 16  # Pairs per cross-encoder forward pass
+    RERANK_BUDGET_MS: int = int(os.getenv("RERANK_BUDGET_MS", "300"))  # Per-request budget before falling back to retrieval order
+    RERANK_CACHE_MAX_ENTRIES: int = 50_000  # Cached (question, chunk) scores
+    CONTEXT_PACKING_ENABLED: bool = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"  # Merge/dedup/budget context
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # Estimated prompt tokens for context (0 = no limit)
+    CONTEXT_DEDUP_THRESHOLD: float = 0.9  # Share of a passage repeated elsewhere before it is dropped (0 disables)
+    BATCH_QUERY_MAX_QUESTIONS: int = 100  # Questions accepted by /query/batch
+    BATCH_QUERY_CONCURRENCY: int = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))  # Concurrent LLM calls per batch
+    BATCH_QUERY_QUEUE_TIMEOUT: float = float(os.getenv("BATCH_QUERY_QUEUE_TIMEOUT", "120"))  # Seconds a batch question may wait for rate budget
+    
+    # Query Embedding Batching Configuration
+    QUERY_BATCHING_ENABLED: bool = os.getenv("QUERY_BATCHING_ENABLED", "true").lower() == "true"  # Coalesce concurrent query encodes
+    QUERY_BATCH_MAX_SIZE: int = 32  # Questions per batched encode
+    QUERY_BATCH_MAX_WAIT_MS: float = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))  # Longest a query waits for others to join
+    
+    # Embedding Cache Configuration
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: Path = BACKEND_DIR / "embedding_cache" / "embeddings.db"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500_000  # ~1.5GB of 768-dim float32 vectors
+    
+    # Answer Cache Configuration
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95  # Cosine similarity for near-duplicate questions (0 disables)
+    
+    # Ingestion Configuration
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))  # PDF extraction processes
+    PARALLEL_EXTRACTION_MIN_PAGES: int = 200  # Smaller PDFs are extracted in-process (~2ms/page serially)
+    INGEST_BATCH_SIZE: int = 256  # Chunks per embed/write batch
+    EMBEDDING_BATCH_SIZE: int = 32  # Chunks per model forward pass
+    INGEST_PAGE_BUFFER: int = 64  # Extracted pages buffered ahead of the chunker
+    INGEST_BATCH_BUFFER: int = 2  # Embedded batches buffered ahead of the Chroma writer
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))  # Concurrent indexing jobs
+    MAX_PENDING_JOBS: int = 32  # Queued + running jobs before uploads are rejected
+    JOB_HISTORY_LIMIT: int = 1000  # Finished jobs kept for status polling
+    
+    # Startup Configuration
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"  # Load model in background at startup
+    WARMUP_MAX_COLLECTIONS: int = int(os.getenv("WARMUP_MAX_COLLECTIONS", "8"))  # Tenant indexes loaded at startup (default tenant first)
     
     # API Configuration
     API_TITLE: str = "RAG Chatbot Backend"
@@ -0,0 +1,72 @@
+"""Shared pytest setup for the backend tests"""
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+# config refuses to load without an API key; tests talk to llm_stub instead of Groq
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from config import settings
+from embeddings import EmbeddingBackend
+from sample_documents import write_pdf
+
+# Keep every store the tests touch out of the real data directories
+DATA_DIR = Path(tempfile.mkdtemp(prefix="talking-pdf-tests-"))
+settings.CHROMA_PERSIST_DIR = DATA_DIR / "chroma"
+settings.BM25_INDEX_PATH = DATA_DIR / "chroma" / "bm25_index.pkl"
+settings.DOCUMENT_REGISTRY_PATH = DATA_DIR / "chroma" / "documents.db"
+settings.EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache" / "embeddings.db"
+settings.UPLOAD_DIR = DATA_DIR / "uploads"
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """Deterministic hash-based vectors, so tests don't need the real model"""
+
+    name = "fake"
+    dimension = 16
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        self.encoded += len(texts)
+        vectors = np.stack([
+            np.frombuffer(hashlib.sha256(text.encode()).digest()[:self.dimension], dtype=np.uint8)
+            for text in texts
+        ]).astype(np.float32) + 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def token_offsets(self, text: str) -> List[tuple]:
+        return [match.span() for match in re.finditer(r"\w+|[^\w\s]", text)]
+
+
+@pytest.fixture
+def embedding_model():
+    """Swap the embedding model for a FakeEmbeddingBackend for one test"""
+    import rag
+
+    model = FakeEmbeddingBackend()
+    rag._embedding_model.reset(model)
+    yield model
+    rag._embedding_model.reset()
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Factory writing a synthetic text PDF with the given number of pages"""
+    def make(pages: int, name: str = "doc.pdf", seed: int = 42):
+        path = tmp_path / name
+        write_pdf(path, pages, seed=seed)
+        return path
+    return make
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
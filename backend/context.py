@@ -0,0 +1,281 @@
+"""Context assembly: merge overlapping chunks, drop near-duplicates and pack into a token budget"""
+import re
+import threading
+from typing import List, NamedTuple
+
+from llm import CHARS_PER_TOKEN
+
+# Characters of the next chunk used to locate the overlap in the previous one
+OVERLAP_PROBE = 32
+
+SENTENCE_END = re.compile(r"[.!?]\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the LLM tokens of a piece of text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_context(texts: List[str]) -> str:
+    """
+    Format passages as numbered context sections for the prompt
+
+    Args:
+        texts: Passage texts, most relevant first
+
+    Returns:
+        Context text
+    """
+    return "\n\n".join(f"[Context {i+1}]\n{text}" for i, text in enumerate(texts))
+
+
+class Passage:
+    """A contiguous piece of one document, built from one or more chunks"""
+
+    __slots__ = ("text", "source", "pages", "first_index", "last_index", "rank", "chunk_ids")
+
+    def __init__(self, chunk_id: str, text: str, meta: dict, rank: int):
+        self.text = text
+        self.source = meta.get("source", "Unknown")
+        pages_str = meta.get("pages", "")
+        self.pages = [int(p) for p in pages_str.split(",") if p.strip()] if pages_str else []
+        chunk_index = meta.get("chunk_index")
+        self.first_index = chunk_index
+        self.last_index = chunk_index
+        self.rank = rank
+        self.chunk_ids = [chunk_id]
+
+    @property
+    def meta(self) -> dict:
+        """Metadata in the same shape as a stored chunk's"""
+        return {"source": self.source, "pages": ",".join(map(str, self.pages))}
+
+    def follows(self, other: "Passage") -> bool:
+        """Whether this passage starts right after ``other`` in the same document"""
+        return (
+            self.source == other.source
+            and self.first_index is not None
+            and other.last_index is not None
+            and self.first_index == other.last_index + 1
+        )
+
+    def extend(self, other: "Passage"):
+        """Append the following passage, removing the text the two share"""
+        self.text = merge_overlap(self.text, other.text)
+        self.pages = sorted(set(self.pages) | set(other.pages))
+        self.last_index = other.last_index
+        self.rank = min(self.rank, other.rank)
+        self.chunk_ids.extend(other.chunk_ids)
+
+
+def merge_overlap(first: str, second: str) -> str:
+    """
+    Join two consecutive chunks, keeping the text they overlap on only once
+
+    Args:
+        first: Earlier chunk
+        second: Following chunk
+
+    Returns:
+        Merged text
+    """
+    probe = second[:OVERLAP_PROBE]
+    position = first.rfind(probe) if probe else -1
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first[:position] + second
+        position = first.rfind(probe, 0, position)
+    return f"{first} {second}"
+
+
+def merge_adjacent(passages: List[Passage]) -> List[Passage]:
+    """
+    Merge passages that are consecutive chunks of the same document
+
+    Args:
+        passages: Passages in rank order
+
+    Returns:
+        Merged passages in rank order (a merged passage takes its best rank)
+    """
+    ordered = sorted(
+        passages,
+        key=lambda passage: (passage.source, passage.first_index is None, passage.first_index or 0)
+    )
+    merged = []
+    for passage in ordered:
+        if merged and passage.follows(merged[-1]):
+            merged[-1].extend(passage)
+        else:
+            merged.append(passage)
+    return sorted(merged, key=lambda passage: passage.rank)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Set of word n-grams used for near-duplicate detection"""
+    words = text.lower().split()
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(passages: List[Passage], threshold: float) -> List[Passage]:
+    """
+    Drop passages that mostly repeat a more relevant passage
+
+    Args:
+        passages: Passages in rank order
+        threshold: Containment (share of a passage's shingles found in a kept passage) at or above which it is dropped
+
+    Returns:
+        Kept passages in rank order
+    """
+    kept = []
+    kept_shingles = []
+    for passage in passages:
+        current = shingles(passage.text)
+        if any(len(current & other) >= threshold * len(current) for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(current)
+    return kept
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to about ``max_tokens``, preferring a sentence boundary
+
+    Args:
+        text: Text to cut
+        max_tokens: Token budget
+
+    Returns:
+        Truncated text
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+
+    cut = text[:limit]
+    sentence_ends = [match.end() for match in SENTENCE_END.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] > limit // 2:
+        return cut[:sentence_ends[-1]].rstrip()
+
+    space = cut.rfind(" ")
+    return cut[:space] if space > limit // 2 else cut
+
+
+class PackedContext(NamedTuple):
+    """Result of packing retrieved chunks into a prompt context"""
+    context: str
+    passages: List[Passage]
+    chunk_count: int
+    merged: int
+    duplicates: int
+    truncated: bool
+    tokens: int
+    tokens_saved: int
+
+    def stats(self) -> dict:
+        """Per-query packing statistics"""
+        return {
+            "chunks": self.chunk_count,
+            "passages": len(self.passages),
+            "merged": self.merged,
+            "duplicates": self.duplicates,
+            "truncated": self.truncated,
+            "context_tokens": self.tokens,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+def pack_context(
+    chunks: List[tuple],
+    token_budget: int,
+    dedup_threshold: float = 0.9,
+    min_fragment_tokens: int = 64
+) -> PackedContext:
+    """
+    Assemble the prompt context from ranked chunks
+
+    Consecutive chunks of the same document are merged (dropping their
+    overlap), passages that mostly repeat a more relevant one are dropped,
+    and the rest are added in relevance order until the token budget is
+    spent. A passage that doesn't fit is cut to the remaining budget if at
+    least ``min_fragment_tokens`` are left.
+
+    Args:
+        chunks: (chunk_id, text, metadata) tuples, most relevant first
+        token_budget: Maximum estimated tokens of the context (0 for no limit)
+        dedup_threshold: Shingle containment at which a passage counts as a duplicate (0 disables)
+        min_fragment_tokens: Smallest truncated passage worth including
+
+    Returns:
+        PackedContext with the context text and how many tokens were saved
+    """
+    baseline = estimate_tokens(format_context([text for _, text, _ in chunks]))
+
+    passages = [Passage(chunk_id, text, meta, rank) for rank, (chunk_id, text, meta) in enumerate(chunks)]
+    passages = merge_adjacent(passages)
+    merged = len(chunks) - len(passages)
+
+    if dedup_threshold:
+        unique = drop_near_duplicates(passages, dedup_threshold)
+        duplicates = len(passages) - len(unique)
+        passages = unique
+    else:
+        duplicates = 0
+
+    packed = []
+    truncated = False
+    remaining = token_budget
+    for passage in passages:
+        # Account for the "[Context n]" header and separator
+        cost = estimate_tokens(passage.text) + 6
+        if not token_budget or cost <= remaining:
+            packed.append(passage)
+            remaining -= cost
+        elif remaining - 6 >= min_fragment_tokens:
+            passage.text = truncate_to_tokens(passage.text, remaining - 6)
+            packed.append(passage)
+            truncated = True
+            break
+
+    context = format_context([passage.text for passage in packed])
+    tokens = estimate_tokens(context) if packed else 0
+    return PackedContext(
+        context=context,
+        passages=packed,
+        chunk_count=len(chunks),
+        merged=merged,
+        duplicates=duplicates,
+        truncated=truncated,
+        tokens=tokens,
+        tokens_saved=max(0, baseline - tokens) if chunks else 0,
+    )
+
+
+class PackingStats:
+    """Running totals of context tokens before and after packing"""
+
+    def __init__(self):
+        self.queries = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def record(self, packed: PackedContext):
+        with self._lock:
+            self.queries += 1
+            self.tokens_after += packed.tokens
+            self.tokens_before += packed.tokens + packed.tokens_saved
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+                "avg_tokens_saved": round((self.tokens_before - self.tokens_after) / self.queries, 1) if self.queries else 0.0,
+            }
@@ -1,76 +1,510 @@
 """Database configuration and initialization for ChromaDB"""
+import re
 import logging
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 
 from config import settings
+from lazy import Lazy, LazyPool
+from registry import DocumentRegistry
 
 logger = logging.getLogger(__name__)
 
-# Initialize ChromaDB with persistent storage
-try:
-    chroma_client = chromadb.Client(
-        ChromaSettings(
-            persist_directory=str(settings.CHROMA_PERSIST_DIR),
-            anonymized_telemetry=False
+COLLECTION_METADATA = {"description": "PDF document embeddings for RAG chatbot"}
+
+# Collection metadata key recording the (Matryoshka-truncated) vector dimension
+EMBEDDING_DIMENSION_KEY = "embedding_dimension"
+
+# Suffix of the temporary collection written by migrate_dimension.py. Tenant ids can't
+# contain ".", so no tenant's collection name can end with it
+STAGING_SUFFIX = ".migrating"
+
+DEFAULT_TENANT = settings.DEFAULT_TENANT
+
+# Tenant ids become part of collection names and paths, so keep them to a safe alphabet
+TENANT_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,62}[A-Za-z0-9])?$")
+
+
+class InvalidTenantError(ValueError):
+    """Raised for tenant ids that can't be used as a collection name"""
+
+
+def validate_tenant(tenant_id: str) -> str:
+    """
+    Check that a tenant id is usable
+    
+    Args:
+        tenant_id: Tenant or workspace id
+        
+    Returns:
+        The tenant id
+        
+    Raises:
+        InvalidTenantError: If the id is empty, too long or has unsupported characters
+    """
+    if not tenant_id or not TENANT_PATTERN.match(tenant_id):
+        raise InvalidTenantError(
+            f"Invalid tenant id {tenant_id!r}: use 1-64 letters, digits, '-' or '_'"
+        )
+    return tenant_id
+
+
+def collection_name(tenant_id: str) -> str:
+    """
+    Name of a tenant's Chroma collection
+    
+    The default tenant keeps the original collection name.
+    """
+    if tenant_id == DEFAULT_TENANT:
+        return settings.COLLECTION_NAME
+    return f"{settings.COLLECTION_NAME}-{tenant_id}"
+
+
+def staging_collection_name(tenant_id: str) -> str:
+    """Name of the temporary collection a dimension migration writes a tenant's vectors to"""
+    return f"{collection_name(tenant_id)}{STAGING_SUFFIX}"
+
+
+def collection_metadata(dimension: Optional[int] = None) -> dict:
+    """
+    Metadata for a new collection
+    
+    Args:
+        dimension: Stored vector dimension; None uses EMBEDDING_DIMENSION, 0 means full-size
+    """
+    if dimension is None:
+        dimension = settings.EMBEDDING_DIMENSION
+    metadata = dict(COLLECTION_METADATA)
+    metadata["hnsw:sync_threshold"] = settings.CHROMA_SYNC_THRESHOLD
+    if dimension:
+        metadata[EMBEDDING_DIMENSION_KEY] = dimension
+    return metadata
+
+
+def collection_dimension(collection) -> Optional[int]:
+    """
+    Vector dimension a collection stores
+    
+    Returns:
+        The truncated dimension, or None for full-size model embeddings
+    """
+    return (collection.metadata or {}).get(EMBEDDING_DIMENSION_KEY) or None
+
+
+def as_vectors(embeddings) -> np.ndarray:
+    """
+    Embeddings in the form Chroma takes without per-element conversion
+    
+    Chroma accepts a 2D float32 array directly and splits it into row views,
+    so no Python float objects are created (``.tolist()`` builds one per
+    component, which Chroma then converts back to arrays).
+    
+    Args:
+        embeddings: Array of shape (n, dim)
+        
+    Returns:
+        C-contiguous float32 array (the input itself if it already is one)
+    """
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def tenant_path(path: Path, tenant_id: str) -> Path:
+    """
+    Per-tenant location of a file stored next to the collection
+    
+    The default tenant keeps the configured path; other tenants get the same
+    filename under a ``tenants/<tenant_id>/`` directory beside it.
+    
+    Args:
+        path: Configured path for the default tenant
+        tenant_id: Tenant id
+        
+    Returns:
+        Path for the tenant
+    """
+    if tenant_id == DEFAULT_TENANT:
+        return path
+    return path.parent / "tenants" / tenant_id / path.name
+
+
+def _create_client():
+    """
+    Open the on-disk ChromaDB store
+    
+    Every write is committed to Chroma's SQLite log before ``add`` returns, so
+    it survives a restart or crash. Each collection's HNSW index is flushed to
+    disk every ``CHROMA_SYNC_THRESHOLD`` vectors; writes since the last flush
+    are replayed from the log when the index is next loaded.
+    """
+    try:
+        client = chromadb.PersistentClient(
+            path=str(settings.CHROMA_PERSIST_DIR),
+            settings=ChromaSettings(anonymized_telemetry=False)
         )
-    )
+        logger.info(f"Persist directory: {settings.CHROMA_PERSIST_DIR}")
+        recover_migrations(client)
+        return client
+    except Exception as e:
+        logger.error(f"Failed to initialize ChromaDB: {e}")
+        raise
+
+
+def recover_migrations(client) -> List[str]:
+    """
+    Finish dimension migrations interrupted between dropping and renaming
+    
+    migrate_dimension.py only deletes the original collection once its
+    staging collection holds every chunk, so a staging collection whose
+    original is gone is complete and is renamed into place. A staging
+    collection next to its original is a partial copy and is left for the
+    next migration run to discard.
+    
+    Args:
+        client: ChromaDB client
+        
+    Returns:
+        Names of the collections that were restored
+    """
+    names = {collection.name for collection in client.list_collections()}
+    recovered = []
+    for staging_name in sorted(names):
+        if not staging_name.endswith(STAGING_SUFFIX):
+            continue
+        name = staging_name[:-len(STAGING_SUFFIX)]
+        if name not in names:
+            client.get_collection(staging_name).modify(name=name)
+            logger.warning(f"Restored collection {name} from an interrupted dimension migration")
+            recovered.append(name)
+    return recovered
+
+
+# Opened on first use so importing this module stays instant
+_client = Lazy("ChromaDB client", _create_client)
+
+
+def get_client():
+    """
+    Get the ChromaDB client, opening it on first use
+    """
+    return _client.get()
+
+
+class CollectionManager:
+    """
+    Maps tenant ids to their own Chroma collections
+    
+    Every tenant has a separate collection (and so a separate HNSW index),
+    so search cost grows with the tenant's own corpus rather than with all
+    tenants' data. Open handles are pooled and the least recently used ones
+    are dropped once more than ``max_open`` tenants are active.
+    """
+
+    def __init__(self, max_open: int):
+        self._handles = LazyPool("ChromaDB collection", self._open, max_size=max_open)
+
+    def _open(self, tenant_id: str):
+        """Get or create a tenant's collection with metadata"""
+        collection = get_client().get_or_create_collection(
+            name=collection_name(tenant_id),
+            metadata=collection_metadata()
+        )
+        
+        # Queries always use the stored dimension, so a mismatch is only fixed up while empty
+        stored = collection_dimension(collection)
+        if stored != (settings.EMBEDDING_DIMENSION or None):
+            if collection.count() == 0:
+                collection.modify(metadata=collection_metadata())
+            else:
+                logger.warning(
+                    f"Collection {collection.name} stores {stored or 'full-size'} dimension embeddings "
+                    f"but EMBEDDING_DIMENSION is {settings.EMBEDDING_DIMENSION or 'full-size'}; "
+                    f"run migrate_dimension.py to convert it"
+                )
+        
+        logger.info(f"ChromaDB initialized with collection: {collection.name}")
+        return collection
+
+    def get(self, tenant_id: str):
+        """
+        Get a tenant's collection, opening it on first use
+        
+        Args:
+            tenant_id: Tenant id
+        """
+        return self._handles.get(validate_tenant(tenant_id))
+
+    def loaded(self, tenant_id: str) -> bool:
+        """Whether a tenant's collection handle is open"""
+        return self._handles.loaded(tenant_id)
+
+    def recreate(self, tenant_id: str):
+        """
+        Delete a tenant's collection and replace it with an empty one
+        
+        Args:
+            tenant_id: Tenant id
+        """
+        name = collection_name(validate_tenant(tenant_id))
+        client = get_client()
+        client.delete_collection(name=name)
+        self._handles.set(tenant_id, client.get_or_create_collection(name=name, metadata=collection_metadata()))
+    
+    def replace(self, tenant_id: str, collection):
+        """
+        Point a tenant at a different collection handle (e.g. after a migration)
+        
+        Args:
+            tenant_id: Tenant id
+            collection: Collection now holding the tenant's documents
+        """
+        self._handles.set(validate_tenant(tenant_id), collection)
+
+    def stats(self) -> dict:
+        """Open handle counters"""
+        return self._handles.stats()
+
+
+collections = CollectionManager(max_open=settings.MAX_OPEN_COLLECTIONS)
+
+# Document registries, one SQLite file per tenant
+_registries = LazyPool(
+    "document registry",
+    lambda tenant_id: DocumentRegistry(tenant_path(settings.DOCUMENT_REGISTRY_PATH, tenant_id)),
+    max_size=settings.MAX_OPEN_COLLECTIONS
+)
+
+
+def get_collection(tenant_id: str = DEFAULT_TENANT):
+    """
+    Get a tenant's document collection, opening it on first use
+    
+    Always call this instead of caching the collection, since
+    clear_collection replaces it.
+    
+    Args:
+        tenant_id: Tenant id
+    """
+    return collections.get(tenant_id)
+
+
+def get_registry(tenant_id: str = DEFAULT_TENANT) -> DocumentRegistry:
+    """
+    Get a tenant's registry of indexed documents, opening it on first use
+    
+    Args:
+        tenant_id: Tenant id
+    """
+    return _registries.get(validate_tenant(tenant_id))
+
+
+# Tenants whose vector index has been loaded into memory
+_warm_tenants = set()
+_warm_lock = threading.Lock()
+
+
+def warm_index(tenant_id: str = DEFAULT_TENANT) -> int:
+    """
+    Load a tenant's HNSW index into memory
+    
+    Chroma reads the index from disk, and replays writes made since its last
+    flush, on the first query against a collection. One query with a stored
+    vector pays that cost here instead of in a user's request.
+    
+    Args:
+        tenant_id: Tenant id
+        
+    Returns:
+        Number of vectors in the collection
+    """
+    collection = get_collection(tenant_id)
+    count = collection.count()
+    if count:
+        sample = collection.get(limit=1, include=["embeddings"])
+        collection.query(query_embeddings=as_vectors(sample["embeddings"]), n_results=1, include=[])
+    with _warm_lock:
+        _warm_tenants.add(tenant_id)
+    return count
+
+
+def stored_tenants() -> List[str]:
+    """
+    Tenant ids that have a collection in the store, the default tenant first
+    """
+    prefix = f"{settings.COLLECTION_NAME}-"
+    tenants = []
+    for collection in get_client().list_collections():
+        name = collection.name
+        if name == settings.COLLECTION_NAME:
+            tenants.insert(0, DEFAULT_TENANT)
+        elif name.startswith(prefix) and not name.endswith(STAGING_SUFFIX):
+            tenants.append(name[len(prefix):])
+    return tenants
+
+
+def warm_indexes(max_collections: int) -> dict:
+    """
+    Load the default tenant's index, then other stored tenants' indexes
+    
+    Args:
+        max_collections: Most collections to load, including the default tenant's
+        
+    Returns:
+        Dictionary with the number of collections and vectors loaded
+    """
+    tenants = [DEFAULT_TENANT] + [tenant for tenant in stored_tenants() if tenant != DEFAULT_TENANT]
+    vectors = 0
+    for tenant_id in tenants[:max(1, max_collections)]:
+        count = warm_index(tenant_id)
+        logger.info(f"Loaded index of {collection_name(tenant_id)} ({count} vectors)")
+        vectors += count
+    return {"collections": min(len(tenants), max(1, max_collections)), "vectors": vectors}
+
+
+def is_ready() -> bool:
+    """
+    Whether the default tenant's collection is open
     
-    # Get or create collection with metadata
-    collection = chroma_client.get_or_create_collection(
-        name=settings.COLLECTION_NAME,
-        metadata={"description": "PDF document embeddings for RAG chatbot"}
-    )
+    When warming up at startup this also waits for its index to be loaded,
+    so a restarted node only reports ready once queries are fast.
+    """
+    if settings.WARMUP_ON_STARTUP:
+        return DEFAULT_TENANT in _warm_tenants
+    return collections.loaded(DEFAULT_TENANT)
+
+
+# Callbacks invoked with the tenant id whenever its collection contents change (e.g. cache invalidation)
+_change_listeners: List[Callable[[str], None]] = []
+
+
+def on_collection_change(listener: Callable[[str], None]):
+    """
+    Register a callback to run whenever a collection's contents change
     
-    logger.info(f"ChromaDB initialized with collection: {settings.COLLECTION_NAME}")
-    logger.info(f"Persist directory: {settings.CHROMA_PERSIST_DIR}")
+    Args:
+        listener: Callable taking the tenant id
+    """
+    _change_listeners.append(listener)
+
+
+# Callbacks invoked with the tenant id when its collection is wiped (e.g. to reset side indexes)
+_clear_listeners: List[Callable[[str], None]] = []
+
+
+def on_collection_clear(listener: Callable[[str], None]):
+    """
+    Register a callback to run when a collection is cleared
     
-except Exception as e:
-    logger.error(f"Failed to initialize ChromaDB: {e}")
-    raise
+    Args:
+        listener: Callable taking the tenant id
+    """
+    _clear_listeners.append(listener)
+
 
+# Callbacks invoked with the tenant id and file hashes that registry entries stopped referencing
+# (document deleted, re-indexed with other contents, or collection cleared), e.g. to delete stored uploads
+_release_listeners: List[Callable[[str, List[str]], None]] = []
 
-def get_collection_stats() -> dict:
+
+def on_files_released(listener: Callable[[str, List[str]], None]):
     """
-    Get statistics about the current collection
+    Register a callback to run when documents stop referencing file contents
     
+    Args:
+        listener: Callable taking the tenant id and the released SHA-256 hashes
+    """
+    _release_listeners.append(listener)
+
+
+def notify_files_released(tenant_id: str, file_hashes: List[str]):
+    """
+    Notify registered listeners that documents no longer reference these file contents
+    
+    Args:
+        tenant_id: Tenant whose registry changed
+        file_hashes: SHA-256 hashes of the released contents
+    """
+    if not file_hashes:
+        return
+    for listener in _release_listeners:
+        try:
+            listener(tenant_id, file_hashes)
+        except Exception as e:
+            logger.error(f"File release listener failed: {e}")
+
+
+def notify_collection_changed(tenant_id: str = DEFAULT_TENANT):
+    """
+    Notify registered listeners that documents were added, updated or removed
+    
+    Args:
+        tenant_id: Tenant whose collection changed
+    """
+    for listener in _change_listeners:
+        try:
+            listener(tenant_id)
+        except Exception as e:
+            logger.error(f"Collection change listener failed: {e}")
+
+
+def get_collection_stats(tenant_id: str = DEFAULT_TENANT) -> dict:
+    """
+    Get statistics about a tenant's collection
+    
+    Args:
+        tenant_id: Tenant id
+        
     Returns:
         Dictionary with collection statistics
     """
+    name = collection_name(tenant_id)
     try:
-        count = collection.count()
+        collection = get_collection(tenant_id)
         return {
-            "name": settings.COLLECTION_NAME,
-            "document_count": count,
-            "persist_directory": settings.CHROMA_PERSIST_DIR
+            "name": name,
+            "tenant": tenant_id,
+            "document_count": collection.count(),
+            "embedding_dimension": collection_dimension(collection),
+            "persist_directory": settings.CHROMA_PERSIST_DIR,
+            "open_collections": collections.stats()
         }
     except Exception as e:
         logger.error(f"Failed to get collection stats: {e}")
         return {
-            "name": settings.COLLECTION_NAME,
+            "name": name,
+            "tenant": tenant_id,
             "document_count": 0,
             "error": str(e)
         }
 
 
-def clear_collection():
+def clear_collection(tenant_id: str = DEFAULT_TENANT):
     """
-    Clear all documents from the collection
-    """
-    global collection, chroma_client
+    Clear all documents from a tenant's collection
     
+    Args:
+        tenant_id: Tenant id
+    """
     try:
-        # Delete the collection
-        chroma_client.delete_collection(name=settings.COLLECTION_NAME)
+        # Delete and recreate the collection
+        collections.recreate(tenant_id)
         
-        # Recreate it
-        collection = chroma_client.get_or_create_collection(
-            name=settings.COLLECTION_NAME,
-            metadata={"description": "PDF document embeddings for RAG chatbot"}
-        )
+        registry = get_registry(tenant_id)
+        file_hashes = [document["file_hash"] for document in registry.list()]
+        registry.clear()
         
-        logger.info("Collection cleared and recreated")
+        logger.info(f"Collection {collection_name(tenant_id)} cleared and recreated")
         
+        for listener in _clear_listeners:
+            listener(tenant_id)
+        
+        notify_collection_changed(tenant_id)
+        notify_files_released(tenant_id, file_hashes)
+    
     except Exception as e:
         logger.error(f"Failed to clear collection: {e}")
         raise
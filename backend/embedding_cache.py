@@ -0,0 +1,170 @@
+"""Persistent on-disk cache for chunk embeddings"""
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Recency updates buffered in memory before they are written in one transaction
+TOUCH_FLUSH_SIZE = 1000
+
+# Eviction frees this fraction of max_entries beyond the excess, so it doesn't run on every write at capacity
+EVICTION_SLACK = 0.05
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed embedding cache keyed by (model name, text hash)
+
+    Vectors are stored as raw float32 blobs. When the cache grows past
+    ``max_entries`` the least recently used entries are evicted.
+
+    Lookups don't write: the access times of hits are buffered in memory and
+    written with the next ``put_many`` (or once enough have accumulated), so
+    after a crash recency may be slightly stale, which only affects which
+    entries are evicted first. The entry count is kept in memory from a
+    single ``COUNT(*)`` at open, which assumes one process writes the cache.
+    """
+
+    def __init__(self, path: Path, model_name: str, max_entries: int):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}  # text hash -> last access not yet written
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        logger.info(f"Embedding cache opened at {self.path} ({self._entries} entries)")
+
+    def count(self) -> int:
+        """Number of cached vectors across all models"""
+        return self._entries
+
+    def get_many(self, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached vectors
+
+        Args:
+            text_hashes: Hashes of the texts to look up
+
+        Returns:
+            Mapping of text hash to vector for every hash found in the cache
+        """
+        if not text_hashes:
+            return {}
+
+        unique = list(dict.fromkeys(text_hashes))
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._touched.update((text_hash, now) for text_hash in found)
+                if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                    self._write_touched()
+                    self._conn.commit()
+
+            self.hits += sum(1 for text_hash in text_hashes if text_hash in found)
+            self.misses += sum(1 for text_hash in text_hashes if text_hash not in found)
+
+        return found
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        """
+        Store vectors and evict the least recently used entries if over capacity
+
+        Args:
+            items: List of (text hash, vector) pairs
+        """
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._write_touched()
+            # A model always maps a text to the same vector, so existing entries can be kept as they are
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [
+                    (self.model_name, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                    for text_hash, vector in items
+                ]
+            ).rowcount
+            self._entries += inserted
+
+            if self._entries > self.max_entries:
+                excess = self._entries - self.max_entries + int(self.max_entries * EVICTION_SLACK)
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (excess,)
+                ).rowcount
+                self._entries -= evicted
+                self.evictions += evicted
+
+            self._conn.commit()
+
+    def flush(self):
+        """Write buffered access times to disk"""
+        with self._lock:
+            if self._touched:
+                self._write_touched()
+                self._conn.commit()
+
+    def _write_touched(self):
+        """Write buffered access times (the caller holds the lock and commits)"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+            [(last_access, self.model_name, text_hash) for text_hash, last_access in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.count(),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
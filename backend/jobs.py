@@ -0,0 +1,193 @@
+"""Background ingestion job queue for PDF indexing"""
+import uuid
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Job lifecycle states
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# Ingestion phases reported by index_pdf through its progress callback
+PHASE_EXTRACTING = "extracting"
+PHASE_CHUNKING = "chunking"
+PHASE_EMBEDDING = "embedding"
+PHASE_WRITING = "writing"
+PHASES = (PHASE_EXTRACTING, PHASE_CHUNKING, PHASE_EMBEDDING, PHASE_WRITING)
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no room for another job"""
+
+
+class IngestionJob:
+    """State of a single PDF ingestion job"""
+
+    def __init__(self, file_path: str, filename: str, worker_kwargs: Optional[dict] = None):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.filename = filename
+        self.worker_kwargs = worker_kwargs or {}
+        self.status = STATUS_QUEUED
+        self.phase: Optional[str] = None
+        self.chunks_processed = 0
+        self.total_chunks = 0
+        self.chunks_indexed: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (STATUS_COMPLETED, STATUS_FAILED)
+
+    def to_dict(self) -> dict:
+        """Serialize the job for the status endpoint"""
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "phase": self.phase,
+            "chunks_processed": self.chunks_processed,
+            "total_chunks": self.total_chunks,
+            "chunks_indexed": self.chunks_indexed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a bounded worker pool
+
+    Jobs are executed in worker threads so PDF extraction and embedding never
+    run on the event loop. At most ``max_pending`` jobs may be queued or
+    running at once; finished jobs are kept (up to ``history_limit``) so
+    clients can poll for the result. ``on_finished`` is called with each job
+    from its worker thread once the job no longer counts as active.
+    """
+
+    def __init__(
+        self,
+        worker: Callable,
+        max_workers: int,
+        max_pending: int,
+        history_limit: int,
+        on_finished: Optional[Callable[[IngestionJob], None]] = None
+    ):
+        self._worker = worker
+        self._on_finished = on_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._max_pending = max_pending
+        self._history_limit = history_limit
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, filename: str, **worker_kwargs) -> IngestionJob:
+        """
+        Queue a PDF for ingestion
+
+        Args:
+            file_path: Path to the saved PDF
+            filename: Original filename of the upload
+            **worker_kwargs: Extra keyword arguments passed to the worker (e.g. tenant_id)
+
+        Returns:
+            The queued job
+
+        Raises:
+            QueueFullError: If too many jobs are already pending
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self._max_pending:
+                raise QueueFullError(f"Ingestion queue is full ({pending} jobs pending)")
+
+            job = IngestionJob(file_path, filename, worker_kwargs)
+            self._jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued ingestion job {job.id} for {filename}")
+        return job
+
+    def find_active(self, file_path: str, **worker_kwargs) -> Optional[IngestionJob]:
+        """
+        Find a queued or running job for the same file and worker arguments
+
+        Args:
+            file_path: Path to the saved PDF
+            **worker_kwargs: Worker arguments the job must match (e.g. tenant_id)
+
+        Returns:
+            The unfinished job, or None
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.finished and job.file_path == file_path and all(
+                    job.worker_kwargs.get(key) == value for key, value in worker_kwargs.items()
+                ):
+                    return job
+        return None
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Look up a job by id"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        """Count jobs by status"""
+        with self._lock:
+            counts = {STATUS_QUEUED: 0, STATUS_RUNNING: 0, STATUS_COMPLETED: 0, STATUS_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and wait for running ones to finish"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _prune(self):
+        """Drop the oldest finished jobs once history exceeds its limit"""
+        excess = len(self._jobs) - self._history_limit
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestionJob):
+        job.status = STATUS_RUNNING
+        job.started_at = time.time()
+
+        def progress(phase: str, processed: int = 0, total: int = 0):
+            job.phase = phase
+            job.chunks_processed = processed
+            job.total_chunks = total
+
+        try:
+            job.chunks_indexed = self._worker(job.file_path, progress_callback=progress, **job.worker_kwargs)
+            job.status = STATUS_COMPLETED
+            logger.info(f"Ingestion job {job.id} indexed {job.chunks_indexed} chunks from {job.filename}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = STATUS_FAILED
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+
+        if self._on_finished is not None:
+            try:
+                self._on_finished(job)
+            except Exception as e:
+                logger.error(f"Finished-job callback failed for {job.id}: {e}")
@@ -0,0 +1,122 @@
+"""Thread-safe lazily initialized singletons"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    A value created on first use
+
+    The factory runs at most once even when several threads ask for the
+    value concurrently; the others block until it is ready. If the factory
+    raises, the error is propagated and the next call retries.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the value has been created"""
+        return self._loaded
+
+    def get(self) -> T:
+        """Return the value, creating it on first use"""
+        if self._loaded:
+            return self._value
+
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                logger.info(f"Initializing {self.name}")
+                self._value = self._factory()
+                self._loaded = True
+                logger.info(f"Initialized {self.name} in {time.perf_counter() - start:.2f}s")
+
+        return self._value
+
+    def reset(self, value: Optional[T] = None):
+        """Replace the value, or drop it so the next get() re-creates it"""
+        with self._lock:
+            self._value = value
+            self._loaded = value is not None
+
+
+class LazyPool(Generic[T]):
+    """
+    Keyed pool of lazily created values with least-recently-used eviction
+
+    Each key gets its own Lazy, so creating the value for one key never
+    blocks lookups of other keys. Once more than ``max_size`` keys are held
+    the least recently used one is dropped; it is re-created on next use.
+    """
+
+    def __init__(self, name: str, factory: Callable[[str], T], max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self._factory = factory
+        self._entries: "OrderedDict[str, Lazy[T]]" = OrderedDict()
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> T:
+        """Return the value for a key, creating it on first use"""
+        with self._lock:
+            entry = self._touch(key)
+        return entry.get()
+
+    def peek(self, key: str) -> Optional[T]:
+        """Return the value for a key if it is already loaded, without creating it"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry.get() if entry is not None and entry.loaded else None
+
+    def loaded(self, key: str) -> bool:
+        """Whether the value for a key is currently held"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry.loaded
+
+    def set(self, key: str, value: T):
+        """Replace the value held for a key"""
+        with self._lock:
+            entry = self._touch(key)
+        entry.reset(value)
+
+    def discard(self, key: str):
+        """Drop the value for a key"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """Pool size counters"""
+        with self._lock:
+            return {"open": len(self._entries), "max_size": self.max_size, "evictions": self.evictions}
+
+    def _touch(self, key: str) -> Lazy[T]:
+        """Get or add the entry for a key and mark it most recently used (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = Lazy(f"{self.name} [{key}]", lambda: self._factory(key))
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                logger.info(f"Evicted {self.name} [{evicted}] from pool")
+        else:
+            self._entries.move_to_end(key)
+        return entry
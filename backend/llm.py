@@ -0,0 +1,391 @@
+"""Async LLM gateway with pooled connections, rate limiting, retries and backpressure"""
+import math
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import httpx
+import groq
+from groq import AsyncGroq
+
+from metrics import registry, stage, LATENCY_BUCKETS, TOKEN_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+LLM_TOKENS = registry.histogram("rag_llm_tokens", "Tokens per LLM completion", TOKEN_BUCKETS, labelnames=("kind",))
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    "rag_llm_first_token_seconds",
+    "Time from sending a streamed completion to its first token",
+    LATENCY_BUCKETS
+)
+
+# Rough prompt size estimate used for TPM accounting before the provider reports usage
+CHARS_PER_TOKEN = 4
+
+# Provider errors worth retrying
+RETRYABLE_ERRORS = (
+    groq.RateLimitError,
+    groq.InternalServerError,
+    groq.APIConnectionError,
+    groq.APITimeoutError,
+)
+
+
+class OverloadedError(Exception):
+    """Raised when a request can't be admitted within the queue timeout"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """Estimate the prompt tokens of chat messages"""
+    return sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``rate_per_minute``
+
+    Reservations may take the bucket negative; the caller then waits until
+    the debt has been refilled.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens could be taken"""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self._tokens) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take tokens, going into debt if necessary
+
+        Args:
+            amount: Tokens to take (capped at the bucket capacity)
+
+        Returns:
+            Seconds to wait before the reservation is covered
+        """
+        wait = self.wait_time(amount)
+        self._tokens -= min(amount, self.capacity)
+        return wait
+
+    def refund(self, amount: float):
+        """Return unused tokens to the bucket"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class LLMGateway:
+    """
+    Async chat completion gateway in front of the Groq API
+
+    - One pooled HTTP client is shared by all requests
+    - Token buckets keep requests within the provider's RPM and TPM limits
+    - At most ``max_in_flight`` completions run at once and at most
+      ``max_queued`` wait for a slot; anything that can't be admitted within
+      ``queue_timeout`` seconds fails fast with OverloadedError
+    - 429s, 5xx and connection errors are retried with jittered exponential
+      backoff, honoring the provider's Retry-After header
+
+    Pointing ``base_url`` at a local server (see llm_stub.py) replaces Groq
+    for tests and benchmarks.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: Optional[str] = None,
+        rpm_limit: int = 0,
+        tpm_limit: int = 0,
+        max_in_flight: int = 16,
+        max_queued: int = 64,
+        queue_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        timeout: float = 60.0,
+        max_connections: int = 32,
+    ):
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url or None,
+            timeout=timeout,
+            max_retries=0,  # Retries are handled here so they respect the rate limiter
+            http_client=groq.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                )
+            )
+        )
+        self._requests = TokenBucket(rpm_limit) if rpm_limit else None
+        self._tokens = TokenBucket(tpm_limit) if tpm_limit else None
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._budget_changed = asyncio.Condition()
+        self._in_flight = 0
+        self._queued = 0
+
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+
+    async def complete(
+        self,
+        messages: List[dict],
+        max_tokens: int,
+        temperature: float,
+        queue_timeout: Optional[float] = None
+    ) -> str:
+        """
+        Generate a chat completion
+
+        Args:
+            messages: Chat messages
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            queue_timeout: Seconds to wait for rate budget and a slot
+                (defaults to the gateway's ``queue_timeout``)
+
+        Returns:
+            Generated text
+
+        Raises:
+            OverloadedError: If the request can't be admitted or the provider keeps rate limiting
+        """
+        reserved = estimate_tokens(messages) + max_tokens
+        async with self._admit(reserved, queue_timeout) as usage:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with stage("llm"):
+                        response = await self._client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens
+                        )
+                    if response.usage is not None:
+                        usage["tokens"] = response.usage.total_tokens
+                        LLM_TOKENS.labels("prompt").observe(response.usage.prompt_tokens)
+                        LLM_TOKENS.labels("completion").observe(response.usage.completion_tokens)
+                    return response.choices[0].message.content
+                except RETRYABLE_ERRORS as e:
+                    await self._backoff(e, attempt)
+
+    async def stream(self, messages: List[dict], max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        """
+        Generate a chat completion as a stream of text pieces
+
+        Failures are only retried before the first piece has been yielded.
+
+        Args:
+            messages: Chat messages
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+
+        Yields:
+            Generated text pieces
+
+        Raises:
+            OverloadedError: If the request can't be admitted or the provider keeps rate limiting
+        """
+        prompt_tokens = estimate_tokens(messages)
+        async with self._admit(prompt_tokens + max_tokens) as usage:
+            generated = 0
+            for attempt in range(self.max_retries + 1):
+                try:
+                    # Only time spent waiting on the provider counts, not the consumer's work between pieces
+                    with stage("llm") as timing:
+                        started = time.perf_counter()
+                        stream = await self._client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            stream=True
+                        )
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            token = chunk.choices[0].delta.content
+                            if token:
+                                if not generated:
+                                    LLM_FIRST_TOKEN_SECONDS.labels().observe(time.perf_counter() - started)
+                                generated += len(token)
+                                with timing.paused():
+                                    yield token
+                    usage["tokens"] = prompt_tokens + generated // CHARS_PER_TOKEN
+                    LLM_TOKENS.labels("prompt").observe(prompt_tokens)
+                    LLM_TOKENS.labels("completion").observe(generated // CHARS_PER_TOKEN)
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if generated:
+                        raise
+                    await self._backoff(e, attempt)
+
+    def check_capacity(self):
+        """
+        Fail fast if a new request would only join an already full queue
+
+        Raises:
+            OverloadedError: If every slot is busy and the wait queue is full
+        """
+        if self._in_flight >= self.max_in_flight and self._queued >= self.max_queued:
+            self.rejected += 1
+            raise OverloadedError("LLM gateway is overloaded", retry_after=1)
+
+    def stats(self) -> dict:
+        """Gateway counters"""
+        return {
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+    async def close(self):
+        """Close the pooled HTTP client"""
+        await self._client.close()
+
+    @asynccontextmanager
+    async def _admit(self, reserved_tokens: int, queue_timeout: Optional[float] = None):
+        """
+        Wait for rate limit budget and an in-flight slot
+
+        Waits for the buckets to refill, waking early whenever a finished
+        request refunds unused tokens, for up to ``queue_timeout`` seconds
+        (defaults to the gateway's). Yields a dict where the caller may record
+        the tokens actually used under "tokens"; the rest of the reservation
+        is refunded on exit.
+        """
+        self.check_capacity()
+        if queue_timeout is None:
+            queue_timeout = self.queue_timeout
+
+        usage = {"tokens": reserved_tokens}
+        reserved = False
+        self._queued += 1
+        try:
+            deadline = time.monotonic() + queue_timeout
+            with stage("llm_queue"):
+                while True:
+                    wait = self._budget_wait(reserved_tokens)
+                    if not wait:
+                        break
+                    remaining = deadline - time.monotonic()
+                    # Nothing in flight can refund tokens, so the wait can't get shorter
+                    if wait > remaining and (remaining <= 0 or not self._in_flight):
+                        self.rejected += 1
+                        raise OverloadedError(
+                            f"LLM rate limit budget exhausted, retry in {wait:.0f}s",
+                            retry_after=wait
+                        )
+                    try:
+                        async with self._budget_changed:
+                            await asyncio.wait_for(self._budget_changed.wait(), timeout=min(wait, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+
+                if self._requests is not None:
+                    self._requests.reserve(1)
+                if self._tokens is not None:
+                    self._tokens.reserve(reserved_tokens)
+                reserved = True
+
+                await asyncio.wait_for(self._slots.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            if reserved:
+                await self._refund(reserved_tokens, 0)
+            raise OverloadedError("Timed out waiting for an LLM slot", retry_after=queue_timeout)
+        except BaseException:
+            if reserved:
+                await self._refund(reserved_tokens, 0)
+            raise
+        finally:
+            self._queued -= 1
+
+        self._in_flight += 1
+        try:
+            yield usage
+            self.completed += 1
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            await self._refund(reserved_tokens, usage["tokens"])
+
+    def _budget_wait(self, reserved_tokens: int) -> float:
+        """Seconds until both buckets could cover a request"""
+        wait = 0.0
+        if self._requests is not None:
+            wait = self._requests.wait_time(1)
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.wait_time(reserved_tokens))
+        return wait
+
+    async def _refund(self, reserved: int, used: int):
+        if self._tokens is not None and used < reserved:
+            self._tokens.refund(reserved - used)
+            async with self._budget_changed:
+                self._budget_changed.notify_all()
+
+    async def _backoff(self, error: Exception, attempt: int):
+        """Sleep before the next attempt, or raise if retries are exhausted"""
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+
+        # Don't hold a slot for longer than a queued request would wait; let the client retry instead
+        if isinstance(error, groq.RateLimitError) and (
+            attempt >= self.max_retries or (retry_after or 0) > self.queue_timeout
+        ):
+            raise OverloadedError("LLM provider is rate limiting requests", retry_after=retry_after or 1) from error
+        if attempt >= self.max_retries:
+            raise error
+
+        # Full jitter keeps concurrent retries from synchronizing
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if self._requests is not None:
+            delay = max(delay, self._requests.reserve(1))
+
+        self.retries += 1
+        logger.warning(f"LLM request failed ({error.__class__.__name__}), retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
@@ -0,0 +1,151 @@
+"""
+Local stand-in for the Groq chat completions API
+
+Serves an OpenAI-compatible /openai/v1/chat/completions endpoint with
+configurable latency and rate limiting, so the backend can be exercised
+without network access or API quota. Point the backend at it with:
+
+    python llm_stub.py --port 8001
+    GROQ_BASE_URL=http://localhost:8001 python main.py
+"""
+import time
+import json
+import uuid
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(
+    latency: float = 0.2,
+    token_delay: float = 0.01,
+    answer_tokens: int = 50,
+    rpm_limit: int = 0,
+    fail_every: int = 0
+) -> FastAPI:
+    """
+    Build the stub API
+
+    Args:
+        latency: Seconds before the first token
+        token_delay: Seconds between streamed tokens
+        answer_tokens: Number of words in every answer
+        rpm_limit: Requests per minute before answering 429 (0 disables)
+        fail_every: Answer every Nth request with a 503 (0 disables)
+
+    Returns:
+        FastAPI application
+    """
+    app = FastAPI(title="LLM stub")
+    state = {"requests": 0, "window_start": time.monotonic(), "window_requests": 0}
+
+    def throttle():
+        """Return an error response if this request should be rejected"""
+        state["requests"] += 1
+        if fail_every and state["requests"] % fail_every == 0:
+            return JSONResponse(status_code=503, content={"error": {"message": "stub failure"}})
+
+        if rpm_limit:
+            now = time.monotonic()
+            if now - state["window_start"] >= 60:
+                state["window_start"] = now
+                state["window_requests"] = 0
+            state["window_requests"] += 1
+            if state["window_requests"] > rpm_limit:
+                retry_after = 60 - (now - state["window_start"])
+                return JSONResponse(
+                    status_code=429,
+                    content={"error": {"message": "rate limit exceeded"}},
+                    headers={"Retry-After": f"{retry_after:.0f}"}
+                )
+        return None
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": state["requests"]}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = throttle()
+        if error is not None:
+            return error
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        question = body["messages"][-1]["content"][-200:]
+        words = [f"word{i}" for i in range(answer_tokens)]
+        prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": answer_tokens,
+            "total_tokens": prompt_tokens + answer_tokens,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency + token_delay * answer_tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"Stub answer to: {question}\n" + " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        async def events():
+            await asyncio.sleep(latency)
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "x_groq": {"usage": usage},
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--answer-tokens", type=int, default=50, help="Words per answer")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Requests per minute before 429s (0 disables)")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with a 503 (0 disables)")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(
+        create_app(args.latency, args.token_delay, args.answer_tokens, args.rpm_limit, args.fail_every),
+        host=args.host,
+        port=args.port
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,35 @@
 """Main FastAPI application for RAG Chatbot Backend"""
 import os
-import shutil
+import json
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Annotated, List, Optional, Union
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Header, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field
 import logging
 
 from config import settings
-from rag import index_pdf, query_rag
-from db import get_collection_stats, clear_collection
+from rag import (
+    index_pdf, query_rag, stream_query_rag, batch_query_rag, warm_up, is_ready,
+    list_documents, delete_document, resolve_sources, get_llm_gateway, close_llm_gateway, flush_embedding_cache,
+    get_embedding_cache_stats, get_answer_cache_stats, get_sparse_index_stats, get_llm_stats,
+    get_context_stats, get_rerank_stats, get_query_batching_stats, find_indexed
+)
+from db import (
+    get_collection_stats, clear_collection, validate_tenant, InvalidTenantError, warm_indexes,
+    on_files_released, tenant_path, is_ready as collection_ready
+)
+from jobs import JobManager, IngestionJob, QueueFullError, STATUS_FAILED
+from uploads import receive_pdf, release_upload, remove_upload, stored_path, UploadError
+from llm import OverloadedError
+from utils import shutdown_extraction_pool
+from metrics import registry, LATENCY_BUCKETS
 
 # Configure logging
 logging.basicConfig(
@@ -20,11 +38,136 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def upload_dir(tenant_id: str) -> Path:
+    """Directory a tenant's uploads are stored in"""
+    return tenant_path(settings.UPLOAD_DIR, tenant_id)
+
+
+def remove_unused_uploads(tenant_id: str, file_hashes: List[str]):
+    """
+    Delete a tenant's stored uploads that no document or unfinished job uses any more
+    
+    Reads the registry, so call it off the event loop.
+    
+    Args:
+        tenant_id: Tenant id
+        file_hashes: SHA-256 hashes of the stored files to check
+    """
+    for file_hash in file_hashes:
+        path = stored_path(upload_dir(tenant_id), file_hash)
+        remove_upload(
+            path,
+            in_use=lambda: (
+                find_indexed(file_hash, tenant_id) is not None
+                or job_manager.find_active(str(path), tenant_id=tenant_id) is not None
+            )
+        )
+
+
+def remove_failed_upload(job: IngestionJob):
+    """Delete the stored file of a failed ingestion job unless something else uses it"""
+    if job.status == STATUS_FAILED and "file_hash" in job.worker_kwargs:
+        remove_unused_uploads(job.worker_kwargs["tenant_id"], [job.worker_kwargs["file_hash"]])
+
+
+# Background ingestion queue (keeps PDF parsing and embedding off the event loop)
+job_manager = JobManager(
+    index_pdf,
+    max_workers=settings.INGEST_WORKERS,
+    max_pending=settings.MAX_PENDING_JOBS,
+    history_limit=settings.JOB_HISTORY_LIMIT,
+    on_finished=remove_failed_upload
+)
+
+# Stored uploads go once no document references their contents
+on_files_released(remove_unused_uploads)
+
+HTTP_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, by route template and status",
+    LATENCY_BUCKETS,
+    labelnames=("method", "route", "status")
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently being handled")
+
+
+def collect_job_metrics():
+    """Expose ingestion job counts at scrape time"""
+    yield "rag_ingest_jobs", "gauge", "Ingestion jobs by status", [
+        ({"status": status}, count) for status, count in job_manager.stats().items()
+    ]
+
+
+registry.collector(collect_job_metrics)
+
+
+# Startup warm-up state: "disabled", "pending", "running", "done" or "failed"
+warmup_state = {"status": "pending" if settings.WARMUP_ON_STARTUP else "disabled", "error": None}
+
+
+def run_warm_up():
+    """Load the embedding model and open the collection, recording progress for /health"""
+    warmup_state["status"] = "running"
+    try:
+        warm_up()
+        warmup_state["status"] = "done"
+        logger.info("Warm-up complete, service is ready")
+    except Exception as e:
+        warmup_state["status"] = "failed"
+        warmup_state["error"] = str(e)
+        logger.error(f"Warm-up failed: {e}", exc_info=True)
+
+
+# Vector index warm-up state, tracked separately since it runs alongside model loading
+index_warmup_state = {
+    "status": "pending" if settings.WARMUP_ON_STARTUP else "disabled",
+    "collections": 0,
+    "vectors": 0,
+    "seconds": None,
+    "error": None
+}
+
+
+def run_index_warm_up():
+    """Load the stored HNSW indexes from disk, recording progress for /health"""
+    index_warmup_state["status"] = "running"
+    start = time.perf_counter()
+    try:
+        index_warmup_state.update(warm_indexes(settings.WARMUP_MAX_COLLECTIONS))
+        index_warmup_state["status"] = "done"
+        logger.info(
+            f"Loaded {index_warmup_state['collections']} collection indexes "
+            f"({index_warmup_state['vectors']} vectors) in {time.perf_counter() - start:.1f}s"
+        )
+    except Exception as e:
+        index_warmup_state["status"] = "failed"
+        index_warmup_state["error"] = str(e)
+        logger.error(f"Index warm-up failed: {e}", exc_info=True)
+    finally:
+        index_warmup_state["seconds"] = round(time.perf_counter() - start, 2)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks"""
+    if settings.WARMUP_ON_STARTUP:
+        # Don't block startup: the server accepts connections while the model loads
+        threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+        threading.Thread(target=run_index_warm_up, name="index-warm-up", daemon=True).start()
+    yield
+    job_manager.shutdown(wait=False)
+    shutdown_extraction_pool(wait=False)
+    flush_embedding_cache()
+    await close_llm_gateway()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.API_TITLE,
     version=settings.API_VERSION,
-    description=settings.API_DESCRIPTION
+    description=settings.API_DESCRIPTION,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -37,10 +180,57 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request, labelled by route template so ids don't explode label cardinality"""
+    HTTP_IN_FLIGHT.labels().inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_SECONDS.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            str(status)
+        ).observe(time.perf_counter() - start)
+        HTTP_IN_FLIGHT.labels().dec()
+
+
+def get_tenant(x_tenant_id: Optional[str] = Header(default=None)) -> str:
+    """
+    Tenant the request belongs to, from the X-Tenant-ID header
+    
+    Requests without the header use the default tenant.
+    """
+    if x_tenant_id is None:
+        return settings.DEFAULT_TENANT
+    try:
+        return validate_tenant(x_tenant_id)
+    except InvalidTenantError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request, exc: OverloadedError):
+    """Shed load with a fast 503 instead of queueing behind the LLM rate limit"""
+    logger.warning(f"Rejected {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 class QueryRequest(BaseModel):
     """Request model for querying the RAG system"""
     question: str = Field(..., min_length=1, max_length=1000, description="Question to ask")
     top_k: Optional[int] = Field(default=None, ge=1, le=10, description="Number of context chunks to retrieve")
+    document_ids: Optional[List[str]] = Field(default=None, description="Only search these documents (ids from /documents)")
+    sources: Optional[List[str]] = Field(default=None, description="Only search documents with these filenames")
 
 
 class QueryResponse(BaseModel):
@@ -49,26 +239,92 @@ class QueryResponse(BaseModel):
     sources: list[str]
     
 
+class BatchQueryRequest(BaseModel):
+    """Request model for answering several questions at once"""
+    questions: List[Annotated[str, Field(min_length=1, max_length=1000)]] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.BATCH_QUERY_MAX_QUESTIONS,
+        description="Questions to ask"
+    )
+    top_k: Optional[int] = Field(default=None, ge=1, le=10, description="Number of context chunks to retrieve per question")
+    document_ids: Optional[List[str]] = Field(default=None, description="Only search these documents (ids from /documents)")
+    sources: Optional[List[str]] = Field(default=None, description="Only search documents with these filenames")
+
+
+class BatchQueryResult(BaseModel):
+    """Answer to one question of a batch"""
+    question: str
+    answer: Optional[str] = None
+    sources: list[str]
+    error: Optional[str] = None
+
+
+class BatchQueryResponse(BaseModel):
+    """Response model for batch queries, in the order the questions were given"""
+    results: list[BatchQueryResult]
+
+
 class UploadResponse(BaseModel):
     """Response model for file uploads"""
     message: str
     filename: str
-    chunks_indexed: int
+    file_hash: str
+    job_id: Optional[str] = None
+    status: str
+    chunks_indexed: Optional[int] = None
+
+
+class JobResponse(BaseModel):
+    """Response model for ingestion job status"""
+    job_id: str
+    filename: str
+    status: str
+    phase: Optional[str] = None
+    chunks_processed: int
+    total_chunks: int
+    chunks_indexed: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class DocumentResponse(BaseModel):
+    """Response model for an indexed document"""
+    id: str
+    filename: str
+    file_hash: str
+    page_count: int
+    chunk_count: int
+    indexed_at: float
 
 
 class HealthResponse(BaseModel):
     """Response model for health check"""
     status: str
+    ready: bool
+    warmup: dict
+    index_warmup: dict
     collection_stats: dict
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint with collection statistics"""
+    """
+    Liveness check with readiness state and collection statistics
+    
+    Always answers immediately; `ready` flips to true once the embedding
+    model and the default collection's index are loaded.
+    """
     try:
-        stats = get_collection_stats()
+        # Don't trigger a lazy collection open from a liveness probe
+        stats = get_collection_stats() if collection_ready() else {}
         return {
             "status": "ok",
+            "ready": is_ready(),
+            "warmup": warmup_state,
+            "index_warmup": index_warmup_state,
             "collection_stats": stats
         }
     except Exception as e:
@@ -76,68 +332,142 @@ async def health_check():
         raise HTTPException(status_code=500, detail="Service unhealthy")
 
 
-@app.post("/upload", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the model and collection index are loaded, 503 before"""
+    if not is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Warming up (model: {warmup_state['status']}, index: {index_warmup_state['status']})"
+        )
+    return {"status": "ready"}
+
+
+# The body is parsed by hand so it can be streamed, so describe it for the OpenAPI docs
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["file"],
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            }
+        }
+    },
+}
+
+
+@app.post(
+    "/upload",
+    response_model=UploadResponse,
+    status_code=202,
+    openapi_extra={"requestBody": UPLOAD_REQUEST_BODY}
+)
+async def upload_pdf(request: Request, response: Response, tenant_id: str = Depends(get_tenant)):
     """
-    Upload and index a PDF file
+    Upload a PDF file and queue it for indexing
+    
+    The file is streamed to disk as it arrives, with the size limit enforced
+    and the SHA-256 computed in the same pass, and stored under a path
+    derived from that hash. Contents already indexed for the tenant, or
+    already queued, are answered without starting another job.
     
     Args:
-        file: PDF file to upload and index
+        request: Multipart request with the PDF in its ``file`` field
+        response: Response, whose status becomes 200 when no new job is queued
+        tenant_id: Tenant whose collection the PDF is indexed into
         
     Returns:
-        Upload response with indexing details
+        Upload response with the ingestion job id
     """
     try:
-        # Validate file extension
-        file_ext = Path(file.filename).suffix.lower()
-        if file_ext not in settings.ALLOWED_EXTENSIONS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file type. Allowed: {settings.ALLOWED_EXTENSIONS}"
-            )
+        upload = await receive_pdf(
+            request,
+            upload_dir(tenant_id),
+            max_bytes=settings.MAX_FILE_SIZE,
+            allowed_extensions=settings.ALLOWED_EXTENSIONS
+        )
+        # The stored file is held until this request has queued it or found it indexed
+        try:
+            logger.info(f"Uploaded file: {upload.filename} ({upload.size} bytes, sha256 {upload.file_hash[:12]})")
+            
+            # Skip identical contents before any PDF parsing happens
+            indexed = await asyncio.to_thread(find_indexed, upload.file_hash, tenant_id)
+            if indexed is not None:
+                logger.info(f"Upload {upload.filename} is already indexed, not queueing")
+                response.status_code = 200
+                return {
+                    "message": "Document already indexed",
+                    "filename": upload.filename,
+                    "file_hash": upload.file_hash,
+                    "status": "duplicate",
+                    "chunks_indexed": indexed["chunk_count"]
+                }
+            
+            job = job_manager.find_active(str(upload.path), tenant_id=tenant_id)
+            if job is not None:
+                response.status_code = 200
+                message = "Identical file already queued for indexing"
+            else:
+                # Queue the PDF for background indexing
+                job = job_manager.submit(
+                    str(upload.path),
+                    upload.filename,
+                    tenant_id=tenant_id,
+                    source=upload.filename,
+                    file_hash=upload.file_hash
+                )
+                message = "File uploaded and queued for indexing"
+            
+            return {
+                "message": message,
+                "filename": upload.filename,
+                "file_hash": upload.file_hash,
+                "job_id": job.id,
+                "status": job.status
+            }
+        finally:
+            release_upload(upload.path)
         
-        # Check file size
-        file.file.seek(0, 2)  # Seek to end
-        file_size = file.file.tell()
-        file.file.seek(0)  # Reset to beginning
-        
-        if file_size > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Max size: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-            )
-        
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Empty file")
-        
-        # Save file
-        file_path = settings.UPLOAD_DIR / file.filename
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        logger.info(f"Uploaded file: {file.filename} ({file_size} bytes)")
-        
-        # Index the PDF
-        chunks_count = index_pdf(str(file_path))
-        
-        logger.info(f"Indexed {chunks_count} chunks from {file.filename}")
-        
-        return {
-            "message": "File uploaded and indexed successfully",
-            "filename": file.filename,
-            "chunks_indexed": chunks_count
-        }
-        
-    except HTTPException:
-        raise
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except QueueFullError as e:
+        logger.warning(f"Upload rejected: {e}")
+        await asyncio.to_thread(remove_unused_uploads, tenant_id, [upload.file_hash])
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Upload failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get the status of an ingestion job
+    
+    Args:
+        job_id: Id returned by /upload
+        
+    Returns:
+        Job status, current phase and chunk progress
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+def resolve_scope(request: Union[QueryRequest, BatchQueryRequest], tenant_id: str) -> Optional[List[str]]:
+    """Resolve the documents a query is restricted to, or None for all documents (reads the registry, so run it in a thread)"""
+    try:
+        return resolve_sources(request.document_ids, request.sources, tenant_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Document not found: {e.args[0]}")
+
+
 @app.post("/query", response_model=QueryResponse)
-async def ask_question(request: QueryRequest):
+async def ask_question(request: QueryRequest, tenant_id: str = Depends(get_tenant)):
     """
     Query the RAG system with a question
     
@@ -152,23 +482,145 @@ async def ask_question(request: QueryRequest):
         
         logger.info(f"Processing query: {request.question[:50]}...")
         
-        answer, sources = query_rag(request.question, top_k=top_k)
+        answer, sources = await query_rag(
+            request.question,
+            top_k=top_k,
+            sources=await asyncio.to_thread(resolve_scope, request, tenant_id),
+            tenant_id=tenant_id
+        )
         
         return {
             "answer": answer,
             "sources": sources
         }
         
+    except (HTTPException, OverloadedError):
+        raise
     except Exception as e:
         logger.error(f"Query failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
 
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def ask_questions_batch(request: BatchQueryRequest, tenant_id: str = Depends(get_tenant)):
+    """
+    Answer several questions in one request
+    
+    All questions are embedded and retrieved together, then answered by
+    concurrent LLM calls (at most BATCH_QUERY_CONCURRENCY at a time). A
+    question whose completion fails gets an `error` instead of an `answer`.
+    
+    Args:
+        request: Batch query request with the questions and optional parameters
+        
+    Returns:
+        One result per question, in order
+    """
+    try:
+        top_k = request.top_k or settings.TOP_K_RESULTS
+        
+        logger.info(f"Processing batch of {len(request.questions)} queries")
+        
+        results = await batch_query_rag(
+            request.questions,
+            top_k=top_k,
+            sources=await asyncio.to_thread(resolve_scope, request, tenant_id),
+            tenant_id=tenant_id
+        )
+        
+        return {"results": [result._asdict() for result in results]}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch query failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Batch query failed: {str(e)}")
+
+
+def format_sse(event: str, data) -> str:
+    """Format a Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/query/stream")
+async def ask_question_stream(request: QueryRequest, tenant_id: str = Depends(get_tenant)):
+    """
+    Query the RAG system and stream the answer via Server-Sent Events
+    
+    Emits a `sources` event first, then one `token` event per generated
+    piece of text, and finally a `done` event (or an `error` event).
+    
+    Args:
+        request: Query request with question and optional parameters
+        
+    Returns:
+        text/event-stream response
+    """
+    top_k = request.top_k or settings.TOP_K_RESULTS
+    scope = await asyncio.to_thread(resolve_scope, request, tenant_id)
+    
+    # Once the stream has started the status can't change, so shed load up front
+    get_llm_gateway().check_capacity()
+    
+    logger.info(f"Processing streaming query: {request.question[:50]}...")
+    
+    async def event_stream():
+        try:
+            async for event, payload in stream_query_rag(request.question, top_k=top_k, sources=scope, tenant_id=tenant_id):
+                if event == "sources":
+                    yield format_sse("sources", {"sources": payload})
+                else:
+                    yield format_sse("token", {"content": payload})
+            yield format_sse("done", {})
+        except OverloadedError as e:
+            yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Query failed: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/documents", response_model=List[DocumentResponse])
+async def get_documents(tenant_id: str = Depends(get_tenant)):
+    """List indexed documents"""
+    try:
+        return await asyncio.to_thread(list_documents, tenant_id)
+    except Exception as e:
+        logger.error(f"Failed to list documents: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
+
+
+@app.delete("/documents/{doc_id}", response_model=DocumentResponse)
+async def remove_document(doc_id: str, tenant_id: str = Depends(get_tenant)):
+    """
+    Remove one document from the index
+    
+    Args:
+        doc_id: Document id from /documents
+        
+    Returns:
+        The removed document
+    """
+    try:
+        document = await asyncio.to_thread(delete_document, doc_id, tenant_id)
+    except Exception as e:
+        logger.error(f"Failed to delete document {doc_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to delete document: {str(e)}")
+    
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+
 @app.delete("/collection")
-async def clear_all_documents():
+async def clear_all_documents(tenant_id: str = Depends(get_tenant)):
     """Clear all documents from the collection"""
     try:
-        clear_collection()
+        await asyncio.to_thread(clear_collection, tenant_id)
         logger.info("Collection cleared")
         return {"message": "Collection cleared successfully"}
     except Exception as e:
@@ -176,16 +628,36 @@ async def clear_all_documents():
         raise HTTPException(status_code=500, detail=f"Failed to clear collection: {str(e)}")
 
 
+def collect_stats(tenant_id: str) -> dict:
+    """Gather every statistics section; touches Chroma and SQLite, so call it off the event loop"""
+    stats = get_collection_stats(tenant_id)
+    stats["jobs"] = job_manager.stats()
+    stats["embedding_cache"] = get_embedding_cache_stats()
+    stats["query_batching"] = get_query_batching_stats()
+    stats["answer_cache"] = get_answer_cache_stats(tenant_id)
+    stats["sparse_index"] = get_sparse_index_stats(tenant_id)
+    stats["llm"] = get_llm_stats()
+    stats["rerank"] = get_rerank_stats()
+    stats["context"] = get_context_stats()
+    return stats
+
+
 @app.get("/stats")
-async def get_stats():
+async def get_stats(tenant_id: str = Depends(get_tenant)):
     """Get collection statistics"""
     try:
-        return get_collection_stats()
+        return await asyncio.to_thread(collect_stats, tenant_id)
     except Exception as e:
         logger.error(f"Failed to get stats: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-stage latency histograms and counters in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,313 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+
+Counters, gauges and histograms are plain Python objects updated under a
+lock, so recording on hot paths costs about a microsecond. ``registry``
+renders everything in the Prometheus text format for the /metrics endpoint.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds for latencies in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Bucket upper bounds for batch sizes
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Bucket upper bounds for LLM token counts
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """
+    Histogram with fixed bucket upper bounds, in the Prometheus style
+
+    ``observe`` is a bisect and three additions under a lock, cheap enough
+    for hot paths.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot counts values above every bound
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one value"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        """
+        Current totals
+
+        Returns:
+            Dictionary with count, sum and cumulative bucket counts keyed by upper bound ("+Inf" last)
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[f"{bound:g}"] = running
+        cumulative["+Inf"] = count
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+    def stats(self) -> dict:
+        """Snapshot plus the mean, for JSON stats endpoints"""
+        snapshot = self.snapshot()
+        snapshot["avg"] = snapshot["sum"] / snapshot["count"] if snapshot["count"] else 0.0
+        return snapshot
+
+
+class Family:
+    """
+    A named metric with one child per combination of label values
+
+    Metrics without labels have a single child, reached with ``labels()``.
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str, labelnames: Tuple[str, ...], factory: Callable):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = labelnames
+        self._factory = factory
+        self._children: dict = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Get the child for these label values, creating it on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def children(self) -> List[tuple]:
+        with self._lock:
+            return list(self._children.items())
+
+
+# A collector returns (name, kind, help, [(labels dict, value), ...]) tuples read at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """Holds metric families and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._families: dict = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, help_text: str, kind: str, labelnames: Sequence[str], factory: Callable) -> Family:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = Family(name, help_text, kind, tuple(labelnames), factory)
+                self._families[name] = family
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Family:
+        return self._register(name, help_text, "counter", labelnames, Counter)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Family:
+        return self._register(name, help_text, "gauge", labelnames, Gauge)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Family:
+        return self._register(name, help_text, "histogram", labelnames, lambda: Histogram(buckets))
+
+    def collector(self, collector: Collector):
+        """Register a callable producing metrics read from elsewhere (e.g. cache counters) at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format
+
+        Returns:
+            Exposition text (version 0.0.4)
+        """
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children():
+                labels = dict(zip(family.labelnames, values))
+                if family.kind == "histogram":
+                    snapshot = child.snapshot()
+                    for bound, count in snapshot["buckets"].items():
+                        lines.append(f"{family.name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+                    lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+                    lines.append(f"{family.name}_count{_format_labels(labels)} {snapshot['count']}")
+                else:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(child.value)}")
+
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception:
+                continue
+            for name, kind, help_text, samples in collected:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage, per call (per page, chunk or batch for ingestion stages)",
+    LATENCY_BUCKETS,
+    labelnames=("stage",)
+)
+STAGE_IN_FLIGHT = registry.gauge(
+    "rag_stage_in_flight",
+    "Calls currently inside each pipeline stage",
+    labelnames=("stage",)
+)
+
+
+class StageTiming:
+    """Time inside a stage block that isn't charged to the stage"""
+
+    def __init__(self):
+        self.excluded = 0.0
+
+    @contextmanager
+    def paused(self):
+        """Exclude a nested block, e.g. a generator's consumer running between yields"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.excluded += time.perf_counter() - start
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block as one call of a pipeline stage
+
+    Args:
+        name: Stage name used as the ``stage`` label
+
+    Yields:
+        StageTiming whose ``paused`` blocks are left out of the recorded time
+    """
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    start = time.perf_counter()
+    timing = StageTiming()
+    try:
+        yield timing
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start - timing.excluded)
+        in_flight.dec()
+
+
+class TimedIterator:
+    """
+    Iterator recording how long each item takes to produce as a stage
+
+    When ``upstream`` is another TimedIterator feeding this one, time spent
+    waiting on it is subtracted, so a chunker isn't charged for extraction.
+    """
+
+    def __init__(self, iterable: Iterable, stage_name: Optional[str], upstream: Optional["TimedIterator"] = None):
+        self._iterator = iter(iterable)
+        self._histogram = STAGE_SECONDS.labels(stage_name) if stage_name else None
+        self._upstream = upstream
+        self.elapsed = 0.0
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self):
+        upstream_before = self._upstream.elapsed if self._upstream is not None else 0.0
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            duration = time.perf_counter() - start
+            self.elapsed += duration
+
+        if self._histogram is not None:
+            if self._upstream is not None:
+                duration -= self._upstream.elapsed - upstream_before
+            self._histogram.observe(max(0.0, duration))
+        return item
+
+    def close(self):
+        """Close the wrapped iterator, so a generator stopped early can clean up"""
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,133 @@
+"""
+Convert an existing collection to a different embedding dimension
+
+Stored vectors are re-projected in place of re-extracting the PDFs: going to
+a smaller Matryoshka dimension only truncates and re-normalizes the stored
+vectors. Going to a larger dimension (or back to full size) re-embeds the
+stored chunk text, which is mostly served from the embedding cache. Stop the
+server first, then run from the backend directory:
+
+    python migrate_dimension.py --dimension 256
+    python migrate_dimension.py --dimension 256 --tenant acme --tenant globex
+
+Set EMBEDDING_DIMENSION to the same value before restarting the server.
+"""
+import logging
+import argparse
+from typing import Optional
+
+from config import settings
+from db import (
+    get_client, get_collection, as_vectors, collection_name, collection_metadata, collection_dimension,
+    collections, notify_collection_changed, validate_tenant, staging_collection_name, DEFAULT_TENANT
+)
+from embeddings import truncate_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def reproject(embeddings, documents, current: Optional[int], target: Optional[int]):
+    """
+    Convert one batch of stored vectors to the target dimension
+
+    Args:
+        embeddings: Stored vectors
+        documents: Stored chunk texts
+        current: Dimension the vectors were stored with (None for full-size)
+        target: Dimension to convert to (None for full-size)
+
+    Returns:
+        Array of converted vectors
+    """
+    if target and (current is None or target < current):
+        # Full-size vectors still need the Matryoshka layer norm; truncated ones are already normalized
+        return truncate_embeddings(embeddings, target, layer_norm=current is None)
+
+    # The dropped components can't be recovered, so embed the chunk text again
+    from rag import embed_texts
+    return truncate_embeddings(embed_texts(documents), target)
+
+
+def migrate_collection(tenant_id: str, dimension: int, batch_size: int = 1000) -> int:
+    """
+    Rewrite a tenant's collection with vectors of a new dimension
+
+    The vectors are copied into a staging collection which replaces the old
+    one only once every chunk has been written, so a migration interrupted
+    while copying leaves the original untouched. Chroma can't swap two
+    collections atomically: the original is deleted and the staging copy
+    renamed in two steps. If the process dies in between, the next time the
+    store is opened (by the server or a rerun of this script) the complete
+    staging collection is renamed into place (see ``db.recover_migrations``).
+
+    Args:
+        tenant_id: Tenant id
+        dimension: Target dimension (0 for full-size)
+        batch_size: Chunks converted per batch
+
+    Returns:
+        Number of chunks migrated
+    """
+    collection = get_collection(tenant_id)
+    current = collection_dimension(collection)
+    target = dimension or None
+    name = collection_name(tenant_id)
+
+    if current == target:
+        logger.info(f"Collection {name} already stores {target or 'full-size'} dimension embeddings")
+        return 0
+
+    client = get_client()
+    staging_name = staging_collection_name(tenant_id)
+    try:
+        client.delete_collection(name=staging_name)
+    except Exception:
+        pass
+    staging = client.create_collection(name=staging_name, metadata=collection_metadata(dimension))
+
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=batch_size,
+            offset=offset
+        )
+        staging.add(
+            ids=batch["ids"],
+            embeddings=as_vectors(reproject(batch["embeddings"], batch["documents"], current, target)),
+            metadatas=batch["metadatas"],
+            documents=batch["documents"]
+        )
+        logger.info(f"Migrated {min(offset + batch_size, total)}/{total} chunks of {name}")
+
+    if staging.count() != total:
+        raise RuntimeError(f"Migration of {name} copied {staging.count()} of {total} chunks; original kept")
+
+    client.delete_collection(name=name)
+    staging.modify(name=name)
+    collections.replace(tenant_id, staging)
+    notify_collection_changed(tenant_id)
+
+    logger.info(f"Collection {name} now stores {target or 'full-size'} dimension embeddings")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dimension", type=int, required=True, help="Target dimension, e.g. 256 or 512 (0 for full-size)")
+    parser.add_argument("--tenant", action="append", help="Tenant to migrate (repeatable, default: the default tenant)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Chunks converted per batch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    for tenant_id in args.tenant or [DEFAULT_TENANT]:
+        migrated = migrate_collection(validate_tenant(tenant_id), args.dimension, args.batch_size)
+        print(f"{collection_name(tenant_id)}: {migrated} chunks migrated")
+
+    if args.dimension != settings.EMBEDDING_DIMENSION:
+        print(f"Set EMBEDDING_DIMENSION={args.dimension} before restarting the server")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,204 +1,1410 @@
 """RAG (Retrieval Augmented Generation) implementation"""
-import uuid
+import time
+import asyncio
 import logging
-from typing import Tuple, List
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Tuple, List, Callable, Optional, AsyncIterator, NamedTuple, Iterable, Iterator
 from pathlib import Path
 
-from groq import Groq
-from sentence_transformers import SentenceTransformer
+import numpy as np
 
-from db import collection
-from utils import extract_text, chunk_text
+from db import (
+    get_collection, get_registry, collection_dimension, as_vectors, on_collection_change, on_collection_clear, notify_collection_changed,
+    notify_files_released, tenant_path, DEFAULT_TENANT, is_ready as collection_ready
+)
+from utils import (
+    iter_pages, iter_chunks_with_pages, iter_token_chunks_with_pages, iter_in_background,
+    compute_file_hash, compute_text_hash, get_page_count
+)
+from jobs import PHASES, PHASE_EXTRACTING, PHASE_CHUNKING, PHASE_EMBEDDING, PHASE_WRITING
+from embedding_cache import EmbeddingCache
+from embeddings import EmbeddingBackend, load_embedding_backend, truncate_embeddings
+from answer_cache import AnswerCache
+from bm25 import BM25Index
+from rerank import Reranker, ScoreCache
+from batching import MicroBatcher
+from metrics import registry, stage, TimedIterator, LATENCY_BUCKETS, SIZE_BUCKETS
+from context import pack_context, format_context, PackingStats
+from llm import LLMGateway, OverloadedError
+from lazy import Lazy, LazyPool
 from config import settings
 
 logger = logging.getLogger(__name__)
 
-# Initialize Groq client
-groq_client = Groq(api_key=settings.GROQ_API_KEY)
+def _load_embedding_model() -> EmbeddingBackend:
+    """Load the HuggingFace embedding model (Nomic) with the configured backend"""
+    model = load_embedding_backend(
+        settings.EMBEDDING_MODEL,
+        backend=settings.EMBEDDING_BACKEND,
+        threads=settings.EMBEDDING_THREADS,
+        token=settings.HF_TOKEN if settings.HF_TOKEN else None,
+        onnx_file=settings.EMBEDDING_ONNX_FILE or None
+    )
+    logger.info("Embedding model loaded successfully")
+    return model
+
+
+def _load_reranker() -> Reranker:
+    """Load the cross-encoder used to rerank retrieved chunks"""
+    from sentence_transformers import CrossEncoder
+    
+    logger.info(f"Loading rerank model: {settings.RERANK_MODEL}")
+    model = CrossEncoder(
+        settings.RERANK_MODEL,
+        device="cpu",
+        token=settings.HF_TOKEN if settings.HF_TOKEN else None
+    )
+    logger.info("Rerank model loaded successfully")
+    return Reranker(
+        model,
+        batch_size=settings.RERANK_BATCH_SIZE,
+        cache=ScoreCache(settings.RERANK_CACHE_MAX_ENTRIES)
+    )
+
+
+def embedding_cache_key() -> str:
+    """
+    Model name under which cached embeddings are stored
+    
+    Quantized and ONNX backends produce slightly different vectors, so they
+    don't share cache entries with the PyTorch model.
+    """
+    if settings.EMBEDDING_BACKEND == "torch":
+        return settings.EMBEDDING_MODEL
+    return f"{settings.EMBEDDING_MODEL}@{settings.EMBEDDING_BACKEND}"
+
+
+# Expensive resources are created on first use (or by warm_up at startup)
+_llm_gateway = Lazy("LLM gateway", lambda: LLMGateway(
+    api_key=settings.GROQ_API_KEY,
+    model=settings.CHAT_MODEL,
+    base_url=settings.GROQ_BASE_URL,
+    rpm_limit=settings.LLM_RPM_LIMIT,
+    tpm_limit=settings.LLM_TPM_LIMIT,
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    max_queued=settings.LLM_MAX_QUEUED,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    timeout=settings.LLM_TIMEOUT,
+    max_connections=settings.LLM_MAX_CONNECTIONS
+))
+_embedding_model = Lazy("embedding model", _load_embedding_model)
+_reranker = Lazy("reranker", _load_reranker)
+
+# Gathers query encodes from concurrent requests into shared forward passes
+_query_batcher = Lazy("query batcher", lambda: MicroBatcher(
+    lambda texts: get_embedding_model().encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE),
+    max_batch_size=settings.QUERY_BATCH_MAX_SIZE,
+    max_wait=settings.QUERY_BATCH_MAX_WAIT_MS / 1000,
+    queue_wait=registry.histogram(
+        "rag_query_batch_wait_seconds", "Time a query encode waited for its batch", LATENCY_BUCKETS
+    ).labels(),
+    batch_size=registry.histogram(
+        "rag_query_batch_size", "Questions per batched query encode", SIZE_BUCKETS
+    ).labels()
+) if settings.QUERY_BATCHING_ENABLED else None)
 
-# Initialize HuggingFace embedding model (Nomic)
-logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-embedding_model = SentenceTransformer(
-    settings.EMBEDDING_MODEL,
-    trust_remote_code=True,
-    token=settings.HF_TOKEN if settings.HF_TOKEN else None
+INGESTED_CHUNKS = registry.counter(
+    "rag_ingested_chunks_total",
+    "Chunks processed by indexing, by outcome (embedded, unchanged or stale)",
+    labelnames=("result",)
 )
-logger.info("Embedding model loaded successfully")
+ANSWER_CACHE_LOOKUPS = registry.counter(
+    "rag_answer_cache_lookups_total",
+    "Answer cache lookups by result (hit or miss)",
+    labelnames=("result",)
+)
+
+# Persistent cache so repeated chunk text is only embedded once per model
+_embedding_cache = Lazy("embedding cache", lambda: EmbeddingCache(
+    settings.EMBEDDING_CACHE_PATH,
+    model_name=embedding_cache_key(),
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+) if settings.EMBEDDING_CACHE_ENABLED else None)
+
+
+def _load_sparse_index(tenant_id: str) -> BM25Index:
+    """Load a tenant's BM25 index, rebuilding it from Chroma if it is missing or out of sync"""
+    index = BM25Index(tenant_path(settings.BM25_INDEX_PATH, tenant_id))
+    index.load()
+    
+    collection = get_collection(tenant_id)
+    count = collection.count()
+    if len(index) != count:
+        logger.info(f"Rebuilding BM25 index from {count} stored chunks")
+        index.clear()
+        for offset in range(0, count, 1000):
+            batch = collection.get(include=["documents"], limit=1000, offset=offset)
+            index.add(batch["ids"], batch["documents"])
+        index.save()
+    
+    return index
+
+
+# One BM25 index per tenant, pooled like the collection handles
+_sparse_indexes = LazyPool("BM25 index", _load_sparse_index, max_size=settings.MAX_OPEN_COLLECTIONS)
+
+
+def get_sparse_index(tenant_id: str = DEFAULT_TENANT) -> BM25Index:
+    """Get the BM25 index kept alongside a tenant's collection"""
+    return _sparse_indexes.get(tenant_id)
+
+
+def _clear_sparse_index(tenant_id: str):
+    index = _sparse_indexes.peek(tenant_id)
+    if index is not None:
+        index.clear()
+        index.save()
+    else:
+        BM25Index(tenant_path(settings.BM25_INDEX_PATH, tenant_id)).delete()
+
 
+on_collection_clear(_clear_sparse_index)
 
-def index_pdf(file_path: str) -> int:
+
+def get_llm_gateway() -> LLMGateway:
+    """Get the rate-limited async gateway used for all LLM calls"""
+    return _llm_gateway.get()
+
+
+async def close_llm_gateway():
+    """Close the gateway's pooled connections if it was created"""
+    if _llm_gateway.loaded:
+        await get_llm_gateway().close()
+
+
+def get_embedding_model() -> EmbeddingBackend:
+    """Get the embedding model backend, loading it on first use"""
+    return _embedding_model.get()
+
+
+def get_reranker() -> Optional[Reranker]:
+    """Get the cross-encoder reranker, or None if reranking is disabled"""
+    if not settings.RERANK_ENABLED:
+        return None
+    return _reranker.get()
+
+
+def encode_queries(questions: List[str]) -> np.ndarray:
     """
-    Extract text from PDF, chunk it, and index into vector database
+    Embed questions, batched together with concurrent requests when enabled
     
     Args:
-        file_path: Path to the PDF file
+        questions: Questions to embed
         
     Returns:
-        Number of chunks indexed
+        Array of shape (len(questions), dim)
     """
-    try:
-        logger.info(f"Starting indexing for: {file_path}")
+    batcher = _query_batcher.get()
+    with stage("embed_query"):
+        if batcher is None:
+            return get_embedding_model().encode(questions, batch_size=settings.EMBEDDING_BATCH_SIZE)
+        return batcher.encode(questions)
+
+
+async def encode_queries_async(questions: List[str]) -> np.ndarray:
+    """
+    Embed questions from async code
+    
+    With batching enabled the caller awaits its batch instead of holding a
+    worker thread while it waits.
+    
+    Args:
+        questions: Questions to embed
         
-        # Extract text from PDF with page numbers
-        text, page_map = extract_text(file_path)
+    Returns:
+        Array of shape (len(questions), dim)
+    """
+    batcher = _query_batcher.get()
+    with stage("embed_query"):
+        if batcher is None:
+            return await asyncio.to_thread(
+                get_embedding_model().encode, questions, batch_size=settings.EMBEDDING_BATCH_SIZE
+            )
+        return await batcher.encode_async(questions)
+
+
+def get_query_batching_stats() -> dict:
+    """
+    Get query embedding batching statistics
+    
+    Returns:
+        Dictionary with queue-wait and batch-size histograms, or {"enabled": False}
+    """
+    if not settings.QUERY_BATCHING_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **_query_batcher.get().stats()}
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get the embedding cache, or None if it is disabled"""
+    return _embedding_cache.get()
+
+
+def flush_embedding_cache():
+    """Write the embedding cache's buffered access times if it was opened"""
+    if _embedding_cache.loaded and get_embedding_cache() is not None:
+        get_embedding_cache().flush()
+
+
+def warm_up():
+    """
+    Eagerly initialize the collection, embedding model and clients
+    
+    Run in the background at startup so the first request doesn't pay for
+    model loading.
+    """
+    get_collection()
+    get_embedding_cache()
+    if settings.HYBRID_SEARCH_ENABLED:
+        get_sparse_index()
+    get_embedding_model().encode(["warm up"])
+    reranker = get_reranker()
+    if reranker is not None:
+        reranker.model.predict([("warm up", "warm up")], show_progress_bar=False)
+    get_llm_gateway()
+
+
+def is_ready() -> bool:
+    """
+    Whether the embedding model and collection are loaded
+    """
+    return _embedding_model.loaded and collection_ready()
+
+
+# Caches of generated answers, one per tenant, invalidated whenever that tenant's collection changes
+_answer_caches = LazyPool("answer cache", lambda tenant_id: AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD or None
+), max_size=settings.MAX_OPEN_COLLECTIONS)
+
+
+def get_answer_cache(tenant_id: str = DEFAULT_TENANT) -> Optional[AnswerCache]:
+    """Get a tenant's answer cache, or None if answer caching is disabled"""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return _answer_caches.get(tenant_id)
+
+
+def _clear_answer_cache(tenant_id: str):
+    answer_cache = _answer_caches.peek(tenant_id)
+    if answer_cache is not None:
+        answer_cache.clear()
+
+
+on_collection_change(_clear_answer_cache)
+
+
+def encode_sorted(texts: List[str]) -> np.ndarray:
+    """
+    Encode texts in length-sorted order so each padded batch holds similar lengths
+    
+    Args:
+        texts: Texts to embed
         
-        if not text or len(text.strip()) < 10:
-            raise ValueError("Extracted text is too short or empty")
+    Returns:
+        Array of shape (len(texts), dim) in the original order
+    """
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+    encoded = get_embedding_model().encode(
+        [texts[index] for index in order],
+        batch_size=settings.EMBEDDING_BATCH_SIZE
+    )
+    embeddings = np.empty_like(encoded)
+    embeddings[order] = encoded
+    return embeddings
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed chunk texts, reusing cached vectors where available
+    
+    Args:
+        texts: Texts to embed
         
-        logger.info(f"Extracted {len(text)} characters from PDF")
+    Returns:
+        Array of shape (len(texts), dim) with one embedding per text
+    """
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is None:
+        return encode_sorted(texts)
+    
+    text_hashes = [compute_text_hash(text) for text in texts]
+    cached = embedding_cache.get_many(text_hashes)
+    
+    # Encode each distinct missing text once
+    missing = {}
+    for text_hash, text in zip(text_hashes, texts):
+        if text_hash not in cached and text_hash not in missing:
+            missing[text_hash] = text
+    
+    if missing:
+        encoded = encode_sorted(list(missing.values()))
+        fresh = list(zip(missing.keys(), encoded))
+        embedding_cache.put_many(fresh)
+        cached.update(fresh)
+    
+    return np.stack([cached[text_hash] for text_hash in text_hashes]).astype(np.float32, copy=False)
+
+
+def token_offsets(text: str) -> List[tuple]:
+    """
+    Character offsets of each token of the embedding model's tokenizer
+    
+    Args:
+        text: Text to tokenize
+        
+    Returns:
+        List of (start, end) character offsets, one per token
+    """
+    return get_embedding_model().token_offsets(text)
+
+
+def chunk_pages(pages: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    Chunk a stream of pages using the configured chunking mode
+    
+    Args:
+        pages: Iterable of (page_num, page_text) tuples in page order
         
-        # Chunk the text with page tracking
-        from utils import chunk_text_with_pages
-        chunks_with_pages = chunk_text_with_pages(
-            text,
-            page_map,
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
+    Yields:
+        (chunk_text, page_numbers) tuples
+    """
+    if settings.CHUNKING_MODE == "tokens":
+        # Leave room for the special tokens the model adds around each chunk
+        chunk_tokens = min(settings.CHUNK_SIZE_TOKENS, get_embedding_model().max_seq_length - 2)
+        return iter_token_chunks_with_pages(
+            pages,
+            token_offsets,
+            chunk_tokens=chunk_tokens,
+            chunk_overlap=settings.CHUNK_OVERLAP_TOKENS
         )
+    
+    return iter_chunks_with_pages(
+        pages,
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP
+    )
+
+
+def get_embedding_cache_stats() -> dict:
+    """
+    Get embedding cache statistics
+    
+    Returns:
+        Dictionary with cache hit/miss counters, or {"enabled": False}
+    """
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return {"enabled": False}
+    if not _embedding_cache.loaded:
+        return {"enabled": True, "loaded": False}
+    return {"enabled": True, **get_embedding_cache().stats()}
+
+
+def get_sparse_index_stats(tenant_id: str = DEFAULT_TENANT) -> dict:
+    """
+    Get a tenant's BM25 index statistics
+    
+    Args:
+        tenant_id: Tenant id
         
-        logger.info(f"Created {len(chunks_with_pages)} chunks")
+    Returns:
+        Dictionary with index size counters, or {"enabled": False}
+    """
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return {"enabled": False}
+    index = _sparse_indexes.peek(tenant_id)
+    if index is None:
+        return {"enabled": True, "loaded": False}
+    return {"enabled": True, **index.stats()}
+
+
+def get_rerank_stats() -> dict:
+    """
+    Get cross-encoder rerank statistics
+    
+    Returns:
+        Dictionary with rerank and score cache counters, or {"enabled": False}
+    """
+    if not settings.RERANK_ENABLED:
+        return {"enabled": False}
+    if not _reranker.loaded:
+        return {"enabled": True, "loaded": False}
+    return {"enabled": True, "budget_ms": settings.RERANK_BUDGET_MS, **get_reranker().stats()}
+
+
+def get_llm_stats() -> dict:
+    """
+    Get LLM gateway statistics
+    
+    Returns:
+        Dictionary with in-flight, queued, retry and rejection counters
+    """
+    if not _llm_gateway.loaded:
+        return {"loaded": False}
+    return get_llm_gateway().stats()
+
+
+def get_answer_cache_stats(tenant_id: str = DEFAULT_TENANT) -> dict:
+    """
+    Get a tenant's answer cache statistics
+    
+    Args:
+        tenant_id: Tenant id
         
-        # Batch process embeddings for efficiency
-        batch_size = 32  # Optimized for sentence-transformers
-        total_indexed = 0
+    Returns:
+        Dictionary with cache hit/miss counters, or {"enabled": False}
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_answer_cache(tenant_id).stats()}
+
+
+def document_id(source: str) -> str:
+    """
+    Stable id of a document, derived from its source filename
+    
+    Every chunk id of the document starts with this id.
+    
+    Args:
+        source: Source filename of the document
         
-        for i in range(0, len(chunks_with_pages), batch_size):
-            batch_items = chunks_with_pages[i:i + batch_size]
-            batch_texts = [item[0] for item in batch_items]
-            batch_pages = [item[1] for item in batch_items]
+    Returns:
+        16 character hex id
+    """
+    return compute_text_hash(source)[:16]
+
+
+# Per-document locks, with the number of threads holding or waiting on each
+_document_locks: dict = {}
+_document_locks_guard = threading.Lock()
+
+
+@contextmanager
+def document_lock(tenant_id: str, doc_id: str):
+    """
+    Hold a tenant's document exclusively while it is written or deleted
+    
+    Args:
+        tenant_id: Tenant id
+        doc_id: Document id
+    """
+    key = (tenant_id, doc_id)
+    with _document_locks_guard:
+        entry = _document_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _document_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _document_locks[key]
+
+
+def _with_chunk_ids(source: str, chunks: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    Attach deterministic ids built from a document key and each chunk's text hash
+    
+    The document key is derived from the source filename so that an edited
+    version of a document keeps the ids of its unchanged chunks. Repeated
+    chunk text within a document gets an occurrence suffix to stay unique.
+    
+    Args:
+        source: Source filename of the document
+        chunks: Iterable of (chunk_text, page_numbers) tuples in document order
+        
+    Yields:
+        (chunk_id, chunk_text, page_numbers) tuples
+    """
+    doc_key = document_id(source)
+    seen = {}
+    for chunk, pages in chunks:
+        chunk_hash = compute_text_hash(chunk)[:32]
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        chunk_id = f"{doc_key}-{chunk_hash}" if occurrence == 0 else f"{doc_key}-{chunk_hash}-{occurrence}"
+        yield chunk_id, chunk, pages
+
+
+def _require_text(pages: Iterable[tuple], min_length: int = 10) -> Iterator[tuple]:
+    """
+    Pass pages through, failing at the end if the document had almost no text
+    """
+    total_length = 0
+    for page_num, page_text in pages:
+        total_length += len(page_text)
+        yield page_num, page_text
+    
+    if total_length < min_length:
+        raise ValueError("Extracted text is too short or empty")
+
+
+def _batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Group an iterable into lists of at most batch_size items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def find_indexed(file_hash: str, tenant_id: str = DEFAULT_TENANT) -> Optional[dict]:
+    """
+    Registry entry of a document with these exact contents
+    
+    The registry is only written once a document has been fully indexed, so
+    chunks left behind by a failed ingestion don't count.
+    
+    Args:
+        file_hash: SHA-256 of the file contents
+        tenant_id: Tenant id
+        
+    Returns:
+        The document, or None if the contents haven't been indexed
+    """
+    return get_registry(tenant_id).find_by_hash(file_hash)
+
+
+def index_pdf(
+    file_path: str,
+    progress_callback: Optional[Callable] = None,
+    tenant_id: str = DEFAULT_TENANT,
+    source: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> int:
+    """
+    Extract text from PDF, chunk it, and index into vector database
+    
+    Ingestion runs as a streaming pipeline: pages are extracted in a
+    background thread and chunked incrementally, chunk batches are embedded
+    in a second thread, and embedded batches are written to Chroma while
+    later pages are still being extracted. Bounded queues between the stages
+    keep memory flat regardless of document size.
+    
+    Indexing is incremental: chunk ids are derived from content hashes, so
+    re-uploading an unchanged PDF is a no-op, and an edited PDF only embeds
+    its new chunks and deletes the ones that no longer exist.
+    
+    Args:
+        file_path: Path to the PDF file
+        progress_callback: Optional callable invoked as (phase, chunks_processed, total_chunks)
+            from the calling thread only; phase and chunks_processed never go backwards, and
+            total_chunks is 0 until the whole document has been chunked
+        tenant_id: Tenant whose collection the document is indexed into
+        source: Document name (defaults to the file name; uploads are stored under their hash)
+        file_hash: SHA-256 of the file if already known, to skip hashing it again
+        
+    Returns:
+        Number of chunks indexed for the document
+    """
+    # Stages overlap, so progress only moves forward even when a later batch is still embedding
+    progress = {"phase": 0, "processed": 0}
+    
+    def report(phase: str, processed: int = 0, total: int = 0):
+        progress["phase"] = max(progress["phase"], PHASES.index(phase))
+        progress["processed"] = max(progress["processed"], processed)
+        if progress_callback:
+            progress_callback(PHASES[progress["phase"]], progress["processed"], total)
+    
+    try:
+        logger.info(f"Starting indexing for: {file_path}")
+        source = source or Path(file_path).name
+        # Two versions of one document would each delete the chunks the other is writing
+        # as stale, so ingestion is serialized per document
+        with document_lock(tenant_id, document_id(source)):
+            collection = get_collection(tenant_id)
+            dimension = collection_dimension(collection)
+            sparse_index = get_sparse_index(tenant_id) if settings.HYBRID_SEARCH_ENABLED else None
+            
+            # Skip documents whose exact contents are already indexed
+            doc_hash = file_hash or compute_file_hash(file_path)
+            duplicate = find_indexed(doc_hash, tenant_id)
+            if duplicate is not None:
+                logger.info(f"Document {source} is already indexed (hash {doc_hash[:12]}), skipping")
+                return duplicate["chunk_count"]
             
-            # Generate embeddings using HuggingFace model (LOCAL - FAST!)
-            embeddings = embedding_model.encode(
-                batch_texts,
-                show_progress_bar=False,
-                convert_to_numpy=True
+            # Chunks stored for a previous version of this document
+            existing_ids = set(collection.get(where={"source": source}, include=[])["ids"])
+            
+            report(PHASE_EXTRACTING)
+            
+            # Stage 1: extract pages in the background and chunk them as they arrive
+            pages = iter_in_background(
+                TimedIterator(
+                    iter_pages(
+                        file_path,
+                        workers=settings.EXTRACTION_WORKERS,
+                        parallel_min_pages=settings.PARALLEL_EXTRACTION_MIN_PAGES
+                    ),
+                    "extract"
+                ),
+                maxsize=settings.INGEST_PAGE_BUFFER
             )
+            # Time spent waiting for extracted pages isn't charged to chunking
+            pages = TimedIterator(_require_text(pages), None)
+            chunks = TimedIterator(chunk_pages(pages), "chunk", upstream=pages)
+            
+            # Large batches are length-sorted before encoding to minimize padding
+            batch_size = settings.INGEST_BATCH_SIZE
             
-            # Prepare data for batch insertion
-            ids = [str(uuid.uuid4()) for _ in batch_texts]
-            embeddings_list = embeddings.tolist()  # Convert numpy to list for ChromaDB
-            metadatas = [
-                {
-                    "source": Path(file_path).name,
-                    "chunk_index": i + j,
-                    "total_chunks": len(chunks_with_pages),
-                    "pages": ",".join(map(str, batch_pages[j])) if batch_pages[j] else ""  # Store as comma-separated string
+            # Stage 2: embed new chunks while the previous batch is being written. Progress
+            # events travel down the same queue as the batches (with no batch attached),
+            # so progress is only ever reported from the writer
+            def embed_batches():
+                items = _with_chunk_ids(source, chunks)
+                first = next(items, None)
+                if first is None:
+                    return
+                yield PHASE_CHUNKING, 0, None
+                
+                embedded = 0
+                for batch in _batched(itertools.chain([first], items), batch_size):
+                    new_items = [item for item in batch if item[0] not in existing_ids]
+                    embeddings = None
+                    if new_items:
+                        # Only the first one matters: once writing has begun the phase stays there,
+                        # and an event per batch would take a queue slot from an embedded batch
+                        if not embedded:
+                            yield PHASE_EMBEDDING, embedded, None
+                        # Generate embeddings using HuggingFace model (LOCAL - FAST!), skipping cached text
+                        with stage("embed"):
+                            embeddings = embed_texts([chunk for _, chunk, _ in new_items])
+                        embeddings = truncate_embeddings(embeddings, dimension)
+                    yield PHASE_WRITING, embedded, (batch, new_items, embeddings)
+                    embedded += len(batch)
+            
+            # Stage 3: write to Chroma
+            seen_ids = set()
+            total_chunks = 0
+            total_indexed = 0
+            
+            for phase, processed, embedded_batch in iter_in_background(embed_batches(), maxsize=settings.INGEST_BATCH_BUFFER):
+                report(phase, processed)
+                if embedded_batch is None:
+                    continue
+                
+                batch, new_items, embeddings = embedded_batch
+                metadatas = {
+                    chunk_id: {
+                        "source": source,
+                        "doc_hash": doc_hash,
+                        "chunk_index": total_chunks + offset,
+                        "pages": ",".join(map(str, chunk_pages)) if chunk_pages else ""  # Store as comma-separated string
+                    }
+                    for offset, (chunk_id, _, chunk_pages) in enumerate(batch)
                 }
-                for j in range(len(batch_texts))
-            ]
+                
+                if new_items:
+                    with stage("chroma_add"):
+                        collection.add(
+                            ids=[chunk_id for chunk_id, _, _ in new_items],
+                            embeddings=as_vectors(embeddings),
+                            metadatas=[metadatas[chunk_id] for chunk_id, _, _ in new_items],
+                            documents=[chunk for _, chunk, _ in new_items]
+                        )
+                    if sparse_index is not None:
+                        sparse_index.add(
+                            [chunk_id for chunk_id, _, _ in new_items],
+                            [chunk for _, chunk, _ in new_items]
+                        )
+                
+                # Unchanged chunks keep their embeddings; only their positions may have moved
+                kept_ids = [chunk_id for chunk_id, _, _ in batch if chunk_id in existing_ids]
+                if kept_ids:
+                    collection.update(ids=kept_ids, metadatas=[metadatas[chunk_id] for chunk_id in kept_ids])
+                
+                seen_ids.update(chunk_id for chunk_id, _, _ in batch)
+                total_chunks += len(batch)
+                total_indexed += len(new_items)
+                logger.info(f"Processed {total_chunks} chunks ({total_indexed} embedded)")
             
-            # Add to collection
-            collection.add(
-                ids=ids,
-                embeddings=embeddings_list,
-                metadatas=metadatas,
-                documents=batch_texts
+            stale_ids = list(existing_ids - seen_ids)
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+                if sparse_index is not None:
+                    sparse_index.remove(stale_ids)
+            
+            if sparse_index is not None and (total_indexed or stale_ids):
+                sparse_index.save()
+            
+            report(PHASE_WRITING, total_chunks, total_chunks)
+            INGESTED_CHUNKS.labels("embedded").inc(total_indexed)
+            INGESTED_CHUNKS.labels("unchanged").inc(total_chunks - total_indexed)
+            INGESTED_CHUNKS.labels("stale").inc(len(stale_ids))
+            
+            registry = get_registry(tenant_id)
+            previous = registry.get(document_id(source))
+            registry.upsert(
+                document_id(source),
+                filename=source,
+                file_hash=doc_hash,
+                page_count=get_page_count(file_path),
+                chunk_count=total_chunks
             )
             
-            total_indexed += len(batch_texts)
-            logger.info(f"Indexed {total_indexed}/{len(chunks_with_pages)} chunks")
-        
-        logger.info(f"Successfully indexed {total_indexed} chunks from {file_path}")
-        return total_indexed
-        
+            if total_chunks or stale_ids:
+                notify_collection_changed(tenant_id)
+            if previous is not None and previous["file_hash"] != doc_hash:
+                notify_files_released(tenant_id, [previous["file_hash"]])
+            
+            logger.info(
+                f"Successfully indexed {file_path}: {total_indexed} new, "
+                f"{total_chunks - total_indexed} unchanged, {len(stale_ids)} stale chunks"
+            )
+            return total_chunks
+            
     except Exception as e:
         logger.error(f"Indexing failed for {file_path}: {e}", exc_info=True)
         raise
 
 
-def query_rag(question: str, top_k: int = None) -> Tuple[str, List[str]]:
+def list_documents(tenant_id: str = DEFAULT_TENANT) -> List[dict]:
     """
-    Query the RAG system with a question
+    List a tenant's indexed documents
     
     Args:
-        question: The question to ask
-        top_k: Number of context chunks to retrieve
+        tenant_id: Tenant id
         
     Returns:
-        Tuple of (answer, list of source documents)
+        Registry entries, most recently indexed first
     """
-    try:
-        if top_k is None:
-            top_k = settings.TOP_K_RESULTS
+    return get_registry(tenant_id).list()
+
+
+def delete_document(doc_id: str, tenant_id: str = DEFAULT_TENANT) -> Optional[dict]:
+    """
+    Remove one document's chunks from the collection and the registry
+    
+    Args:
+        doc_id: Document id
+        tenant_id: Tenant id
+        
+    Returns:
+        The removed registry entry, or None if the document is unknown
+    """
+    registry = get_registry(tenant_id)
+    with document_lock(tenant_id, doc_id):
+        document = registry.get(doc_id)
+        if document is None:
+            return None
+        
+        collection = get_collection(tenant_id)
+        chunk_ids = collection.get(where={"source": document["filename"]}, include=[])["ids"]
+        if chunk_ids:
+            collection.delete(ids=chunk_ids)
+            if settings.HYBRID_SEARCH_ENABLED:
+                sparse_index = get_sparse_index(tenant_id)
+                sparse_index.remove(chunk_ids)
+                sparse_index.save()
+        
+        registry.delete(doc_id)
+    notify_collection_changed(tenant_id)
+    notify_files_released(tenant_id, [document["file_hash"]])
+    
+    logger.info(f"Deleted document {document['filename']} ({len(chunk_ids)} chunks)")
+    return document
+
+
+def resolve_sources(
+    document_ids: Optional[List[str]] = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT
+) -> Optional[List[str]]:
+    """
+    Turn requested document ids and source filenames into a list of sources to search
+    
+    Args:
+        document_ids: Registry document ids
+        sources: Source filenames
+        tenant_id: Tenant id
         
-        logger.info(f"Processing query with top_k={top_k}")
+    Returns:
+        Source filenames, or None when the query is not scoped
         
-        # Generate embedding for the question using HuggingFace (LOCAL - INSTANT!)
-        query_embedding = embedding_model.encode(
-            question,
-            show_progress_bar=False,
-            convert_to_numpy=True
+    Raises:
+        KeyError: If a document id is not in the registry
+    """
+    if not document_ids and not sources:
+        return None
+    
+    resolved = list(sources or [])
+    registry = get_registry(tenant_id)
+    for doc_id in document_ids or []:
+        document = registry.get(doc_id)
+        if document is None:
+            raise KeyError(doc_id)
+        resolved.append(document["filename"])
+    
+    return list(dict.fromkeys(resolved))
+
+
+NO_DOCUMENTS_ANSWER = "I don't have any documents indexed yet. Please upload a PDF first."
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that answers questions based on the provided context. "
+    "Use the context to provide accurate and detailed answers. "
+    "If the context doesn't contain relevant information, say so clearly. "
+    "Always cite which context section(s) you used in your answer."
+)
+
+
+class Retrieval(NamedTuple):
+    """Context retrieved for a question"""
+    context: str
+    sources: List[str]
+    chunk_ids: List[str]
+    query_embedding: np.ndarray
+    context_stats: Optional[dict] = None
+
+
+# Running totals of prompt tokens saved by context packing
+packing_stats = PackingStats()
+
+
+def get_context_stats() -> dict:
+    """
+    Get context packing statistics
+    
+    Returns:
+        Dictionary with context tokens before and after packing, or {"enabled": False}
+    """
+    if not settings.CONTEXT_PACKING_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, "token_budget": settings.CONTEXT_TOKEN_BUDGET, **packing_stats.stats()}
+
+
+def _collect_metrics():
+    """Expose cache and gateway counters kept elsewhere as Prometheus metrics"""
+    if _embedding_cache.loaded and get_embedding_cache() is not None:
+        cache_stats = get_embedding_cache().stats()
+        yield "rag_embedding_cache_lookups_total", "counter", "Embedding cache lookups by result", [
+            ({"result": "hit"}, cache_stats["hits"]),
+            ({"result": "miss"}, cache_stats["misses"]),
+        ]
+    
+    if settings.RERANK_ENABLED and _reranker.loaded:
+        rerank = get_reranker().stats()
+        yield "rag_rerank_calls_total", "counter", "Rerank calls by outcome (fallback when over the latency budget)", [
+            ({"result": "reranked"}, rerank["reranked"]),
+            ({"result": "fallback"}, rerank["fallbacks"]),
+        ]
+        if "score_cache" in rerank:
+            yield "rag_rerank_cache_lookups_total", "counter", "Rerank score cache lookups by result", [
+                ({"result": "hit"}, rerank["score_cache"]["hits"]),
+                ({"result": "miss"}, rerank["score_cache"]["misses"]),
+            ]
+    
+    packing = packing_stats.stats()
+    yield "rag_context_tokens_total", "counter", "Estimated context tokens before and after packing", [
+        ({"stage": "retrieved"}, packing["tokens_before"]),
+        ({"stage": "packed"}, packing["tokens_after"]),
+    ]
+    
+    if _llm_gateway.loaded:
+        gateway = get_llm_gateway().stats()
+        yield "rag_llm_in_flight", "gauge", "LLM completions currently running", [({}, gateway["in_flight"])]
+        yield "rag_llm_queued", "gauge", "LLM completions waiting for a slot", [({}, gateway["queued"])]
+        yield "rag_llm_requests_total", "counter", "LLM requests by outcome", [
+            ({"result": result}, gateway[result]) for result in ("completed", "failed", "rejected")
+        ]
+        yield "rag_llm_retries_total", "counter", "LLM request retries after rate limits or transient errors", [
+            ({}, gateway["retries"])
+        ]
+
+
+registry.collector(_collect_metrics)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """
+    Fuse several rankings of chunk ids with Reciprocal Rank Fusion
+    
+    Args:
+        rankings: Lists of chunk ids, each ordered best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+        
+    Returns:
+        Chunk ids ordered by fused score, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def format_source(meta: dict) -> str:
+    """
+    Format a chunk's source filename with its page numbers
+    
+    Args:
+        meta: Chunk metadata
+        
+    Returns:
+        Source entry such as "document.pdf (p.1, p.2)"
+    """
+    source = meta.get("source", "Unknown")
+    pages_str = meta.get("pages", "")
+    
+    # Parse pages from comma-separated string
+    pages = [int(p) for p in pages_str.split(",") if p.strip()] if pages_str else []
+    
+    # Format source with page numbers
+    if pages:
+        page_str = ", ".join([f"p.{p}" for p in pages])
+        return f"{source} ({page_str})"
+    return source
+
+
+def _build_retrieval(chunk_ids: List[str], chunks: dict, query_embedding: np.ndarray) -> Retrieval:
+    """
+    Assemble the context text and source list for ranked chunk ids
+    
+    With context packing enabled, overlapping neighbors are merged,
+    near-duplicates dropped and the rest packed into CONTEXT_TOKEN_BUDGET.
+    
+    Args:
+        chunk_ids: Chunk ids, best first
+        chunks: Mapping of chunk id to (text, metadata)
+        query_embedding: Embedding of the question
+        
+    Returns:
+        Retrieval for the chunks
+    """
+    if not chunk_ids:
+        return Retrieval("", [], [], query_embedding)
+    
+    if not settings.CONTEXT_PACKING_ENABLED:
+        sources = []
+        for chunk_id in chunk_ids:
+            source_entry = format_source(chunks[chunk_id][1])
+            if source_entry not in sources:
+                sources.append(source_entry)
+        context = format_context([chunks[chunk_id][0] for chunk_id in chunk_ids])
+        return Retrieval(context, sources, chunk_ids, query_embedding)
+    
+    packed = pack_context(
+        [(chunk_id, *chunks[chunk_id]) for chunk_id in chunk_ids],
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD
+    )
+    packing_stats.record(packed)
+    
+    sources = []
+    for passage in packed.passages:
+        source_entry = format_source(passage.meta)
+        if source_entry not in sources:
+            sources.append(source_entry)
+    
+    if packed.tokens_saved:
+        logger.info(
+            f"Packed {packed.chunk_count} chunks into {len(packed.passages)} passages, "
+            f"saving {packed.tokens_saved} prompt tokens"
         )
+    
+    return Retrieval(packed.context, sources, chunk_ids, query_embedding, packed.stats())
+
+
+def retrieve_contexts(
+    questions: List[str],
+    top_k: int = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT,
+    query_embeddings: Optional[np.ndarray] = None
+) -> List[Retrieval]:
+    """
+    Retrieve the most relevant chunks for several questions at once
+    
+    All questions are embedded in one batched encode and searched with a
+    single multi-vector Chroma query. With hybrid search enabled, dense
+    (vector) and sparse (BM25) candidates are fused with Reciprocal Rank
+    Fusion, so exact matches on part numbers, clause ids and acronyms are
+    found even when their embeddings are not close. With reranking enabled,
+    RERANK_CANDIDATES chunks are scored by a cross-encoder and the best
+    top_k kept, within RERANK_BUDGET_MS for the whole call.
+    
+    Args:
+        questions: The questions to ask
+        top_k: Number of context chunks to retrieve per question
+        sources: Optional source filenames to restrict the search to
+        tenant_id: Tenant whose collection is searched
+        query_embeddings: Embeddings of the questions, if already computed
         
-        # Query the vector database
+    Returns:
+        One Retrieval per question, in order; context is empty if nothing was found
+    """
+    if top_k is None:
+        top_k = settings.TOP_K_RESULTS
+    
+    logger.info(f"Processing {len(questions)} queries with top_k={top_k}")
+    
+    hybrid = settings.HYBRID_SEARCH_ENABLED
+    reranker = get_reranker()
+    # Chunks kept per question after fusion; the reranker picks top_k of them
+    n_keep = max(top_k, settings.RERANK_CANDIDATES) if reranker is not None else top_k
+    n_candidates = max(n_keep, settings.HYBRID_CANDIDATES) if hybrid else n_keep
+    
+    collection = get_collection(tenant_id)
+    
+    # Generate embeddings for the questions using HuggingFace (LOCAL - INSTANT!)
+    if query_embeddings is None:
+        query_embeddings = encode_queries(questions)
+    # Match the dimension the collection was built with
+    query_embeddings = truncate_embeddings(query_embeddings, collection_dimension(collection))
+    
+    # Query the tenant's vector database
+    # Scoped queries are filtered inside the index rather than after retrieval
+    where = {"source": {"$in": sources}} if sources else None
+    with stage("chroma_query"):
         results = collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=top_k
+            query_embeddings=as_vectors(query_embeddings),
+            n_results=n_candidates,
+            where=where
         )
+    
+    chunks = {}
+    rankings = []
+    for ids, docs, metas in zip(results["ids"], results["documents"], results["metadatas"]):
+        chunks.update((chunk_id, (doc, meta)) for chunk_id, doc, meta in zip(ids, docs, metas))
+        rankings.append(ids)
+    
+    if hybrid:
+        allow = None
+        if sources:
+            # Chunk ids start with their document id
+            doc_ids = {document_id(source) for source in sources}
+            
+            def allow(chunk_id: str) -> bool:
+                return chunk_id[:16] in doc_ids
         
-        # Check if we have results
-        if not results["documents"][0]:
-            return "I don't have any documents indexed yet. Please upload a PDF first.", []
+        sparse_index = get_sparse_index(tenant_id)
+        for i, question in enumerate(questions):
+            with stage("bm25"):
+                sparse_ids = [chunk_id for chunk_id, _ in sparse_index.search(question, n_candidates, allow)]
+            rankings[i] = reciprocal_rank_fusion([rankings[i], sparse_ids], k=settings.RRF_K)
         
-        # Extract documents and sources
-        documents = results["documents"][0]
-        metadatas = results["metadatas"][0]
+        # Fetch chunks that only the sparse index found, for all questions in one call
+        missing = list(dict.fromkeys(
+            chunk_id for ranking in rankings for chunk_id in ranking[:n_keep] if chunk_id not in chunks
+        ))
+        if missing:
+            fetched = collection.get(ids=missing, include=["documents", "metadatas"])
+            for chunk_id, doc, meta in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                chunks[chunk_id] = (doc, meta)
+    
+    # One latency budget for the whole request, so a batch can't multiply it
+    deadline = time.monotonic() + settings.RERANK_BUDGET_MS / 1000
+    
+    retrievals = []
+    for question, ranking, query_embedding in zip(questions, rankings, query_embeddings):
+        # Keep the best chunks that still exist
+        chunk_ids = [chunk_id for chunk_id in ranking if chunk_id in chunks][:n_keep]
+        if reranker is not None and len(chunk_ids) > top_k:
+            with stage("rerank"):
+                chunk_ids = reranker.rerank(
+                    question,
+                    [(chunk_id, chunks[chunk_id][0]) for chunk_id in chunk_ids],
+                    top_k,
+                    deadline
+                )
+        with stage("context"):
+            retrievals.append(_build_retrieval(chunk_ids[:top_k], chunks, query_embedding))
+    
+    return retrievals
+
+
+def retrieve_context(
+    question: str,
+    top_k: int = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT
+) -> Retrieval:
+    """
+    Retrieve the most relevant chunks for a question
+    
+    Args:
+        question: The question to ask
+        top_k: Number of context chunks to retrieve
+        sources: Optional source filenames to restrict the search to
+        tenant_id: Tenant whose collection is searched
         
-        # Build context from retrieved documents
-        context_parts = []
-        sources = []
+    Returns:
+        Retrieval with the context text, sources and chunk ids; context is empty if nothing is indexed
+    """
+    return retrieve_contexts([question], top_k, sources, tenant_id)[0]
+
+
+async def retrieve_contexts_async(
+    questions: List[str],
+    top_k: int = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT
+) -> List[Retrieval]:
+    """
+    Retrieve contexts for several questions from async code
+    
+    The questions are embedded on the event loop (see encode_queries_async),
+    then searched in a worker thread.
+    
+    Args:
+        questions: The questions to ask
+        top_k: Number of context chunks to retrieve per question
+        sources: Optional source filenames to restrict the search to
+        tenant_id: Tenant whose collection is searched
         
-        for i, (doc, meta) in enumerate(zip(documents, metadatas)):
-            context_parts.append(f"[Context {i+1}]\n{doc}")
-            source = meta.get("source", "Unknown")
-            pages_str = meta.get("pages", "")
-            
-            # Parse pages from comma-separated string
-            pages = [int(p) for p in pages_str.split(",") if p.strip()] if pages_str else []
-            
-            # Format source with page numbers
-            if pages:
-                page_str = ", ".join([f"p.{p}" for p in pages])
-                source_entry = f"{source} ({page_str})"
-            else:
-                source_entry = source
-            
-            if source_entry not in sources:
-                sources.append(source_entry)
+    Returns:
+        One Retrieval per question, in order
+    """
+    query_embeddings = await encode_queries_async(questions)
+    return await asyncio.to_thread(retrieve_contexts, questions, top_k, sources, tenant_id, query_embeddings)
+
+
+def lookup_answer(answer_cache: Optional[AnswerCache], question: str, retrieval: Retrieval) -> Optional[Tuple[str, List[str]]]:
+    """
+    Look up a cached answer for a retrieval, counting hits and misses
+    
+    Args:
+        answer_cache: The tenant's answer cache, or None if disabled
+        question: The question asked
+        retrieval: Retrieval for the question
         
-        context = "\n\n".join(context_parts)
+    Returns:
+        Tuple of (answer, sources) on a hit, otherwise None
+    """
+    if answer_cache is None:
+        return None
+    cached = answer_cache.get(question, retrieval.chunk_ids, retrieval.query_embedding)
+    ANSWER_CACHE_LOOKUPS.labels("miss" if cached is None else "hit").inc()
+    return cached
+
+
+def build_messages(question: str, context: str) -> List[dict]:
+    """
+    Build the chat messages sent to the LLM
+    
+    Args:
+        question: The question to ask
+        context: Retrieved context text
         
-        # Create prompt for Groq Llama 3
-        system_prompt = (
-            "You are a helpful assistant that answers questions based on the provided context. "
-            "Use the context to provide accurate and detailed answers. "
-            "If the context doesn't contain relevant information, say so clearly. "
-            "Always cite which context section(s) you used in your answer."
-        )
+    Returns:
+        List of chat messages
+    """
+    user_prompt = (
+        f"Context from documents:\n\n{context}\n\n"
+        f"Question: {question}\n\n"
+        f"Please provide a detailed answer based on the context above."
+    )
+    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+async def query_rag(
+    question: str,
+    top_k: int = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT
+) -> Tuple[str, List[str]]:
+    """
+    Query the RAG system with a question
+    
+    Retrieval runs in a worker thread and generation goes through the async
+    LLM gateway, so the event loop is never blocked.
+    
+    Args:
+        question: The question to ask
+        top_k: Number of context chunks to retrieve
+        sources: Optional source filenames to restrict the search to
+        tenant_id: Tenant whose collection is searched
         
-        user_prompt = (
-            f"Context from documents:\n\n{context}\n\n"
-            f"Question: {question}\n\n"
-            f"Please provide a detailed answer based on the context above."
-        )
+    Returns:
+        Tuple of (answer, list of source documents)
+        
+    Raises:
+        OverloadedError: If the LLM gateway can't take the request
+    """
+    try:
+        retrieval = (await retrieve_contexts_async([question], top_k, sources, tenant_id))[0]
+        sources = retrieval.sources
+        
+        if not retrieval.context:
+            return NO_DOCUMENTS_ANSWER, []
+        
+        # Reuse the answer to an identical or near-identical question over the same chunks
+        answer_cache = get_answer_cache(tenant_id)
+        cached = lookup_answer(answer_cache, question, retrieval)
+        if cached is not None:
+            logger.info("Answer served from cache")
+            return cached
         
         # Generate answer using Groq (INSANELY FAST!)
-        chat_response = groq_client.chat.completions.create(
-            model=settings.CHAT_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
+        answer = await get_llm_gateway().complete(
+            build_messages(question, retrieval.context),
+            max_tokens=settings.CHAT_MAX_TOKENS,
+            temperature=settings.CHAT_TEMPERATURE
         )
         
-        answer = chat_response.choices[0].message.content
+        if answer_cache is not None:
+            answer_cache.put(question, retrieval.chunk_ids, answer, sources, retrieval.query_embedding)
         
         logger.info(f"Generated answer with {len(sources)} sources")
         
         return answer, sources
         
+    except OverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Query failed: {e}", exc_info=True)
         raise
+
+
+async def stream_query_rag(
+    question: str,
+    top_k: int = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT
+) -> AsyncIterator[Tuple[str, object]]:
+    """
+    Query the RAG system and stream the answer as it is generated
+    
+    Retrieval runs in a worker thread and generation goes through the async
+    LLM gateway, so the event loop is never blocked.
+    
+    Args:
+        question: The question to ask
+        top_k: Number of context chunks to retrieve
+        sources: Optional source filenames to restrict the search to
+        tenant_id: Tenant whose collection is searched
+        
+    Yields:
+        ("sources", list of source documents) once, then ("token", text) for each generated piece
+    """
+    try:
+        retrieval = (await retrieve_contexts_async([question], top_k, sources, tenant_id))[0]
+        sources = retrieval.sources
+        
+        yield "sources", sources
+        
+        if not retrieval.context:
+            yield "token", NO_DOCUMENTS_ANSWER
+            return
+        
+        answer_cache = get_answer_cache(tenant_id)
+        cached = lookup_answer(answer_cache, question, retrieval)
+        if cached is not None:
+            logger.info("Answer served from cache")
+            yield "token", cached[0]
+            return
+        
+        answer_parts = []
+        async for token in get_llm_gateway().stream(
+            build_messages(question, retrieval.context),
+            max_tokens=settings.CHAT_MAX_TOKENS,
+            temperature=settings.CHAT_TEMPERATURE
+        ):
+            answer_parts.append(token)
+            yield "token", token
+        
+        if answer_cache is not None:
+            answer_cache.put(question, retrieval.chunk_ids, "".join(answer_parts), sources, retrieval.query_embedding)
+        
+        logger.info(f"Streamed answer with {len(sources)} sources")
+        
+    except OverloadedError:
+        raise
+    except Exception as e:
+        logger.error(f"Streaming query failed: {e}", exc_info=True)
+        raise
+
+
+class BatchAnswer(NamedTuple):
+    """Answer to one question of a batch"""
+    question: str
+    answer: Optional[str]
+    sources: List[str]
+    error: Optional[str] = None
+
+
+async def batch_query_rag(
+    questions: List[str],
+    top_k: int = None,
+    sources: Optional[List[str]] = None,
+    tenant_id: str = DEFAULT_TENANT,
+    concurrency: int = None
+) -> List[BatchAnswer]:
+    """
+    Answer several questions with one retrieval pass and concurrent generation
+    
+    Retrieval for the whole batch runs in a worker thread with a single
+    batched encode and one multi-vector collection query. Completions then
+    run concurrently, at most ``concurrency`` at a time, each waiting up to
+    BATCH_QUERY_QUEUE_TIMEOUT for rate limit budget so a batch larger than
+    the per-minute token budget is paced rather than rejected. A failed
+    completion only fails its own question.
+    
+    Args:
+        questions: The questions to ask
+        top_k: Number of context chunks to retrieve per question
+        sources: Optional source filenames to restrict the search to
+        tenant_id: Tenant whose collection is searched
+        concurrency: Maximum concurrent LLM calls (defaults to BATCH_QUERY_CONCURRENCY)
+        
+    Returns:
+        One BatchAnswer per question, in the order the questions were given
+    """
+    if concurrency is None:
+        concurrency = settings.BATCH_QUERY_CONCURRENCY
+    
+    retrievals = await retrieve_contexts_async(questions, top_k, sources, tenant_id)
+    answer_cache = get_answer_cache(tenant_id)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer(question: str, retrieval: Retrieval) -> BatchAnswer:
+        if not retrieval.context:
+            return BatchAnswer(question, NO_DOCUMENTS_ANSWER, [])
+        
+        cached = lookup_answer(answer_cache, question, retrieval)
+        if cached is not None:
+            return BatchAnswer(question, *cached)
+        
+        try:
+            async with semaphore:
+                text = await get_llm_gateway().complete(
+                    build_messages(question, retrieval.context),
+                    max_tokens=settings.CHAT_MAX_TOKENS,
+                    temperature=settings.CHAT_TEMPERATURE,
+                    queue_timeout=settings.BATCH_QUERY_QUEUE_TIMEOUT
+                )
+        except Exception as e:
+            logger.error(f"Batch query failed for {question[:50]!r}: {e}")
+            return BatchAnswer(question, None, retrieval.sources, str(e))
+        
+        if answer_cache is not None:
+            answer_cache.put(question, retrieval.chunk_ids, text, retrieval.sources, retrieval.query_embedding)
+        return BatchAnswer(question, text, retrieval.sources)
+    
+    # Repeated questions in a batch share one completion
+    tasks = {}
+    for question, retrieval in zip(questions, retrievals):
+        if question not in tasks:
+            tasks[question] = asyncio.ensure_future(answer(question, retrieval))
+    await asyncio.gather(*tasks.values())
+    
+    results = [tasks[question].result() for question in questions]
+    logger.info(
+        f"Answered batch of {len(questions)} questions "
+        f"({sum(1 for result in results if result.error)} failed)"
+    )
+    return results
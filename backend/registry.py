@@ -0,0 +1,97 @@
+"""Registry of indexed documents"""
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """
+    SQLite-backed table of indexed documents
+
+    One row per document id (derived from the filename), updated every time
+    the document is re-indexed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL UNIQUE,
+                file_hash TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_file_hash ON documents (file_hash)")
+        self._conn.commit()
+
+        logger.info(f"Document registry opened at {self.path}")
+
+    def upsert(self, doc_id: str, filename: str, file_hash: str, page_count: int, chunk_count: int):
+        """
+        Record a document after it has been indexed
+
+        Args:
+            doc_id: Document id
+            filename: Source filename
+            file_hash: SHA-256 of the file contents
+            page_count: Number of pages in the PDF
+            chunk_count: Number of chunks stored for the document
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (id, filename, file_hash, page_count, chunk_count, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, filename, file_hash, page_count, chunk_count, time.time())
+            )
+            self._conn.commit()
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        """Look up a document by id"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, file_hash: str) -> Optional[dict]:
+        """Look up a document by the SHA-256 of its contents"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE file_hash = ? LIMIT 1", (file_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self) -> List[dict]:
+        """All documents, most recently indexed first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM documents ORDER BY indexed_at DESC").fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, doc_id: str) -> bool:
+        """
+        Remove a document
+
+        Returns:
+            True if the document existed
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def clear(self):
+        """Remove every document"""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
@@ -0,0 +1,200 @@
+"""Cross-encoder reranking of retrieved chunks with a latency budget and score cache"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreCache:
+    """LRU cache of cross-encoder scores keyed by normalized question and chunk id"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._scores: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, question: str, chunk_ids: List[str]) -> dict:
+        """
+        Look up cached scores
+
+        Args:
+            question: The question asked
+            chunk_ids: Ids of the candidate chunks
+
+        Returns:
+            Mapping of chunk id to score for the cached pairs
+        """
+        question = normalize_question(question)
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                score = self._scores.get((question, chunk_id))
+                if score is None:
+                    continue
+                self._scores.move_to_end((question, chunk_id))
+                found[chunk_id] = score
+            self.hits += len(found)
+            self.misses += len(chunk_ids) - len(found)
+        return found
+
+    def put_many(self, question: str, scores: dict):
+        """Store scores for (question, chunk id) pairs"""
+        question = normalize_question(question)
+        with self._lock:
+            for chunk_id, score in scores.items():
+                self._scores[(question, chunk_id)] = score
+                self._scores.move_to_end((question, chunk_id))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class Reranker:
+    """
+    Reorders retrieved chunks by cross-encoder relevance to the question
+
+    Pairs are scored in batches of at most ``batch_size``. Under a deadline,
+    each batch is sized from the measured per-pair latency so it fits in the
+    remaining budget (the first call probes with a single pair); once no
+    pair fits, the original (retrieval) order is kept so a slow CPU never
+    holds up the answer. The budget is only as tight as that estimate, so a
+    sudden slowdown can still overrun it by up to one batch. Scores computed
+    so far are still cached, and chunk ids change whenever chunk text does,
+    so cached scores never go stale.
+    """
+
+    # Weight of the latest batch in the per-pair latency estimate
+    LATENCY_SMOOTHING = 0.3
+
+    def __init__(self, model, batch_size: int = 16, cache: Optional[ScoreCache] = None):
+        self.model = model
+        self.batch_size = batch_size
+        self.cache = cache
+        self.reranked = 0
+        self.fallbacks = 0
+        self.pairs_scored = 0
+        self._total_seconds = 0.0
+        self._pair_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _batch_length(self, remaining: int, deadline: Optional[float]) -> int:
+        """Number of pairs to score next, or 0 if none fits before the deadline"""
+        length = min(self.batch_size, remaining)
+        if deadline is None:
+            return length
+        budget = deadline - time.monotonic()
+        if budget <= 0:
+            return 0
+        with self._lock:
+            pair_seconds = self._pair_seconds
+        if pair_seconds is None:
+            return 1
+        return min(length, int(budget / pair_seconds))
+
+    def _observe(self, pairs: int, seconds: float):
+        """Fold one batch's latency into the per-pair estimate"""
+        with self._lock:
+            latest = seconds / pairs
+            if self._pair_seconds is None:
+                self._pair_seconds = latest
+            else:
+                self._pair_seconds += self.LATENCY_SMOOTHING * (latest - self._pair_seconds)
+
+    def rerank(
+        self,
+        question: str,
+        candidates: List[Tuple[str, str]],
+        top_k: int,
+        deadline: Optional[float] = None
+    ) -> List[str]:
+        """
+        Keep the ``top_k`` candidates the cross-encoder scores highest
+
+        Args:
+            question: The question asked
+            candidates: (chunk_id, text) pairs in retrieval order
+            top_k: Number of chunk ids to return
+            deadline: time.monotonic() value after which scoring stops
+
+        Returns:
+            Chunk ids, best first (retrieval order if the deadline passed)
+        """
+        start = time.monotonic()
+        chunk_ids = [chunk_id for chunk_id, _ in candidates]
+        scores = self.cache.get_many(question, chunk_ids) if self.cache is not None else {}
+        pending = [(chunk_id, text) for chunk_id, text in candidates if chunk_id not in scores]
+
+        complete = True
+        computed = {}
+        scored = 0
+        while scored < len(pending):
+            length = self._batch_length(len(pending) - scored, deadline)
+            if not length:
+                complete = False
+                break
+            batch = pending[scored:scored + length]
+            scored += length
+            batch_start = time.monotonic()
+            batch_scores = self.model.predict(
+                [(question, text) for _, text in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            self._observe(len(batch), time.monotonic() - batch_start)
+            computed.update((chunk_id, float(score)) for (chunk_id, _), score in zip(batch, batch_scores))
+
+        if computed and self.cache is not None:
+            self.cache.put_many(question, computed)
+        scores.update(computed)
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self.pairs_scored += len(computed)
+            self._total_seconds += elapsed
+            if complete:
+                self.reranked += 1
+            else:
+                self.fallbacks += 1
+
+        if not complete:
+            logger.warning(
+                f"Rerank budget exceeded after scoring {len(scores)}/{len(candidates)} candidates, "
+                f"keeping retrieval order"
+            )
+            return chunk_ids[:top_k]
+
+        # sorted() is stable, so ties keep their retrieval order
+        return sorted(chunk_ids, key=lambda chunk_id: scores[chunk_id], reverse=True)[:top_k]
+
+    def stats(self) -> dict:
+        """Rerank counters"""
+        with self._lock:
+            calls = self.reranked + self.fallbacks
+            stats = {
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "pairs_scored": self.pairs_scored,
+                "avg_ms": round(self._total_seconds / calls * 1000, 1) if calls else 0.0,
+                "pair_ms": round(self._pair_seconds * 1000, 2) if self._pair_seconds is not None else None,
+            }
+        if self.cache is not None:
+            stats["score_cache"] = self.cache.stats()
+        return stats
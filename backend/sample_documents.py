@@ -0,0 +1,125 @@
+"""
+Synthetic documents shared by the tests and benchmarks
+
+Builds text PDFs without a PDF-writing library, page maps with repeated
+pages for chunking, and ground-truth page numbers for chunks.
+"""
+import random
+from pathlib import Path
+
+import numpy as np
+
+from utils import chunk_spans
+
+WORDS = [
+    "contract", "clause", "party", "liability", "section", "payment", "term", "notice",
+    "agreement", "schedule", "warranty", "indemnity", "supplier", "customer", "invoice",
+    "delivery", "termination", "breach", "damages", "insurance", "audit", "records",
+    "confidential", "information", "dispute", "arbitration", "governing", "law", "force",
+    "majeure", "renewal", "period", "price", "adjustment", "service", "level", "credit",
+]
+
+
+def make_page_lines(rng: random.Random, lines: int) -> list:
+    """Random sentences of vocabulary words, one per line"""
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14))).capitalize() + "."
+        for _ in range(lines)
+    ]
+
+
+def write_pdf(path: Path, pages: int, lines_per_page: int = 45, seed: int = 42) -> list:
+    """
+    Write a text PDF with the given number of pages
+
+    The file is assembled by hand (one Helvetica text stream per page) so no
+    PDF-writing library is needed.
+
+    Args:
+        path: Output path
+        pages: Number of pages
+        lines_per_page: Lines of text on each page
+        seed: Random seed, so the same arguments always produce the same file
+
+    Returns:
+        List of each page's lines
+    """
+    rng = random.Random(seed)
+    page_lines = [make_page_lines(rng, lines_per_page) for _ in range(pages)]
+
+    # Object 1 is the catalog, 2 the page tree, 3 the font, then a page and its content stream per page
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(page_lines):
+        text = " ".join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 14 TL 40 770 Td {text} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+    return page_lines
+
+
+def make_document(pages: int, seed: int = 42) -> list:
+    """
+    Build a synthetic page map
+
+    Every fiftieth page starts a run of five identical short pages (a
+    repeated form or notice). Text that repeats with a period shorter than
+    the chunk step is where find-based page mapping goes wrong: searching
+    forward from just after the previous chunk finds the same text one page
+    too early.
+    """
+    rng = random.Random(seed)
+    words = ["contract", "clause", "party", "liability", "section", "payment", "term",
+             "notice", "agreement", "schedule", "warranty", "indemnity", "A-113", "ISO-9001"]
+    notice = " ".join(["This page repeats the standard confidentiality notice."] * 7)
+
+    page_map = []
+    for page_num in range(1, pages + 1):
+        if page_num % 50 in (10, 11, 12, 13, 14):
+            page_text = notice
+        else:
+            sentences = [
+                " ".join(rng.choice(words) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                for _ in range(rng.randint(15, 30))
+            ]
+            page_text = " ".join(sentences)
+        page_map.append((page_num, page_text))
+    return page_map
+
+
+def expected_pages(text: str, page_map: list, chunk_size: int, chunk_overlap: int) -> list:
+    """
+    Page numbers of each chunk, read off a map from every character to its page
+
+    Slow but independent of both implementations, so it serves as ground truth.
+    """
+    owner = np.zeros(len(text), dtype=np.int32)  # 0 for the blank lines between pages
+    position = 0
+    for page_num, page_text in page_map:
+        owner[position:position + len(page_text)] = page_num
+        position += len(page_text) + 2
+
+    return [
+        [int(page_num) for page_num in np.unique(owner[start:end]) if page_num]
+        for start, end in chunk_spans(text, chunk_size, chunk_overlap)
+    ]
@@ -0,0 +1,63 @@
+"""Tests for micro-batching of query embeddings"""
+import asyncio
+import threading
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+class RecordingEncoder:
+    """Encodes each text as its number, recording batch sizes"""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+
+    def __call__(self, texts):
+        self.release.wait(5)
+        self.batches.append(len(texts))
+        return np.array([[float(text)] for text in texts])
+
+
+def texts(start, count):
+    return [str(number) for number in range(start, start + count)]
+
+
+def test_requests_are_split_to_respect_max_batch_size():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_batch_size=4, max_wait=0.2)
+
+    async def run():
+        # The first request occupies the worker so the rest queue up together
+        first = asyncio.ensure_future(batcher.encode_async(texts(0, 1)))
+        await asyncio.sleep(0.05)
+        rest = [asyncio.ensure_future(batcher.encode_async(texts(10 * i, 3))) for i in range(1, 4)]
+        await asyncio.sleep(0.05)
+        encoder.release.set()
+        return await first, await asyncio.gather(*rest)
+
+    first, rest = asyncio.run(run())
+
+    assert max(encoder.batches) <= 4
+    assert sum(encoder.batches) == 10
+    assert first.ravel().tolist() == [0.0]
+    for i, vectors in enumerate(rest, start=1):
+        assert vectors.ravel().tolist() == [float(number) for number in range(10 * i, 10 * i + 3)]
+
+
+def test_waiting_callers_do_not_hold_threads():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_batch_size=64, max_wait=0.05)
+
+    async def run():
+        pending = [asyncio.ensure_future(batcher.encode_async(texts(i, 1))) for i in range(20)]
+        await asyncio.sleep(0.1)
+        # Only the batcher's worker is busy; no thread is parked per waiting caller
+        busy = threading.active_count()
+        encoder.release.set()
+        await asyncio.gather(*pending)
+        return busy
+
+    before = threading.active_count()
+    assert asyncio.run(run()) <= before + 1
@@ -0,0 +1,80 @@
+"""Tests for the BM25 index"""
+import bm25
+from bm25 import BM25Index
+
+TEXTS = {
+    "a": "pump pressure relief valve",
+    "b": "pump impeller inspection",
+    "c": "valve seat replacement",
+    "d": "gearbox oil change",
+}
+
+
+def build(path, chunk_ids) -> BM25Index:
+    index = BM25Index(path)
+    index.add(chunk_ids, [TEXTS[chunk_id] for chunk_id in chunk_ids])
+    return index
+
+
+def test_removed_chunks_do_not_affect_scores(tmp_path):
+    """Tombstoned postings must not count towards document frequency"""
+    index = build(tmp_path / "a.pkl", ["a", "b", "c", "d"])
+    index.remove(["b", "c"])
+    fresh = build(tmp_path / "b.pkl", ["a", "d"])
+
+    assert index.search("pump valve", 10) == fresh.search("pump valve", 10)
+    assert all(score > 0 for _, score in index.search("pump", 10))
+
+
+def test_reindexing_compacts_tombstones(tmp_path, monkeypatch):
+    """Replacing chunks in place leaves tombstones that get compacted away"""
+    monkeypatch.setattr(bm25, "MIN_COMPACT_TOMBSTONES", 2)
+    index = build(tmp_path / "index.pkl", ["a", "b", "c", "d"])
+    for _ in range(3):
+        index.add(["a", "b"], [TEXTS["a"], TEXTS["b"]])
+
+    assert index.stats()["tombstones"] <= len(index) // 4 + 1
+    assert [chunk_id for chunk_id, _ in index.search("impeller", 10)] == ["b"]
+
+
+def test_changes_are_logged_and_replayed(tmp_path):
+    path = tmp_path / "index.pkl"
+    index = build(path, ["a", "b", "c"])
+    index.save()
+    index.remove(["a"])
+    index.add(["d"], [TEXTS["d"]])
+    index.save()
+
+    assert not path.exists() and index.log_path.exists()
+    loaded = BM25Index(path)
+    assert loaded.load()
+    assert len(loaded) == 3
+    assert loaded.search("gearbox pump valve", 10) == index.search("gearbox pump valve", 10)
+
+
+def test_large_log_is_folded_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "MIN_SNAPSHOT_LOG_BYTES", 0)
+    path = tmp_path / "index.pkl"
+    index = build(path, ["a", "b"])
+    index.save()
+    index.add(["c"], [TEXTS["c"]])
+    index.save()
+
+    assert path.exists() and not index.log_path.exists()
+    loaded = BM25Index(path)
+    loaded.load()
+    assert loaded.search("valve", 10) == index.search("valve", 10)
+
+
+def test_torn_log_tail_is_ignored(tmp_path):
+    path = tmp_path / "index.pkl"
+    index = build(path, ["a", "b"])
+    index.save()
+    index.add(["c"], [TEXTS["c"]])
+    index.save()
+    with open(index.log_path, "r+b") as f:
+        f.truncate(index.log_path.stat().st_size - 5)
+
+    loaded = BM25Index(path)
+    assert loaded.load()
+    assert len(loaded) == 2
@@ -0,0 +1,57 @@
+"""Tests for the SQLite embedding cache"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Make every access time distinct and increasing"""
+    ticks = iter(range(1, 1_000_000))
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+
+def vector(seed: int) -> np.ndarray:
+    return np.full(4, seed, dtype=np.float32)
+
+
+def stored_access_times(cache: EmbeddingCache) -> dict:
+    with sqlite3.connect(str(cache.path)) as conn:
+        return dict(conn.execute("SELECT text_hash, last_access FROM embeddings"))
+
+
+def test_count_is_tracked_without_rescanning(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.db", "model", max_entries=100)
+    cache.put_many([("a", vector(1)), ("b", vector(2))])
+    cache.put_many([("b", vector(2)), ("c", vector(3))])
+
+    assert cache.count() == 3
+    assert EmbeddingCache(tmp_path / "cache.db", "model", max_entries=100).count() == 3
+
+
+def test_lookups_buffer_access_times(tmp_path, clock):
+    cache = EmbeddingCache(tmp_path / "cache.db", "model", max_entries=100)
+    cache.put_many([("a", vector(1))])
+    before = stored_access_times(cache)
+
+    assert np.array_equal(cache.get_many(["a", "missing"])["a"], vector(1))
+    assert stored_access_times(cache) == before
+
+    cache.flush()
+    assert stored_access_times(cache)["a"] > before["a"]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(tmp_path / "cache.db", "model", max_entries=3)
+    for seed, text_hash in enumerate("abc"):
+        cache.put_many([(text_hash, vector(seed))])
+    cache.get_many(["a"])
+    cache.put_many([("d", vector(4))])
+
+    assert cache.count() == 3
+    assert cache.evictions == 1
+    assert set(cache.get_many(["a", "b", "c", "d"])) == {"a", "c", "d"}
@@ -0,0 +1,86 @@
+"""Tests for the LLM gateway's rate limiting"""
+import asyncio
+
+import httpx
+import numpy as np
+from groq import AsyncGroq
+
+import rag
+from config import settings
+from llm import LLMGateway, OverloadedError
+from metrics import STAGE_SECONDS
+from llm_stub import create_app
+
+
+def make_gateway(**kwargs) -> LLMGateway:
+    """A gateway whose provider is an in-process llm_stub"""
+    gateway = LLMGateway(api_key="test", model="stub", **kwargs)
+    gateway._client = AsyncGroq(
+        api_key="test",
+        base_url="http://stub",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(latency=0.01, token_delay=0)))
+    )
+    return gateway
+
+
+def test_batch_larger_than_token_budget_completes(embedding_model, monkeypatch):
+    """Reservations beyond the per-minute budget wait for refunds instead of failing"""
+    questions = [f"Question {i}?" for i in range(12)]
+    retrieval = rag.Retrieval("Some context.", ["doc.pdf"], ["chunk-0"], np.zeros(4, dtype=np.float32))
+    gateway = make_gateway(tpm_limit=6000, queue_timeout=1.0)
+
+    monkeypatch.setattr(settings, "CHAT_MAX_TOKENS", 1000)
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(rag, "retrieve_contexts", lambda questions, *args: [retrieval] * len(questions))
+    rag._llm_gateway.reset(gateway)
+    try:
+        results = asyncio.run(rag.batch_query_rag(questions, top_k=1))
+    finally:
+        rag._llm_gateway.reset()
+
+    # 12 reservations of over 1000 tokens each are twice the 6000 tokens per minute budget
+    assert [result.error for result in results] == [None] * len(questions)
+    assert gateway.stats()["completed"] == len(questions)
+    assert gateway.stats()["rejected"] == 0
+
+
+def test_request_over_budget_with_nothing_in_flight_fails_fast():
+    """With no refunds to wait for, a request that can't fit the timeout is rejected immediately"""
+    gateway = make_gateway(tpm_limit=600, queue_timeout=0.5)
+    messages = [{"role": "user", "content": "hello"}]
+
+    async def run():
+        gateway._tokens.reserve(600)
+        await gateway.complete(messages, max_tokens=100, temperature=0)
+
+    try:
+        asyncio.run(run())
+    except OverloadedError as e:
+        assert e.retry_after >= 10
+    else:
+        raise AssertionError("expected OverloadedError")
+    assert gateway.stats()["rejected"] == 1
+
+
+def test_stream_timing_excludes_the_consumer():
+    """Time the consumer spends on each piece isn't charged to the llm stage"""
+    gateway = make_gateway()
+    messages = [{"role": "user", "content": "hello"}]
+    llm_seconds = STAGE_SECONDS.labels("llm")
+    before = llm_seconds.snapshot()
+
+    async def run():
+        pieces = 0
+        async for _ in gateway.stream(messages, max_tokens=100, temperature=0):
+            pieces += 1
+            await asyncio.sleep(0.05)
+        await gateway.close()
+        return pieces
+
+    pieces = asyncio.run(run())
+    after = llm_seconds.snapshot()
+
+    assert pieces >= 3
+    assert after["count"] == before["count"] + 1
+    assert after["sum"] - before["sum"] < 0.05 * pieces / 2
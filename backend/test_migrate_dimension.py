@@ -0,0 +1,53 @@
+"""Tests for converting a collection to a different embedding dimension"""
+import numpy as np
+
+import rag
+from db import (
+    get_client, get_collection, collection_name, collection_dimension, recover_migrations,
+    staging_collection_name, stored_tenants, STAGING_SUFFIX, DEFAULT_TENANT
+)
+from migrate_dimension import migrate_collection
+
+
+def test_migration_keeps_every_chunk_at_the_new_dimension(embedding_model, make_pdf):
+    tenant_id = "migrate"
+    rag.index_pdf(str(make_pdf(6)), tenant_id=tenant_id)
+    before = get_collection(tenant_id).get(include=["documents"])
+
+    assert migrate_collection(tenant_id, 8) == len(before["ids"])
+
+    collection = get_collection(tenant_id)
+    after = collection.get(include=["embeddings", "documents"])
+    assert collection_dimension(collection) == 8
+    assert sorted(after["ids"]) == sorted(before["ids"])
+    assert np.asarray(after["embeddings"]).shape == (len(before["ids"]), 8)
+    assert np.allclose(np.linalg.norm(after["embeddings"], axis=1), 1, atol=1e-5)
+    assert not [c.name for c in get_client().list_collections() if c.name.endswith(STAGING_SUFFIX)]
+
+
+def test_lone_staging_collection_is_restored():
+    client = get_client()
+    name = collection_name("interrupted")
+    staging = client.create_collection(staging_collection_name("interrupted"))
+    staging.add(ids=["a", "b"], embeddings=np.eye(2, 4, dtype=np.float32), documents=["one", "two"])
+
+    assert recover_migrations(client) == [name]
+    assert client.get_collection(name).count() == 2
+    assert recover_migrations(client) == []
+
+
+def test_tenants_named_like_staging_collections_are_left_alone(embedding_model, make_pdf):
+    """A tenant called "migrating" (or "X-migrating") must never be mistaken for a migration"""
+    assert staging_collection_name(DEFAULT_TENANT) != collection_name("migrating")
+    assert staging_collection_name("acme") != collection_name("acme-migrating")
+
+    rag.index_pdf(str(make_pdf(2)), tenant_id="migrating")
+    rag.index_pdf(str(make_pdf(2)), tenant_id="acme-migrating")
+    rag.index_pdf(str(make_pdf(3, name="acme.pdf")), tenant_id="acme")
+    counts = {tenant_id: get_collection(tenant_id).count() for tenant_id in ("migrating", "acme-migrating")}
+
+    assert recover_migrations(get_client()) == []
+    migrate_collection("acme", 8)
+
+    assert {tenant_id: get_collection(tenant_id).count() for tenant_id in counts} == counts
+    assert {"migrating", "acme-migrating", "acme"} <= set(stored_tenants())
@@ -0,0 +1,153 @@
+"""Tests for the ingestion pipeline"""
+import time
+import threading
+
+import pytest
+
+import rag
+from db import get_collection
+from jobs import PHASES, PHASE_EXTRACTING, PHASE_CHUNKING, PHASE_EMBEDDING, PHASE_WRITING
+from utils import iter_in_background
+
+
+def test_progress_is_reported_in_order_from_the_calling_thread(embedding_model, make_pdf, monkeypatch):
+    monkeypatch.setattr(rag.settings, "INGEST_BATCH_SIZE", 16)
+    reports = []
+
+    def progress(phase, processed, total):
+        reports.append((phase, processed, total, threading.current_thread()))
+
+    count = rag.index_pdf(str(make_pdf(12)), progress_callback=progress, tenant_id="progress")
+
+    assert {thread for *_, thread in reports} == {threading.current_thread()}
+    phases = [phase for phase, *_ in reports]
+    assert [phase for phase in PHASES if phase in phases] == [
+        PHASE_EXTRACTING, PHASE_CHUNKING, PHASE_EMBEDDING, PHASE_WRITING
+    ]
+    assert phases == sorted(phases, key=PHASES.index)
+    processed = [processed for _, processed, _, _ in reports]
+    assert processed == sorted(processed)
+    assert reports[-1][:3] == (PHASE_WRITING, count, count)
+    assert get_collection("progress").count() == count
+
+
+def test_extraction_errors_reach_the_caller(embedding_model, make_pdf, monkeypatch):
+    def failing_pages(file_path, **kwargs):
+        yield 1, "First page text that is long enough to chunk."
+        raise RuntimeError("corrupt page stream")
+
+    monkeypatch.setattr(rag, "iter_pages", failing_pages)
+
+    with pytest.raises(RuntimeError, match="corrupt page stream"):
+        rag.index_pdf(str(make_pdf(2)), tenant_id="failing")
+    assert get_collection("failing").count() == 0
+
+
+def test_embedding_errors_reach_the_caller(embedding_model, make_pdf, monkeypatch):
+    def failing_encode(texts, batch_size=32):
+        raise MemoryError("out of memory")
+
+    monkeypatch.setattr(embedding_model, "encode", failing_encode)
+    # Other tests may have cached these chunks' vectors, which would skip the encode
+    monkeypatch.setattr(rag, "get_embedding_cache", lambda: None)
+
+    with pytest.raises(MemoryError, match="out of memory"):
+        rag.index_pdf(str(make_pdf(2)), tenant_id="failing-embed")
+
+
+def test_reindexing_removes_chunks_of_the_previous_version(embedding_model, make_pdf):
+    tenant_id = "reindex"
+    rag.index_pdf(str(make_pdf(8, seed=1)), tenant_id=tenant_id)
+    first_ids = set(get_collection(tenant_id).get(include=[])["ids"])
+
+    count = rag.index_pdf(str(make_pdf(3, seed=2)), tenant_id=tenant_id)
+
+    stored = get_collection(tenant_id).get(include=["metadatas"])
+    assert len(stored["ids"]) == count
+    assert not first_ids & set(stored["ids"])
+    assert {metadata["source"] for metadata in stored["metadatas"]} == {"doc.pdf"}
+    assert len(rag.get_sparse_index(tenant_id)) == count
+    assert [document["chunk_count"] for document in rag.list_documents(tenant_id)] == [count]
+
+
+def test_background_stage_runs_at_most_maxsize_items_ahead():
+    produced = []
+
+    def producer():
+        for item in range(100):
+            produced.append(item)
+            yield item
+
+    items = iter_in_background(producer(), maxsize=3)
+    assert next(items) == 0
+    time.sleep(0.3)
+
+    # One item consumed, three buffered and one waiting to be put
+    assert len(produced) <= 5
+    items.close()
+    time.sleep(0.3)
+    assert len(produced) <= 5
+
+
+def test_retry_after_a_failed_ingestion_indexes_the_whole_document(embedding_model, make_pdf, monkeypatch):
+    tenant_id = "retry"
+    path = str(make_pdf(6, seed=3))
+    pages = list(rag.iter_pages(path))
+
+    def failing_pages(file_path, **kwargs):
+        yield from pages[:4]
+        raise RuntimeError("worker crashed")
+
+    monkeypatch.setattr(rag.settings, "INGEST_BATCH_SIZE", 4)
+    with monkeypatch.context() as patch:
+        patch.setattr(rag, "iter_pages", failing_pages)
+        with pytest.raises(RuntimeError):
+            rag.index_pdf(path, tenant_id=tenant_id)
+    partial = get_collection(tenant_id).count()
+    assert partial > 0
+    assert rag.find_indexed(rag.compute_file_hash(path), tenant_id) is None
+
+    count = rag.index_pdf(path, tenant_id=tenant_id)
+
+    assert count > partial
+    assert get_collection(tenant_id).count() == count
+    assert rag.find_indexed(rag.compute_file_hash(path), tenant_id)["chunk_count"] == count
+
+
+def test_versions_of_one_document_are_ingested_one_at_a_time(embedding_model, make_pdf, monkeypatch):
+    tenant_id = "concurrent-versions"
+    first = str(make_pdf(6, name="first.pdf", seed=4))
+    second = str(make_pdf(3, name="second.pdf", seed=5))
+    extracting = []
+    started = threading.Event()
+    release = threading.Event()
+    iter_pages = rag.iter_pages
+
+    def held_pages(file_path, **kwargs):
+        extracting.append(file_path)
+        started.set()
+        if file_path == first:
+            release.wait(5)
+        yield from iter_pages(file_path, **kwargs)
+
+    monkeypatch.setattr(rag, "iter_pages", held_pages)
+    counts = {}
+    threads = [
+        threading.Thread(target=lambda path=path: counts.update({path: rag.index_pdf(path, tenant_id=tenant_id, source="doc.pdf")}))
+        for path in (first, second)
+    ]
+    threads[0].start()
+    assert started.wait(5)
+    threads[1].start()
+    time.sleep(0.3)
+
+    # The second version waits for the first to finish instead of racing its writes
+    assert extracting == [first]
+    release.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert extracting == [first, second]
+    assert get_collection(tenant_id).count() == counts[second]
+    assert [document["chunk_count"] for document in rag.list_documents(tenant_id)] == [counts[second]]
+    assert not rag._document_locks
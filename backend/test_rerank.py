@@ -0,0 +1,50 @@
+"""Tests for cross-encoder reranking"""
+import time
+
+from rerank import Reranker
+
+PAIR_SECONDS = 0.01
+
+
+class SlowCrossEncoder:
+    """Scores pairs by text length, taking a fixed time per pair"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.batches.append(len(pairs))
+        time.sleep(PAIR_SECONDS * len(pairs))
+        return [len(text) for _, text in pairs]
+
+
+def candidates(count):
+    return [(f"chunk-{i}", "x" * i) for i in range(count)]
+
+
+def test_batches_shrink_to_fit_the_remaining_budget():
+    model = SlowCrossEncoder()
+    reranker = Reranker(model, batch_size=16)
+    budget = 0.1
+
+    start = time.monotonic()
+    ranked = reranker.rerank("question", candidates(40), top_k=5, deadline=start + budget)
+    elapsed = time.monotonic() - start
+
+    # The first call probes a single pair, then no batch outgrows what is left of the budget
+    assert model.batches[0] == 1
+    assert max(model.batches) < budget / PAIR_SECONDS
+    assert elapsed < budget + 5 * PAIR_SECONDS
+    assert ranked == [f"chunk-{i}" for i in range(5)]
+    assert reranker.stats()["fallbacks"] == 1
+
+
+def test_full_batches_without_a_deadline():
+    model = SlowCrossEncoder()
+    reranker = Reranker(model, batch_size=16)
+
+    ranked = reranker.rerank("question", candidates(40), top_k=3)
+
+    assert model.batches == [16, 16, 8]
+    assert ranked == ["chunk-39", "chunk-38", "chunk-37"]
+    assert reranker.stats()["reranked"] == 1
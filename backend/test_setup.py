@@ -72,7 +72,7 @@ def test_database():
     """Test database initialization"""
     print("\nTesting database...")
     try:
-        from db import collection, get_collection_stats
+        from db import get_collection_stats
         stats = get_collection_stats()
         print(f"  - Collection: {stats['name']}")
         print(f"  - Document count: {stats['document_count']}")
@@ -0,0 +1,163 @@
+"""Tests for streaming, content-addressed PDF uploads"""
+import time
+import hashlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import main
+from uploads import HashingWriter, UploadError, receive_pdf, release_upload, remove_upload, stored_path
+
+BOUNDARY = "test-boundary"
+MAX_BYTES = 64 * 1024
+
+
+def multipart(content: bytes, filename: str = "doc.pdf") -> bytes:
+    head = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    return head + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    return tmp_path / "uploads"
+
+
+@pytest.fixture
+def client(upload_dir):
+    async def upload(request):
+        try:
+            stored = await receive_pdf(request, upload_dir, MAX_BYTES, {".pdf"})
+        except UploadError as e:
+            return JSONResponse({"detail": str(e)}, status_code=e.status_code)
+        release_upload(stored.path)
+        return JSONResponse({
+            "filename": stored.filename,
+            "path": str(stored.path),
+            "file_hash": stored.file_hash,
+            "existed": stored.existed,
+        })
+
+    return TestClient(Starlette(routes=[Route("/upload", upload, methods=["POST"])]))
+
+
+def post(client: TestClient, body, **headers):
+    return client.post(
+        "/upload",
+        content=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", **headers}
+    )
+
+
+def leftover_parts(upload_dir) -> list:
+    return list((upload_dir / "tmp").glob("*.part")) if (upload_dir / "tmp").exists() else []
+
+
+def test_identical_uploads_share_one_stored_file(client, upload_dir, make_pdf):
+    content = make_pdf(2).read_bytes()
+
+    first = post(client, multipart(content, "report.pdf")).json()
+    second = post(client, multipart(content, "copy of report.pdf")).json()
+
+    file_hash = hashlib.sha256(content).hexdigest()
+    assert first["file_hash"] == second["file_hash"] == file_hash
+    assert first["path"] == second["path"] == str(stored_path(upload_dir, file_hash))
+    assert (first["existed"], second["existed"]) == (False, True)
+    assert second["filename"] == "copy of report.pdf"
+    assert stored_path(upload_dir, file_hash).read_bytes() == content
+    assert not leftover_parts(upload_dir)
+
+
+def test_declared_oversized_body_is_rejected_up_front(client, upload_dir):
+    response = post(client, multipart(b"%PDF-" + b"x" * (2 * MAX_BYTES)))
+
+    assert response.status_code == 413
+    assert not (upload_dir / "tmp").exists()
+
+
+def test_oversized_stream_is_rejected_and_cleaned_up(client, upload_dir):
+    body = multipart(b"%PDF-" + b"x" * (2 * MAX_BYTES))
+    # A chunked body has no Content-Length, so the limit is enforced while streaming
+    response = post(client, (body[i:i + 4096] for i in range(0, len(body), 4096)))
+
+    assert response.status_code == 413
+    assert (upload_dir / "tmp").exists()
+    assert not leftover_parts(upload_dir)
+
+
+@pytest.mark.parametrize("content", [b"not a pdf", b"<html>" + b"x" * 4096])
+def test_files_without_pdf_magic_are_rejected(client, upload_dir, content):
+    response = post(client, multipart(content))
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File is not a PDF"
+    assert not leftover_parts(upload_dir)
+
+
+def test_wrong_extension_is_rejected(client):
+    response = post(client, multipart(b"%PDF-1.4", "notes.txt"))
+
+    assert response.status_code == 400
+    assert "Invalid file type" in response.json()["detail"]
+
+
+def test_writer_discard_removes_the_partial_file(upload_dir):
+    writer = HashingWriter(upload_dir, max_bytes=10)
+    with pytest.raises(UploadError) as error:
+        writer.write([b"%PDF-1.4", b"more than ten bytes"])
+    assert error.value.status_code == 413
+    assert leftover_parts(upload_dir)
+
+    writer.discard()
+    assert not leftover_parts(upload_dir)
+
+
+def test_held_uploads_are_not_removed(upload_dir):
+    writer = HashingWriter(upload_dir, max_bytes=MAX_BYTES)
+    writer.write([b"%PDF-1.4 held"])
+    path, _, _ = writer.commit()
+
+    assert not remove_upload(path, in_use=lambda: False)
+    release_upload(path)
+    assert not remove_upload(path, in_use=lambda: True)
+    assert remove_upload(path, in_use=lambda: False)
+    assert not path.exists()
+
+
+def test_stored_uploads_go_when_no_document_uses_them(embedding_model, make_pdf):
+    client = TestClient(main.app)
+    headers = {"X-Tenant-ID": "upload-cleanup"}
+    upload_dir = main.upload_dir("upload-cleanup")
+
+    def index(content: bytes, filename: str = "doc.pdf") -> str:
+        response = client.post("/upload", files={"file": (filename, content, "application/pdf")}, headers=headers)
+        job_id = response.json()["job_id"]
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] == "completed":
+                break
+            time.sleep(0.05)
+        assert job["status"] == "completed"
+        return hashlib.sha256(content).hexdigest()
+
+    first = index(make_pdf(2, name="v1.pdf", seed=6).read_bytes())
+    second = index(make_pdf(3, name="v2.pdf", seed=7).read_bytes())
+    other = index(make_pdf(2, name="other.pdf", seed=8).read_bytes(), "other.pdf")
+
+    # The second version of doc.pdf superseded the first
+    assert not stored_path(upload_dir, first).exists()
+    assert stored_path(upload_dir, second).exists()
+
+    documents = {document["filename"]: document["id"] for document in client.get("/documents", headers=headers).json()}
+    assert client.delete(f"/documents/{documents['doc.pdf']}", headers=headers).status_code == 200
+    assert not stored_path(upload_dir, second).exists()
+    assert stored_path(upload_dir, other).exists()
+
+    assert client.delete("/collection", headers=headers).status_code == 200
+    assert not stored_path(upload_dir, other).exists()
@@ -0,0 +1,77 @@
+"""Tests for PDF extraction and text chunking"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import utils
+from metrics import TimedIterator
+from sample_documents import make_document, expected_pages
+
+
+class RecordingPool(ThreadPoolExecutor):
+    """Thread pool standing in for the extraction processes, recording submissions"""
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.futures = []
+
+    def submit(self, *args, **kwargs):
+        future = super().submit(*args, **kwargs)
+        self.futures.append(future)
+        return future
+
+
+def test_parallel_extraction_matches_serial(make_pdf):
+    path = str(make_pdf(24))
+    try:
+        parallel = list(utils._iter_pages_parallel(path, 24, workers=2))
+    finally:
+        utils.shutdown_extraction_pool()
+
+    assert parallel == list(utils.iter_pages(path, workers=1))
+
+
+def test_parallel_extraction_submits_a_bounded_window(make_pdf, monkeypatch):
+    path = str(make_pdf(40))
+    pool = RecordingPool()
+    monkeypatch.setattr(utils, "get_extraction_pool", lambda workers: pool)
+
+    # 2 workers split 40 pages into 8 shards, at most 4 of which are submitted ahead
+    pages = utils._iter_pages_parallel(path, 40, workers=2)
+    next(pages)
+    assert len(pool.futures) == 4
+
+    pages.close()
+    assert len(pool.futures) == 4
+
+    assert len(list(utils._iter_pages_parallel(path, 40, workers=2))) == 40
+    assert len(pool.futures) == 12
+    pool.shutdown()
+
+
+def test_timed_iterator_close_closes_the_generator(make_pdf):
+    pages = utils.iter_pages(str(make_pdf(3)))
+    timed = TimedIterator(pages, None)
+    next(timed)
+    timed.close()
+
+    assert pages.gi_frame is None
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(1000, 200), (300, 50), (120, 0)])
+def test_streaming_chunker_matches_whole_text_chunker(chunk_size, chunk_overlap):
+    page_map = make_document(120)
+    text = "\n\n".join(page_text for _, page_text in page_map)
+
+    streamed = list(utils.iter_chunks_with_pages(iter(page_map), chunk_size, chunk_overlap))
+
+    assert streamed == utils.chunk_text_with_pages(text, page_map, chunk_size, chunk_overlap)
+
+
+def test_repeated_pages_are_attributed_to_the_right_pages():
+    page_map = make_document(60)
+    text = "\n\n".join(page_text for _, page_text in page_map)
+
+    chunks = utils.chunk_text_with_pages(text, page_map)
+
+    assert [pages for _, pages in chunks] == expected_pages(text, page_map, 1000, 200)
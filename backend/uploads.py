@@ -0,0 +1,296 @@
+"""
+Streaming PDF uploads stored under content-addressed paths
+
+The multipart request body is parsed as it arrives: file bytes go straight to
+a temporary file while being counted and hashed, so the size limit is
+enforced before the rest of the body is read, and no second pass is needed
+to fingerprint the file. Completed uploads are moved to a path derived from
+their SHA-256, so identical files share one copy and same-named files never
+overwrite each other. A stored file is held from the moment it is committed
+until the request that uploaded it releases it, so it can't be removed while
+being handed over to an ingestion job.
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional
+
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# PDFs must have this marker within their first kilobyte
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+
+# Allowance for multipart boundaries and part headers when checking Content-Length
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Form fields other than the file are small; cap them so they can't be used to stream unbounded data
+MAX_FIELD_SIZE = 64 * 1024
+
+
+# Stored files whose upload request hasn't released them yet, with the number of such requests
+_held: Counter = Counter()
+_held_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """Raised for uploads that are rejected, with the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StoredUpload(NamedTuple):
+    """A completed upload"""
+    filename: str  # Original filename, without any directory components
+    path: Path  # Content-addressed location on disk
+    file_hash: str  # SHA-256 of the contents
+    size: int
+    existed: bool  # Whether identical contents were already stored
+
+
+def stored_path(upload_dir: Path, file_hash: str) -> Path:
+    """
+    Content-addressed location of an upload
+
+    Files are fanned out over 256 subdirectories by the first byte of the hash
+    so no single directory grows too large.
+
+    Args:
+        upload_dir: Upload root directory
+        file_hash: SHA-256 hex digest of the file
+
+    Returns:
+        Path of the stored file
+    """
+    return upload_dir / file_hash[:2] / f"{file_hash}.pdf"
+
+
+class HashingWriter:
+    """
+    Writes an upload to a temporary file, counting and hashing bytes as they arrive
+
+    Args:
+        upload_dir: Upload root directory; the temporary file is created in
+            its ``tmp`` subdirectory so the final move stays on one filesystem
+        max_bytes: Largest allowed file size
+    """
+
+    def __init__(self, upload_dir: Path, max_bytes: int):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head = b""
+        tmp_dir = upload_dir / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, blocks: List[bytes]):
+        """
+        Append blocks of file data
+
+        Raises:
+            UploadError: If the file exceeds ``max_bytes`` (413) or doesn't start like a PDF
+        """
+        for block in blocks:
+            self.size += len(block)
+            if self.size > self.max_bytes:
+                raise UploadError(f"File too large. Max size: {self.max_bytes / 1024 / 1024}MB", status_code=413)
+
+            if len(self._head) < PDF_MAGIC_WINDOW:
+                self._head += block[:PDF_MAGIC_WINDOW - len(self._head)]
+                if len(self._head) >= PDF_MAGIC_WINDOW:
+                    self._check_magic()
+
+            self._digest.update(block)
+            self._file.write(block)
+
+    def _check_magic(self):
+        if PDF_MAGIC not in self._head:
+            raise UploadError("File is not a PDF")
+
+    def commit(self) -> tuple:
+        """
+        Move the completed file to its content-addressed path
+
+        Returns:
+            Tuple of (stored path, SHA-256 hex digest, whether the contents were already stored)
+
+        Raises:
+            UploadError: If the file is empty or not a PDF
+        """
+        self._file.close()
+        if self.size == 0:
+            raise UploadError("Empty file")
+        self._check_magic()
+
+        file_hash = self._digest.hexdigest()
+        path = stored_path(self.upload_dir, file_hash)
+        with _held_lock:
+            _held[path] += 1
+            if path.exists():
+                self._tmp_path.unlink()
+                return path, file_hash, True
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._tmp_path, path)
+            return path, file_hash, False
+
+    def discard(self):
+        """Close and delete the temporary file"""
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def release_upload(path: Path):
+    """Drop the hold an upload request has on its stored file"""
+    with _held_lock:
+        _held[path] -= 1
+        if _held[path] <= 0:
+            del _held[path]
+
+
+def remove_upload(path: Path, in_use: Callable[[], bool]) -> bool:
+    """
+    Delete a stored file that nothing references any more
+
+    The check runs under the same lock as committing an upload, so an
+    identical upload arriving meanwhile either keeps the file or stores it
+    again.
+
+    Args:
+        path: Stored file
+        in_use: Returns whether anything besides upload requests still needs the file
+
+    Returns:
+        Whether the file was deleted
+    """
+    with _held_lock:
+        if _held[path] or in_use() or not path.exists():
+            return False
+        path.unlink()
+    logger.info(f"Removed stored upload {path.name}")
+    return True
+
+
+def _disposition(headers: dict) -> tuple:
+    """Field name and filename from a part's Content-Disposition header"""
+    _, options = parse_options_header(headers.get(b"content-disposition"))
+    name = options.get(b"name", b"").decode("latin-1")
+    filename = options.get(b"filename")
+    return name, filename.decode("utf-8", errors="replace") if filename is not None else None
+
+
+async def receive_pdf(
+    request: Request,
+    upload_dir: Path,
+    max_bytes: int,
+    allowed_extensions: set,
+    field_name: str = "file"
+) -> StoredUpload:
+    """
+    Stream a multipart PDF upload to disk
+
+    Args:
+        request: Incoming request with a multipart/form-data body
+        upload_dir: Upload root directory
+        max_bytes: Largest allowed file size
+        allowed_extensions: Accepted filename extensions, e.g. {".pdf"}
+        field_name: Form field carrying the file
+
+    Returns:
+        The stored upload, held until passed to ``release_upload``
+
+    Raises:
+        UploadError: If the request or file is rejected
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data upload with a 'file' field")
+
+    # Reject oversized bodies up front when the client declares their size
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadError(f"File too large. Max size: {max_bytes / 1024 / 1024}MB", status_code=413)
+
+    # Callbacks only record events; they are acted on after each parser.write so errors propagate cleanly
+    events = []
+    headers = {}
+    header = {"field": b"", "value": b""}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": headers.clear,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("part", dict(headers))),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    writer: Optional[HashingWriter] = None
+    filename: Optional[str] = None
+    in_file = False
+    field_bytes = 0
+    completed = False
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            blocks = []
+            for kind, value in events:
+                if kind == "part":
+                    name, part_filename = _disposition(value)
+                    in_file = name == field_name and part_filename is not None and writer is None
+                    if in_file:
+                        filename = Path(part_filename.replace("\\", "/")).name
+                        if Path(filename).suffix.lower() not in allowed_extensions:
+                            raise UploadError(f"Invalid file type. Allowed: {allowed_extensions}")
+                        writer = HashingWriter(upload_dir, max_bytes)
+                elif kind == "data":
+                    if in_file:
+                        blocks.append(value)
+                    else:
+                        field_bytes += len(value)
+                        if field_bytes > MAX_FIELD_SIZE:
+                            raise UploadError("Form fields too large", status_code=413)
+                else:
+                    in_file = False
+            events.clear()
+
+            if blocks:
+                await asyncio.to_thread(writer.write, blocks)
+        parser.finalize()
+
+        if writer is None:
+            raise UploadError(f"No '{field_name}' file in the upload")
+        path, file_hash, existed = await asyncio.to_thread(writer.commit)
+        completed = True
+        return StoredUpload(filename, path, file_hash, writer.size, existed)
+
+    finally:
+        if writer is not None and not completed:
+            writer.discard()
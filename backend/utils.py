@@ -1,7 +1,17 @@
 """Utility functions for text extraction and processing"""
+import os
 import re
+import math
+import queue
+import hashlib
 import logging
-from typing import List
+import threading
+from bisect import bisect_left
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Iterable, Iterator, Optional, Callable
 from pathlib import Path
 
 from PyPDF2 import PdfReader
@@ -9,41 +19,197 @@ from PyPDF2 import PdfReader
 logger = logging.getLogger(__name__)
 
 
-def extract_text(file_path: str) -> tuple:
+def _extract_pages(reader: PdfReader, start: int, end: int) -> List[tuple]:
     """
-    Extract text from a PDF file with page numbers
+    Extract cleaned text from a range of PDF pages
+    
+    Pages that fail to extract are logged and skipped.
     
     Args:
-        file_path: Path to the PDF file
+        reader: Open PdfReader
+        start: Index of the first page (0-based, inclusive)
+        end: Index of the last page (0-based, exclusive)
         
     Returns:
-        Tuple of (full_text, page_map) where page_map is list of (page_num, text) tuples
+        List of (page_num, page_text) tuples with 1-based page numbers
     """
-    try:
-        if not Path(file_path).exists():
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        reader = PdfReader(file_path)
+    page_map = []
+    
+    for index in range(start, end):
+        page_num = index + 1
+        try:
+            page_text = reader.pages[index].extract_text()
+            if page_text:
+                page_map.append((page_num, clean_text(page_text)))
+        except Exception as e:
+            logger.warning(f"Failed to extract text from page {page_num}: {e}")
+            continue
+    
+    return page_map
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[tuple]:
+    """
+    Worker-process entry point: open the PDF and extract one page range
+    """
+    return _extract_pages(PdfReader(file_path), start, end)
+
+
+# Shared by every ingestion job so worker start-up is paid once, not per PDF
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_lock = threading.Lock()
+
+
+def get_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Get the long-lived extraction process pool, creating it on first use
+    
+    Workers are started with forkserver (or spawn where it isn't available)
+    rather than fork: forking a server that runs embedding, Chroma and HTTP
+    threads can copy held locks into the child and deadlock it.
+    
+    Args:
+        workers: Number of worker processes, used when the pool is created
         
-        if len(reader.pages) == 0:
-            raise ValueError("PDF has no pages")
+    Returns:
+        The shared process pool
+    """
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method)
+            )
+        return _extraction_pool
+
+
+def shutdown_extraction_pool(wait: bool = True):
+    """Stop the extraction worker processes, if they were started"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        pool, _extraction_pool = _extraction_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _iter_pages_parallel(file_path: str, page_count: int, workers: int) -> Iterator[tuple]:
+    """
+    Extract pages across the shared process pool, yielding them in page order
+    
+    Only a bounded window of shards is submitted ahead of the consumer, so a
+    slow consumer doesn't make the pool extract the whole document into
+    memory, and closing the generator cancels the shards not yet started.
+    
+    Args:
+        file_path: Path to the PDF file
+        page_count: Number of pages in the PDF
+        workers: Number of worker processes
         
-        logger.info(f"Extracting text from {len(reader.pages)} pages")
+    Yields:
+        (page_num, page_text) tuples in page order
+    """
+    # Several small shards per worker so slow pages don't leave cores idle
+    shard_size = max(1, math.ceil(page_count / (workers * 4)))
+    ranges = deque((start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size))
+    window = workers * 2
+    
+    executor = get_extraction_pool(workers)
+    pending = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < window:
+                start, end = ranges.popleft()
+                pending.append(executor.submit(_extract_page_range, file_path, start, end))
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool for good; the next job starts a fresh one
+        shutdown_extraction_pool(wait=False)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def iter_pages(file_path: str, workers: int = 1, parallel_min_pages: int = 200) -> Iterator[tuple]:
+    """
+    Stream cleaned page text from a PDF file
+    
+    Large PDFs are split into page ranges and extracted in parallel across
+    worker processes, since PyPDF2 extraction is CPU-bound pure Python.
+    Pages are yielded in order as soon as their shard is done.
+    
+    Parallelism only pays off with spare cores: serial extraction runs at
+    roughly 2ms per page, so a small PDF finishes before shard dispatch and
+    result pickling are amortized, and on a single core the pool is slower
+    at every size (400 pages: 0.8s serial vs 1.3s with 2 workers and 1.7s
+    with 4). Workers are therefore capped at the CPUs available to the
+    process, and only PDFs of at least ``parallel_min_pages`` are split.
+    
+    Args:
+        file_path: Path to the PDF file
+        workers: Number of extraction processes (1 extracts in-process)
+        parallel_min_pages: Minimum page count before extraction is parallelized
         
-        text_parts = []
-        page_map = []  # Track which text came from which page
+    Yields:
+        (page_num, page_text) tuples for every page with text
+    """
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    
+    if page_count == 0:
+        raise ValueError("PDF has no pages")
+    
+    workers = min(workers, _available_cpus())
+    if workers > 1 and page_count >= parallel_min_pages:
+        logger.info(f"Extracting text from {page_count} pages with {workers} processes")
+        yield from _iter_pages_parallel(file_path, page_count, workers)
+    else:
+        logger.info(f"Extracting text from {page_count} pages")
+        for index in range(page_count):
+            yield from _extract_pages(reader, index, index + 1)
+
+
+def get_page_count(file_path: str) -> int:
+    """
+    Count the pages of a PDF file without extracting any text
+
+    Args:
+        file_path: Path to the PDF file
+
+    Returns:
+        Number of pages
+    """
+    return len(PdfReader(file_path).pages)
+
+
+def extract_text(file_path: str, workers: int = 1, parallel_min_pages: int = 200) -> tuple:
+    """
+    Extract text from a PDF file with page numbers
+    
+    Args:
+        file_path: Path to the PDF file
+        workers: Number of extraction processes (1 extracts in-process)
+        parallel_min_pages: Minimum page count before extraction is parallelized
         
-        for page_num, page in enumerate(reader.pages, 1):
-            try:
-                page_text = page.extract_text()
-                if page_text:
-                    cleaned_page_text = clean_text(page_text)
-                    text_parts.append(cleaned_page_text)
-                    page_map.append((page_num, cleaned_page_text))
-            except Exception as e:
-                logger.warning(f"Failed to extract text from page {page_num}: {e}")
-                continue
+    Returns:
+        Tuple of (full_text, page_map) where page_map is list of (page_num, text) tuples
+    """
+    try:
+        page_map = list(iter_pages(file_path, workers, parallel_min_pages))
         
+        text_parts = [page_text for _, page_text in page_map]
         full_text = "\n\n".join(text_parts)
         
         logger.info(f"Extracted {len(full_text)} characters from {len(page_map)} pages")
@@ -55,6 +221,37 @@ def extract_text(file_path: str) -> tuple:
         raise
 
 
+def compute_file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 hash of a file's contents
+    
+    Args:
+        file_path: Path to the file
+        block_size: Number of bytes read per iteration
+        
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compute_text_hash(text: str) -> str:
+    """
+    Compute the SHA-256 hash of a text string
+    
+    Args:
+        text: Text to hash
+        
+    Returns:
+        Hex digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 def clean_text(text: str) -> str:
     """
     Clean and normalize extracted text
@@ -77,58 +274,59 @@ def clean_text(text: str) -> str:
     return text
 
 
-def chunk_text_with_pages(text: str, page_map: List[tuple], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[tuple]:
+def _find_chunk_end(text: str, start: int, chunk_size: int) -> int:
     """
-    Chunk text while preserving page number information
+    Find where the chunk starting at `start` should end
+    
+    Prefers a sentence or paragraph boundary in the last 30% of the chunk.
     
     Args:
-        text: Full text to chunk
-        page_map: List of (page_num, page_text) tuples
-        chunk_size: Target size for each chunk
-        chunk_overlap: Overlap between chunks
+        text: Text being chunked
+        start: Offset of the chunk start
+        chunk_size: Maximum size of each chunk
         
     Returns:
-        List of (chunk_text, page_numbers) tuples
+        Offset (exclusive) of the chunk end
     """
-    chunks_with_pages = []
+    end = start + chunk_size
     
-    # Build position map for page numbers
-    position = 0
-    page_positions = []  # (start_pos, end_pos, page_num)
+    # If not the last chunk, try to find a good break point
+    if end < len(text):
+        # Look for sentence end or paragraph break
+        chunk_text = text[start:end]
+        
+        # Try to break at sentence boundaries
+        last_period = chunk_text.rfind('. ')
+        last_newline = chunk_text.rfind('\n')
+        last_question = chunk_text.rfind('? ')
+        last_exclamation = chunk_text.rfind('! ')
+        
+        break_point = max(last_period, last_newline, last_question, last_exclamation)
+        
+        if break_point > chunk_size * 0.7:  # Only use break point if it's not too early
+            end = start + break_point + 1
     
-    for page_num, page_text in page_map:
-        start = position
-        end = position + len(page_text)
-        page_positions.append((start, end, page_num))
-        position = end + 2  # Account for \n\n separator
-    
-    # Chunk the text
-    chunks = chunk_text(text, chunk_size, chunk_overlap)
-    
-    # Map chunks to page numbers
-    current_pos = 0
-    for chunk in chunks:
-        chunk_start = text.find(chunk, current_pos)
-        if chunk_start == -1:
-            chunk_start = current_pos
-        chunk_end = chunk_start + len(chunk)
-        
-        # Find which pages this chunk overlaps with
-        chunk_pages = set()
-        for start, end, page_num in page_positions:
-            # Check if chunk overlaps with this page
-            if not (chunk_end < start or chunk_start > end):
-                chunk_pages.add(page_num)
-        
-        chunks_with_pages.append((chunk, sorted(list(chunk_pages))))
-        current_pos = chunk_start + 1
+    return end
+
+
+def _strip_span(text: str, start: int, end: int) -> Optional[tuple]:
+    """
+    Narrow a span to exclude leading and trailing whitespace
     
-    return chunks_with_pages
+    Returns:
+        (start, end) of the stripped span, or None if it is all whitespace
+    """
+    end = min(end, len(text))
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
 
 
-def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+def chunk_spans(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[tuple]:
     """
-    Split text into overlapping chunks for better context preservation
+    Compute the exact offsets of overlapping chunks
     
     Args:
         text: Text to chunk
@@ -136,7 +334,7 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
         chunk_overlap: Number of characters to overlap between chunks
         
     Returns:
-        List of text chunks
+        List of (start, end) offsets of each whitespace-stripped chunk
     """
     if not text:
         return []
@@ -144,37 +342,318 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
     if chunk_size <= chunk_overlap:
         raise ValueError("chunk_size must be greater than chunk_overlap")
     
-    chunks = []
+    spans = []
     start = 0
     text_length = len(text)
     
     while start < text_length:
-        end = start + chunk_size
-        
-        # If not the last chunk, try to find a good break point
-        if end < text_length:
-            # Look for sentence end or paragraph break
-            chunk_text = text[start:end]
-            
-            # Try to break at sentence boundaries
-            last_period = chunk_text.rfind('. ')
-            last_newline = chunk_text.rfind('\n')
-            last_question = chunk_text.rfind('? ')
-            last_exclamation = chunk_text.rfind('! ')
-            
-            break_point = max(last_period, last_newline, last_question, last_exclamation)
-            
-            if break_point > chunk_size * 0.7:  # Only use break point if it's not too early
-                end = start + break_point + 1
-        
-        chunk = text[start:end].strip()
-        
-        if chunk:
-            chunks.append(chunk)
+        end = _find_chunk_end(text, start, chunk_size)
+        
+        span = _strip_span(text, start, end)
+        
+        if span:
+            spans.append(span)
         
         # Move start position with overlap
         start = end - chunk_overlap if end < text_length else text_length
     
-    logger.info(f"Created {len(chunks)} chunks from text of length {text_length}")
+    logger.info(f"Created {len(spans)} chunks from text of length {text_length}")
+    
+    return spans
+
+
+def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    """
+    Split text into overlapping chunks for better context preservation
+    
+    Args:
+        text: Text to chunk
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Number of characters to overlap between chunks
+        
+    Returns:
+        List of text chunks
+    """
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, chunk_overlap)]
+
+
+def chunk_text_with_pages(text: str, page_map: List[tuple], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[tuple]:
+    """
+    Chunk text while preserving page number information
+    
+    Chunks carry exact offsets into the text, so page attribution is a
+    binary search over page boundaries rather than a text search, which is
+    linear overall and correct even when the same text repeats.
+    
+    Args:
+        text: Full text to chunk (pages joined with blank lines)
+        page_map: List of (page_num, page_text) tuples
+        chunk_size: Target size for each chunk
+        chunk_overlap: Overlap between chunks
+        
+    Returns:
+        List of (chunk_text, page_numbers) tuples
+    """
+    # Build position map for page numbers
+    page_starts = []
+    page_ends = []
+    page_nums = []
+    position = 0
+    
+    for page_num, page_text in page_map:
+        page_starts.append(position)
+        page_ends.append(position + len(page_text))
+        page_nums.append(page_num)
+        position += len(page_text) + 2  # Account for \n\n separator
+    
+    chunks_with_pages = []
+    for chunk_start, chunk_end in chunk_spans(text, chunk_size, chunk_overlap):
+        chunk_pages = []
+        
+        # First page that ends at or after the chunk start, then every page starting before its end
+        index = bisect_left(page_ends, chunk_start)
+        while index < len(page_starts) and page_starts[index] <= chunk_end:
+            chunk_pages.append(page_nums[index])
+            index += 1
+        
+        chunks_with_pages.append((text[chunk_start:chunk_end], chunk_pages))
+    
+    return chunks_with_pages
+
+
+def iter_chunks_with_pages(pages: Iterable[tuple], chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[tuple]:
+    """
+    Incrementally chunk a stream of pages while tracking page numbers
+    
+    Produces the same chunks as chunk_text over the pages joined with blank
+    lines, but only keeps about one chunk of text in memory, so chunks are
+    available while later pages are still being extracted.
+    
+    Args:
+        pages: Iterable of (page_num, page_text) tuples in page order
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Number of characters to overlap between chunks
+        
+    Yields:
+        (chunk_text, page_numbers) tuples
+    """
+    if chunk_size <= chunk_overlap:
+        raise ValueError("chunk_size must be greater than chunk_overlap")
+    
+    buffer = ""  # Text from absolute offset `base` onwards
+    base = 0
+    start = 0  # Absolute offset of the next chunk
+    text_length = 0  # Absolute length of the text seen so far
+    page_positions = deque()  # (start_pos, end_pos, page_num) of pages still in the window
+    
+    def make_chunk(chunk_start: int, chunk_end: int) -> Optional[tuple]:
+        span = _strip_span(buffer, chunk_start - base, chunk_end - base)
+        if not span:
+            return None
+        
+        # Exact offsets of the stripped chunk
+        chunk_start, chunk_end = span[0] + base, span[1] + base
+        
+        chunk_pages = []
+        for page_start, page_end, page_num in page_positions:
+            if page_start > chunk_end:
+                break
+            if page_end >= chunk_start:
+                chunk_pages.append(page_num)
+        return buffer[span[0]:span[1]], chunk_pages
+    
+    for page_num, page_text in pages:
+        if text_length:
+            buffer += "\n\n"
+            text_length += 2
+        page_positions.append((text_length, text_length + len(page_text), page_num))
+        buffer += page_text
+        text_length += len(page_text)
+        
+        # Emit every chunk whose end can no longer change
+        while text_length - start > chunk_size:
+            end = _find_chunk_end(buffer, start - base, chunk_size) + base
+            item = make_chunk(start, end)
+            if item:
+                yield item
+            start = end - chunk_overlap
+        
+        # Drop text and pages that no later chunk can reach
+        while page_positions and page_positions[0][1] < start:
+            page_positions.popleft()
+        buffer = buffer[start - base:]
+        base = start
+    
+    # The remaining text ends the document
+    while start < text_length:
+        end = _find_chunk_end(buffer, start - base, chunk_size) + base
+        item = make_chunk(start, end)
+        if item:
+            yield item
+        start = end - chunk_overlap if end < text_length else text_length
+
+
+def _find_token_chunk_end(text: str, base: int, offsets: List[tuple], start: int, chunk_tokens: int) -> int:
+    """
+    Find the token index where the chunk starting at token `start` should end
+    
+    Prefers to end on a sentence boundary or line break in the last 30% of the chunk.
+    
+    Args:
+        text: Text buffer the offsets point into
+        base: Absolute offset of text[0]
+        offsets: Absolute (start, end) character offsets of each token
+        start: Index of the first token of the chunk
+        chunk_tokens: Maximum number of tokens per chunk
+        
+    Returns:
+        Index (exclusive) of the chunk's last token
+    """
+    end = start + chunk_tokens
+    if end >= len(offsets):
+        return len(offsets)
+    
+    for index in range(end - 1, start + int(chunk_tokens * 0.7), -1):
+        token_end = offsets[index][1] - base
+        next_start = offsets[index + 1][0] - base
+        if text[token_end - 1] in ".?!" or "\n" in text[token_end:next_start]:
+            return index + 1
+    
+    return end
+
+
+def iter_token_chunks_with_pages(
+    pages: Iterable[tuple],
+    token_offsets: Callable[[str], List[tuple]],
+    chunk_tokens: int = 256,
+    chunk_overlap: int = 32
+) -> Iterator[tuple]:
+    """
+    Incrementally chunk a stream of pages by token count
+    
+    Chunks are sized with the embedding model's tokenizer so they neither
+    get truncated by the model nor waste padding in encode batches. Each page
+    is tokenized once; chunk text is sliced from the page text using the
+    tokenizer's character offsets.
+    
+    Args:
+        pages: Iterable of (page_num, page_text) tuples in page order
+        token_offsets: Callable returning the (start, end) character offsets of each token in a text
+        chunk_tokens: Maximum number of tokens per chunk
+        chunk_overlap: Number of tokens to overlap between chunks
+        
+    Yields:
+        (chunk_text, page_numbers) tuples
+    """
+    if chunk_tokens <= chunk_overlap:
+        raise ValueError("chunk_tokens must be greater than chunk_overlap")
+    
+    buffer = ""  # Text from absolute offset `base` onwards
+    base = 0
+    text_length = 0
+    offsets = []  # Absolute character offsets of tokens from index `token_base` onwards
+    token_base = 0
+    start = 0  # Absolute index of the next chunk's first token
+    page_positions = deque()  # (start_pos, end_pos, page_num) of pages still in the window
+    
+    def make_chunk(first: int, last: int) -> tuple:
+        chunk_start = offsets[first - token_base][0]
+        chunk_end = offsets[last - token_base - 1][1]
+        
+        chunk_pages = []
+        for page_start, page_end, page_num in page_positions:
+            if page_start > chunk_end:
+                break
+            if page_end >= chunk_start:
+                chunk_pages.append(page_num)
+        return buffer[chunk_start - base:chunk_end - base], chunk_pages
+    
+    def next_chunk(final: bool):
+        nonlocal start
+        while start < token_base + len(offsets) and (final or token_base + len(offsets) - start > chunk_tokens):
+            end = _find_token_chunk_end(buffer, base, offsets, start - token_base, chunk_tokens) + token_base
+            yield make_chunk(start, end)
+            start = max(end - chunk_overlap, start + 1) if end < token_base + len(offsets) else end
     
-    return chunks
+    for page_num, page_text in pages:
+        if text_length:
+            buffer += "\n\n"
+            text_length += 2
+        page_positions.append((text_length, text_length + len(page_text), page_num))
+        offsets.extend((text_length + token_start, text_length + token_end) for token_start, token_end in token_offsets(page_text))
+        buffer += page_text
+        text_length += len(page_text)
+        
+        yield from next_chunk(final=False)
+        
+        # Drop tokens, text and pages that no later chunk can reach
+        if start - token_base < len(offsets):
+            char_start = offsets[start - token_base][0]
+        else:
+            char_start = text_length
+        while page_positions and page_positions[0][1] < char_start:
+            page_positions.popleft()
+        offsets = offsets[start - token_base:]
+        token_base = start
+        buffer = buffer[char_start - base:]
+        base = char_start
+    
+    # The remaining tokens end the document
+    yield from next_chunk(final=True)
+
+
+def iter_in_background(iterable: Iterable, maxsize: int) -> Iterator:
+    """
+    Consume an iterable in a background thread through a bounded queue
+    
+    Lets a producer stage (e.g. extraction or embedding) run ahead of its
+    consumer by at most `maxsize` items. Exceptions raised by the producer
+    are re-raised in the consumer.
+    
+    Args:
+        iterable: Iterable to run in the background
+        maxsize: Maximum number of buffered items
+        
+    Yields:
+        Items of the iterable, in order
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+    done = object()
+    
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+    
+    thread = threading.Thread(target=produce, name="pipeline-stage", daemon=True)
+    thread.start()
+    
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
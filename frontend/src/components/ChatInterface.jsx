@@ -18,15 +18,32 @@ export default function ChatInterface({ disabled }) {
     setQuestion("");
     setLoading(true);
 
+    // Update the streaming assistant message (always the last one)
+    const updateAssistant = (update) => {
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        if (!last || last.role !== "assistant" || !last.streaming) {
+          return prev;
+        }
+        return [...prev.slice(0, -1), { ...last, ...update(last) }];
+      });
+    };
+
     try {
-      const data = await APIService.query(question);
-      const assistantMessage = {
-        role: "assistant",
-        content: data.answer,
-        sources: data.sources,
-      };
-      setMessages((prev) => [...prev, assistantMessage]);
+      await APIService.queryStream(question, 4, {
+        onSources: (sources) => {
+          setMessages((prev) => [
+            ...prev,
+            { role: "assistant", content: "", sources, streaming: true },
+          ]);
+        },
+        onToken: (token) => {
+          updateAssistant((last) => ({ content: last.content + token }));
+        },
+      });
+      updateAssistant(() => ({ streaming: false }));
     } catch (error) {
+      updateAssistant(() => ({ streaming: false }));
       const errorMessage = {
         role: "error",
         content: error.message || "Failed to get response. Please try again.",
@@ -70,7 +87,12 @@ export default function ChatInterface({ disabled }) {
                     : "bg-gray-100 dark:bg-gray-800 text-gray-900 dark:text-gray-100"
                 }`}
               >
-                <p className="text-sm whitespace-pre-wrap">{message.content}</p>
+                <p className="text-sm whitespace-pre-wrap">
+                  {message.content}
+                  {message.streaming && (
+                    <span className="inline-block w-2 h-4 ml-0.5 align-middle bg-gray-500 dark:bg-gray-400 animate-pulse" />
+                  )}
+                </p>
                 {message.sources && message.sources.length > 0 && (
                   <div className="mt-3 pt-3 border-t border-gray-300 dark:border-gray-600">
                     <p className="text-xs font-semibold mb-2 text-gray-700 dark:text-gray-300 flex items-center space-x-1">
@@ -106,7 +128,7 @@ export default function ChatInterface({ disabled }) {
             </div>
           ))
         )}
-        {loading && (
+        {loading && !messages[messages.length - 1]?.streaming && (
           <div className="flex justify-start">
             <div className="bg-gray-100 dark:bg-gray-800 rounded-lg p-4 flex items-center space-x-2">
               <Loader2 className="w-4 h-4 animate-spin text-gray-600 dark:text-gray-400" />
@@ -18,6 +18,7 @@ export default function FileUpload({ onUploadSuccess }) {
   const [dragActive, setDragActive] = useState(false);
   const [uploadProgress, setUploadProgress] = useState(0);
   const [uploadStage, setUploadStage] = useState(""); // "uploading", "processing", "indexing"
+  const [jobProgress, setJobProgress] = useState(null);
   const fileInputRef = useRef(null);
 
   const handleDrag = (e) => {
@@ -57,6 +58,7 @@ export default function FileUpload({ onUploadSuccess }) {
     setUploadStatus(null);
     setUploadProgress(0);
     setUploadStage("uploading");
+    setJobProgress(null);
 
     try {
       // Create XMLHttpRequest for upload progress tracking
@@ -111,8 +113,14 @@ export default function FileUpload({ onUploadSuccess }) {
         xhr.send(formData);
       });
 
+      const upload = await uploadPromise;
+
+      // Indexing runs in the background; poll the job until it finishes
+      // (uploads whose contents are already indexed come back without a job)
       setUploadStage("indexing");
-      const data = await uploadPromise;
+      const data = upload.job_id
+        ? await APIService.waitForJob(upload.job_id, setJobProgress)
+        : upload;
 
       setUploadStatus({
         type: "success",
@@ -129,6 +137,7 @@ export default function FileUpload({ onUploadSuccess }) {
         setUploadStatus(null);
         setUploadProgress(0);
         setUploadStage("");
+        setJobProgress(null);
       }, 3000);
     } catch (error) {
       setUploadStatus({
@@ -263,7 +272,13 @@ export default function FileUpload({ onUploadSuccess }) {
                   {uploadStage === "processing" &&
                     "Extracting text from PDF..."}
                   {uploadStage === "indexing" &&
-                    "Creating embeddings and indexing..."}
+                    (jobProgress?.total_chunks
+                      ? `${jobProgress.phase}: ${jobProgress.chunks_processed}/${jobProgress.total_chunks} chunks`
+                      : jobProgress?.chunks_processed
+                      ? `${jobProgress.phase}: ${jobProgress.chunks_processed} chunks`
+                      : jobProgress?.phase
+                      ? `${jobProgress.phase}...`
+                      : "Creating embeddings and indexing...")}
                 </p>
               </div>
             )}
@@ -78,16 +78,74 @@ class APIService {
   }
 
   /**
-   * Query the RAG system
+   * Get the status of an ingestion job
    */
-  static async query(question, topK = 4) {
+  static async getJob(jobId) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+      return await this.handleResponse(response);
+    } catch (error) {
+      this.handleNetworkError(error);
+    }
+  }
+
+  /**
+   * Poll an ingestion job until it completes or fails
+   */
+  static async waitForJob(jobId, onProgress, intervalMs = 1000) {
+    while (true) {
+      const job = await this.getJob(jobId);
+      if (onProgress) {
+        onProgress(job);
+      }
+      if (job.status === "completed") {
+        return job;
+      }
+      if (job.status === "failed") {
+        throw new APIError(job.error || "Indexing failed", 500, job);
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  }
+
+  /**
+   * Query the RAG system, optionally restricted to some document ids
+   */
+  static async query(question, topK = 4, documentIds = null) {
     try {
       const response = await fetch(`${API_BASE_URL}/query`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ question, top_k: topK }),
+        body: JSON.stringify({
+          question,
+          top_k: topK,
+          document_ids: documentIds,
+        }),
+      });
+
+      return await this.handleResponse(response);
+    } catch (error) {
+      this.handleNetworkError(error);
+    }
+  }
+
+  /**
+   * Answer several questions in one request; results are returned in order
+   */
+  static async queryBatch(questions, topK = 4, documentIds = null) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/query/batch`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          questions,
+          top_k: topK,
+          document_ids: documentIds,
+        }),
       });
 
       return await this.handleResponse(response);
@@ -96,6 +154,78 @@ class APIService {
     }
   }
 
+  /**
+   * Query the RAG system and stream the answer as Server-Sent Events
+   *
+   * Calls onSources(sources) once, then onToken(text) for every generated token.
+   * Pass documentIds to search only those documents.
+   */
+  static async queryStream(
+    question,
+    topK = 4,
+    { onSources, onToken, documentIds = null } = {}
+  ) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/query/stream`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Accept: "text/event-stream",
+        },
+        body: JSON.stringify({
+          question,
+          top_k: topK,
+          document_ids: documentIds,
+        }),
+      });
+
+      if (!response.ok) {
+        await this.handleResponse(response);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let event = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) {
+              event = line.slice(6).trim();
+            } else if (line.startsWith("data:")) {
+              data += line.slice(5).trim();
+            }
+          }
+          const payload = data ? JSON.parse(data) : {};
+
+          if (event === "sources" && onSources) {
+            onSources(payload.sources);
+          } else if (event === "token" && onToken) {
+            onToken(payload.content);
+          } else if (event === "error") {
+            throw new APIError(payload.detail || "Query failed", 500, payload);
+          } else if (event === "done") {
+            return;
+          }
+        }
+      }
+    } catch (error) {
+      this.handleNetworkError(error);
+    }
+  }
+
   /**
    * Get health status
    */
@@ -120,6 +250,33 @@ class APIService {
     }
   }
 
+  /**
+   * List indexed documents
+   */
+  static async listDocuments() {
+    try {
+      const response = await fetch(`${API_BASE_URL}/documents`);
+      return await this.handleResponse(response);
+    } catch (error) {
+      this.handleNetworkError(error);
+    }
+  }
+
+  /**
+   * Remove one document from the index
+   */
+  static async deleteDocument(documentId) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/documents/${documentId}`, {
+        method: "DELETE",
+      });
+
+      return await this.handleResponse(response);
+    } catch (error) {
+      this.handleNetworkError(error);
+    }
+  }
+
   /**
    * Clear all documents
    */